@@ -6,6 +6,16 @@ from tools.ml_model import MLModelTool
 from tools.visualization import VisualizationTool
 from tools.report_generator import ReportGeneratorTool
 from tools.conversation_manager import ConversationManagerTool
+from tools.sql_query import SQLQueryTool
+from tools.memory_monitor import MemoryMonitorTool
+from tools.forecasting import ForecastingTool
+from tools.association import AssociationTool
+from tools.anomaly import AnomalyDetectionTool
+from tools.data_quality import DataQualityTool
+from tools.entity_resolution import EntityResolutionTool
+from tools.incremental_refresh import IncrementalRefreshTool
+from tools.explanation import ExplanationTool
+from tools.memory_governor import governor
 
 # Configure agent with all tools
 agent = CodeAgent(
@@ -19,7 +29,19 @@ agent = CodeAgent(
         VisualizationTool(),
         ReportGeneratorTool(),
         ConversationManagerTool(),
+        SQLQueryTool(),
+        MemoryMonitorTool(),
+        ForecastingTool(),
+        AssociationTool(),
+        AnomalyDetectionTool(),
+        DataQualityTool(),
+        EntityResolutionTool(),
+        IncrementalRefreshTool(),
+        ExplanationTool(),
     ],
     model=model,
     additional_authorized_imports=additional_authorized_imports
-)
\ No newline at end of file
+)
+
+# Account the variables the agent's own code creates (df_clean, feature matrices, ...)
+governor.watch_namespace("executor", agent.python_executor.state, owner="agent code")
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Batch runner for the AI Data Scientist Assistant
+Analyzes many datasets non-interactively on a bounded pool of pre-warmed agents
+and writes per-dataset outputs plus a summary index
+"""
+
+import argparse
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+
+# Agent owned by the current worker process, built once by _init_worker
+_worker_agent = None
+
+
+def discover_datasets(sources):
+    """Expand directories and glob patterns into a sorted list of dataset paths"""
+    found = []
+    for source in sources:
+        if os.path.isdir(source):
+            for root, _, files in os.walk(source):
+                for name in files:
+                    if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                        found.append(os.path.join(root, name))
+        else:
+            for path in glob.glob(source, recursive=True):
+                if os.path.isfile(path) and path.lower().endswith(SUPPORTED_EXTENSIONS):
+                    found.append(path)
+
+    # De-duplicate while keeping a stable order between runs
+    return sorted({os.path.abspath(path) for path in found})
+
+
+def output_dir_for(data_path, output_root):
+    """Stable, collision-free output directory for a dataset"""
+    stem = os.path.splitext(os.path.basename(data_path))[0]
+    digest = hashlib.sha1(data_path.encode('utf-8')).hexdigest()[:8]
+    return os.path.join(output_root, f"{stem}_{digest}")
+
+
+def _init_worker():
+    """Build the agent and pre-load heavy libraries once per worker"""
+    global _worker_agent
+    from agent import agent
+    from tools import lazy_imports
+    _worker_agent = agent
+    lazy_imports.warm_up(background=False)
+
+
+def _reset_worker_state():
+    """Forget the datasets, models and executor variables left by the previous analysis in this worker"""
+    from tools.session import session
+    session.clear()
+    executor_state = getattr(getattr(_worker_agent, 'python_executor', None), 'state', None)
+    if executor_state is not None:
+        executor_state.clear()
+        executor_state['__name__'] = '__main__'
+
+
+def analyze_dataset(data_path, output_dir):
+    """Run the full analysis for one dataset inside its own output directory"""
+    from config import build_analysis_prompt
+
+    # Workers analyze many datasets with the same agent; none may see another's frames or models
+    _reset_worker_state()
+    os.makedirs(os.path.join(output_dir, 'plots'), exist_ok=True)
+    summary = {
+        'dataset': data_path,
+        'output_dir': output_dir,
+        'status': 'ok',
+        'started_at': datetime.now().isoformat(),
+        'seconds': None,
+        'plots': [],
+        'report': None,
+        'error': None,
+    }
+
+    # The tools write to relative paths (plots/, models/, results/), so each
+    # dataset runs with its own output directory as the working directory.
+    previous_cwd = os.getcwd()
+    started = time.perf_counter()
+    os.chdir(output_dir)
+    try:
+        with open('run.log', 'w') as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+            try:
+                final_result = _worker_agent.run(build_analysis_prompt(data_path))
+                with open('result.json', 'w') as f:
+                    if isinstance(final_result, (dict, list)):
+                        json.dump(final_result, f, indent=2, default=str)
+                    else:
+                        json.dump({'final_answer': str(final_result)}, f, indent=2)
+            except Exception as e:
+                summary['status'] = 'error'
+                summary['error'] = str(e)
+                traceback.print_exc()
+
+        summary['plots'] = sorted(os.path.join(output_dir, 'plots', f) for f in os.listdir('plots') if f.endswith('.png'))
+        if os.path.exists('analysis_report.pptx'):
+            summary['report'] = os.path.join(output_dir, 'analysis_report.pptx')
+    finally:
+        os.chdir(previous_cwd)
+        summary['seconds'] = round(time.perf_counter() - started, 2)
+
+    return summary
+
+
+def write_index(output_root, results):
+    """Write the summary index for all processed datasets"""
+    index = {
+        'generated_at': datetime.now().isoformat(),
+        'total': len(results),
+        'succeeded': sum(1 for r in results if r['status'] == 'ok'),
+        'failed': sum(1 for r in results if r['status'] != 'ok'),
+        'datasets': sorted(results, key=lambda r: r['dataset']),
+    }
+    index_path = os.path.join(output_root, 'index.json')
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, index_path)
+    return index_path
+
+
+def run_batch(sources, output_root, workers):
+    """Analyze every dataset found in sources and return the per-dataset summaries"""
+    datasets = discover_datasets(sources)
+    if not datasets:
+        print(f"❌ No CSV/Excel datasets found in: {', '.join(sources)}")
+        return []
+
+    output_root = os.path.abspath(output_root)
+    os.makedirs(output_root, exist_ok=True)
+    workers = max(1, min(workers, len(datasets)))
+    print(f"🚀 Analyzing {len(datasets)} datasets with {workers} workers")
+    print(f"📂 Outputs: {output_root}")
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = {
+            pool.submit(analyze_dataset, path, output_dir_for(path, output_root)): path
+            for path in datasets
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                summary = future.result()
+            except Exception as e:
+                # Worker crashed outside analyze_dataset (e.g. agent construction)
+                summary = {'dataset': path, 'output_dir': output_dir_for(path, output_root),
+                           'status': 'error', 'error': str(e), 'plots': [], 'report': None}
+            results.append(summary)
+
+            icon = "✅" if summary['status'] == 'ok' else "❌"
+            print(f"{icon} [{len(results)}/{len(datasets)}] {os.path.basename(path)} ({summary.get('seconds')}s)")
+
+            # Rewrite the index as results arrive so partial runs stay inspectable
+            write_index(output_root, results)
+
+    index_path = write_index(output_root, results)
+    print(f"\n📊 Summary index written to: {index_path}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze many datasets without interactive prompts.")
+    parser.add_argument('sources', nargs='+', help="Dataset files, directories or glob patterns (e.g. 'extracts/**/*.csv')")
+    parser.add_argument('-o', '--output', default='batch_output', help="Root directory for per-dataset outputs (default: batch_output)")
+    parser.add_argument('-w', '--workers', type=int, default=min(4, os.cpu_count() or 1),
+                        help="Maximum number of concurrent worker processes")
+    args = parser.parse_args(argv)
+
+    results = run_batch(args.sources, args.output, args.workers)
+    return 0 if results and all(r['status'] == 'ok' for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,7 +6,9 @@ Main entry point for the AI Data Scientist Assistant
 
 from smolagents import CodeAgent, DuckDuckGoSearchTool, OpenAIServerModel, PythonInterpreterTool, WebSearchTool, WikipediaSearchTool, BaseTool
 import os
+import glob
 import json
+import threading
 from dotenv import load_dotenv
 from tools.file_handler import FileHandlerTool
 from tools.data_analysis import DataAnalysisTool
@@ -14,6 +16,8 @@ from tools.ml_model import MLModelTool
 from tools.visualization import VisualizationTool
 from tools.report_generator import ReportGeneratorTool
 from tools.conversation_manager import ConversationManagerTool
+from tools.analysis_schema import extract_analysis
+from tools.session import session
 from config import model, additional_authorized_imports, system_prompt
 from agent import agent
 
@@ -34,87 +38,55 @@ business_goal = input("🎯 What is your business goal for this analysis?\n> ")
 # Run the complete analysis workflow automatically
 final_result = agent.run(f"{system_prompt}\n\nBusiness Goal: {business_goal}\nData File: {data_path}\n\nExecute the complete 4-phase analysis workflow and return the final JSON report using final_answer(). Do NOT generate any PowerPoint presentations during this analysis.")
 
-print(f"\n📊 Final Analysis Results:\n{final_result}")
+# Build the PowerPoint directly from the analysis JSON; no second agent run is needed
+report_outcome = {}
 
-# Generate PowerPoint presentation by having the agent write the code
-print("\n📊 Generating PowerPoint presentation...")
+
+def _generate_report(analysis_data, plots):
+    try:
+        report_outcome['result'] = ReportGeneratorTool().forward(analysis_results=analysis_data, plots=plots)
+    except Exception as e:
+        report_outcome['error'] = e
+
+
+report_thread = None
 try:
-    # Parse the final result to extract the JSON
-    if isinstance(final_result, str):
-        # Try to find JSON content in the string
-        if final_result.startswith('{'):
-            import json
-            analysis_data = json.loads(final_result)
-        elif 'final_answer' in final_result:
-            # Extract content after 'final_answer'
-            try:
-                start_idx = final_result.find('{')
-                end_idx = final_result.rfind('}') + 1
-                if start_idx != -1 and end_idx != -1:
-                    json_str = final_result[start_idx:end_idx]
-                    analysis_data = json.loads(json_str)
-                else:
-                    analysis_data = {}
-            except:
-                analysis_data = {}
-        else:
-            analysis_data = {}
+    analysis = extract_analysis(final_result)
+    # Plots recorded by the visualization tool in creation order, then any others in plots/
+    available_plots = [p['path'] for p in session.plots if os.path.exists(p['path'])]
+    available_plots += [p for p in sorted(glob.glob("plots/*.png")) if p.replace('\\', '/') not in available_plots]
+    print("\n📊 Generating PowerPoint presentation...")
+    report_thread = threading.Thread(target=_generate_report, args=(analysis.to_dict(), available_plots),
+                                     name="insight-report", daemon=True)
+    report_thread.start()
+except Exception as e:
+    print(f"⚠️ Could not parse analysis results for PowerPoint generation: {e}")
+    print(f"Debug - Final result type: {type(final_result)}")
+    print(f"Debug - Final result preview: {str(final_result)[:200]}...")
+
+# The report is rendered while the final answer is printed
+if isinstance(final_result, dict):
+    print(f"\n📊 Final Analysis Results:\n{json.dumps(final_result, indent=2, default=str)}")
+else:
+    print(f"\n📊 Final Analysis Results:\n{final_result}")
+
+if report_thread is not None:
+    report_thread.join()
+    if 'error' in report_outcome:
+        print(f"❌ Error generating PowerPoint: {report_outcome['error']}")
     else:
-        # If it's already a dict, use it directly
-        analysis_data = final_result if isinstance(final_result, dict) else {}
-    
-    if analysis_data and isinstance(analysis_data, dict):
-        # Get list of available visualization files
-        import glob
-        available_plots = glob.glob("plots/*.png")
-        
-        # Let the agent generate PowerPoint code
-        ppt_prompt = f"""
-        You have completed your analysis and generated the following results:
-        
-        ANALYSIS RESULTS:
-        {json.dumps(analysis_data, indent=2)}
-        
-        AVAILABLE VISUALIZATION FILES:
-        {available_plots}
-        
-        Now use the ReportGeneratorTool to create a professional PowerPoint presentation.
-        Call the report_generator tool with the analysis_results and plots parameters.
-        The tool will automatically create a comprehensive PowerPoint presentation with:
-        - Title slide
-        - Executive summary
-        - Data quality assessment
-        - Visualization slides with embedded images
-        - Key insights
-        - Recommendations
-        - Conclusion
+        print(f"🎯 PowerPoint Generation: {report_outcome['result']}")
 
-        Simply call: report_generator(analysis_results=analysis_data, plots=available_plots)
-        """
-        
-        print("🤖 Agent is generating PowerPoint code...")
-        ppt_result = agent.run(ppt_prompt)
-        print(f"🎯 PowerPoint Generation: {ppt_result}")
-        
-        # Verify the file was created
-        if os.path.exists("analysis_report.pptx"):
-            file_size = os.path.getsize("analysis_report.pptx")
-            print(f"✅ PowerPoint file created successfully! Size: {file_size} bytes")
-            # Clean up all PNG files in the plots directory
-            for file_path in glob.glob("plots/*.png"):
-                try:
-                    os.remove(file_path)
-                    print(f"Deleted: {file_path}")
-                except Exception as e:
-                    print(f"Failed to delete {file_path}: {e}")
-        else:
-            print("⚠️ PowerPoint file was not created")
+    # Verify the file was created
+    if os.path.exists("analysis_report.pptx"):
+        file_size = os.path.getsize("analysis_report.pptx")
+        print(f"✅ PowerPoint file created successfully! Size: {file_size} bytes")
+        # Clean up all PNG files in the plots directory
+        for file_path in glob.glob("plots/*.png"):
+            try:
+                os.remove(file_path)
+                print(f"Deleted: {file_path}")
+            except Exception as e:
+                print(f"Failed to delete {file_path}: {e}")
     else:
-        print("⚠️ Could not parse analysis results for PowerPoint generation")
-        print(f"Debug - Final result type: {type(final_result)}")
-        print(f"Debug - Final result preview: {str(final_result)[:200]}...")
-        print(f"Debug - Parsed analysis_data: {analysis_data}")
-except Exception as e:
-    print(f"❌ Error generating PowerPoint: {e}")
-    import traceback
-    traceback.print_exc()
+        print("⚠️ PowerPoint file was not created")
@@ -5,10 +5,15 @@ from smolagents import OpenAIServerModel
 load_dotenv()
 
 # Model configuration
-model = OpenAIServerModel(
-    model_id="gpt-5",
-    api_key=os.getenv("OPENAI_API_KEY"),
-)
+if os.getenv("INSIGHT_STUB_MODEL"):
+    # Local stand-in for load tests (see service.py load-test)
+    from tools.stub_model import StubModel
+    model = StubModel(latency=float(os.getenv("INSIGHT_STUB_LATENCY", "0")))
+else:
+    model = OpenAIServerModel(
+        model_id="gpt-5",
+        api_key=os.getenv("OPENAI_API_KEY"),
+    )
 
 # Additional authorized imports for the agent
 additional_authorized_imports = [
@@ -28,10 +33,19 @@ system_prompt = """You are an elite AI Data Scientist with complete autonomy to
 6. **Create Custom PowerPoint**: Write Python code specifically tailored to your findings
 
 **AVAILABLE TOOLS:**
-- file_handler(file_path): Load CSV/Excel data
-- data_analysis_tool(python_code, df): Execute custom analysis code
-- visualization_tool(python_code, df): Generate visualizations using matplotlib/seaborn
-- ml_model_tool(python_code, df): Build and evaluate ML models
+- file_handler(file_path, compact): Load CSV/Excel data; compact=True stores repetitive text columns as categoricals and downcasts numerics for large files (then use groupby(..., observed=True))
+- data_analysis_tool(python_code, df, use_cache): Execute custom analysis code
+- visualization_tool(python_code, df, use_cache): Generate visualizations using matplotlib/seaborn
+- ml_model_tool(python_code, df, use_cache): Build and evaluate ML models
+- explanation_tool(model_name, df, target_column, method, max_rows): Feature importance of a fitted model (permutation importance on held-out rows, tree-path contributions for tree ensembles); plot feature importance from the '<model>_importance' dataset it registers instead of impurity importances or hand-written permutation loops
+- sql_query_tool(query, df, max_rows, result_name): Fast SQL aggregations, window functions and joins over loaded datasets (tables are named after the data file)
+- forecasting_tool(df, value_column, date_column, group_columns, horizon, method): Forecast every series of the PRODUCTLINE > COUNTRY > PRODUCTCODE hierarchy at once, with prediction intervals
+- association_tool(df, columns, method): Complete association matrix across numeric and categorical columns (correlation, Cramér's V, correlation ratio) in one call
+- anomaly_detection_tool(df, value_columns, group_columns, feature_columns, method): Ranked anomalies relative to their group (e.g. SALES unusual for its PRODUCTLINE and DEALSIZE) from per-group median/MAD and IsolationForest scores
+- data_quality_tool(df, rules, include_default_rules, schema_path): Check declarative data quality rules (e.g. SALES ≈ QUANTITYORDERED × PRICEEACH, QTR_ID vs MONTH_ID, valid DEALSIZE) with violation counts and sample rows, and infer the schema; feeds the report's Data Quality slide
+- entity_resolution_tool(df, fields, threshold, value_column): Deduplicate customers with inconsistent names, PHONE formats or addresses into stable ENTITY_IDs; use ENTITY_NAME for customer rankings
+- incremental_refresh(file_path, psi_threshold, compact): After rows were appended to an analyzed CSV, parse only the new rows, update statistics and aggregates, redraw the affected charts and retrain models only on drift
+- memory_monitor(action, dataset): Report session memory per tool and free memory ('report', 'enforce', 'spill') when working with large data
 
 **CRITICAL: Always call the actual tools and write Python code!**
 
@@ -54,3 +68,29 @@ When creating the PowerPoint presentation, write Python code using python-pptx t
 
 **KEY PRINCIPLE:** 
 Adapt everything to the specific dataset you're analyzing. Don't use generic templates - create content that reflects your actual discoveries and insights."""
+
+
+def build_analysis_prompt(data_path):
+    """Build the complete analysis prompt for a single data file"""
+    return f"""{system_prompt}
+
+**DATA FILE:** {data_path}
+
+**YOUR MISSION:**
+1. Load and analyze this specific dataset
+2. Perform comprehensive EDA based on what you find
+3. Generate appropriate visualizations for THIS data
+4. Build relevant ML models for THIS dataset  
+5. Extract insights specific to THIS analysis
+6. Write custom Python code to create a PowerPoint presentation that tells the story of YOUR findings
+
+**POWERPOINT GENERATION:**
+After completing your analysis, write Python code using python-pptx to create 'analysis_report.pptx' with:
+- Title slide with your analysis title
+- Overview of the dataset you analyzed
+- Slides for each visualization you created (with explanations)
+- Key insights you discovered
+- Recommendations based on your findings
+- Professional formatting
+
+Make everything specific to your actual analysis results, not generic templates."""
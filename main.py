@@ -4,14 +4,56 @@ Automated AI Data Scientist Assistant
 Performs comprehensive EDA, generates insights, visualizations, and creates PowerPoint presentation automatically
 """
 
+import time
+
+_STARTED = time.perf_counter()
+
+import argparse
 import os
-from agent import agent
-from config import system_prompt
+import threading
+from tools import lazy_imports
+
+# Target time from process start to the first interactive prompt
+STARTUP_TARGET_SECONDS = 0.5
+
+
+def _start_background_warm_up():
+    """Build the agent and pre-load heavy libraries while the user is typing.
+
+    Everything runs on a single thread so imports never race each other.
+    """
+    state = {}
+
+    def _run():
+        try:
+            started = time.perf_counter()
+            from agent import agent
+            state['agent'] = agent
+            state['agent_seconds'] = time.perf_counter() - started
+            lazy_imports.warm_up(background=False)
+        except Exception as e:
+            state['error'] = e
+
+    thread = threading.Thread(target=_run, name="insight-agent-warm-up", daemon=True)
+    thread.start()
+    return thread, state
+
 
 def main():
+    parser = argparse.ArgumentParser(description="Autonomous AI Data Scientist Assistant")
+    parser.add_argument('--startup-report', action='store_true', help="Print startup and import timings")
+    parser.add_argument('--resume', action='store_true', help="Continue the last run from its latest checkpoint")
+    parser.add_argument('--checkpoint-dir', default='checkpoints', help="Directory for session checkpoints")
+    parser.add_argument('--checkpoint-every', type=int, default=1, help="Checkpoint every N agent steps")
+    args = parser.parse_args()
+
+    warm_up_thread, warm_up_state = _start_background_warm_up()
+
     # Welcome message
 
-    [os.remove(f"plots/{f}") for f in os.listdir("plots") if f.endswith(".png")]
+    # Plots from the interrupted run are part of the checkpoint, so keep them when resuming
+    if not args.resume:
+        [os.remove(f"plots/{f}") for f in os.listdir("plots") if f.endswith(".png")]
 
     print("🚀 Welcome to Spark Insights! Your Autonomous AI Data Scientist.\n")
     print("📊 This system will automatically:")
@@ -22,6 +64,11 @@ def main():
     print("   • Create a custom PowerPoint presentation")
     print()
 
+    time_to_prompt = time.perf_counter() - _STARTED
+    if args.startup_report:
+        status = "✅" if time_to_prompt <= STARTUP_TARGET_SECONDS else "⚠️"
+        print(f"{status} Prompt ready in {time_to_prompt:.3f}s (target {STARTUP_TARGET_SECONDS:.1f}s)\n")
+
     # Get data file path
     data_path = input("📁 Please provide your data file path (CSV/Excel):\n> ").strip()
     
@@ -29,34 +76,45 @@ def main():
         print(f"❌ File not found: {data_path}")
         return
 
+    # Wait for the background warm-up before using the agent
+    warm_up_thread.join()
+    if 'error' in warm_up_state:
+        print(f"❌ Failed to initialize the agent: {warm_up_state['error']}")
+        return
+    agent = warm_up_state['agent']
+    from config import build_analysis_prompt
+
+    if args.startup_report:
+        print(f"\n⏱️ Agent initialized in {warm_up_state['agent_seconds']:.2f}s (in background)")
+        print(lazy_imports.format_report())
+
     # Run complete automated analysis with PowerPoint generation
     print("\n🔄 Starting autonomous data analysis...")
     
-    full_prompt = f"""{system_prompt}
+    full_prompt = build_analysis_prompt(data_path)
 
-**DATA FILE:** {data_path}
-
-**YOUR MISSION:**
-1. Load and analyze this specific dataset
-2. Perform comprehensive EDA based on what you find
-3. Generate appropriate visualizations for THIS data
-4. Build relevant ML models for THIS dataset  
-5. Extract insights specific to THIS analysis
-6. Write custom Python code to create a PowerPoint presentation that tells the story of YOUR findings
-
-**POWERPOINT GENERATION:**
-After completing your analysis, write Python code using python-pptx to create 'analysis_report.pptx' with:
-- Title slide with your analysis title
-- Overview of the dataset you analyzed
-- Slides for each visualization you created (with explanations)
-- Key insights you discovered
-- Recommendations based on your findings
-- Professional formatting
-
-Make everything specific to your actual analysis results, not generic templates."""
+    from tools.checkpoint import SessionCheckpointer
+    checkpointer = SessionCheckpointer(args.checkpoint_dir, every_n_steps=args.checkpoint_every).attach(agent)
+    resume = False
+    if args.resume:
+        if checkpointer.latest():
+            manifest = checkpointer.restore(agent)
+            resume = True
+            print(f"♻️ Resuming from checkpoint saved at {manifest['saved_at']} "
+                  f"({len(agent.memory.steps)} memory steps, {len(manifest['datasets'])} datasets, "
+                  f"{len(manifest['models'])} models, {len(manifest['plots'])} plots)")
+        else:
+            print(f"⚠️ No checkpoint found in {args.checkpoint_dir}, starting a new analysis")
 
     try:
-        final_result = agent.run(full_prompt)
+        if resume:
+            final_result = agent.run(
+                "The previous run was interrupted. Continue the analysis from where you left off, "
+                "reusing the data, models and plots already produced, and finish the remaining steps.",
+                reset=False,
+            )
+        else:
+            final_result = agent.run(full_prompt)
         print(f"\n✅ Analysis Complete!")
         print(f"📊 Results: {final_result}")
         
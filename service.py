@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+Service mode for the AI Data Scientist Assistant
+Accepts analysis jobs over a local HTTP API and runs each one in an isolated
+workspace on a bounded pool of pre-warmed worker processes
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlparse
+
+import batch
+
+DEFAULT_QUOTAS = {
+    'max_upload_mb': 200,          # size of an uploaded dataset
+    'max_runtime_seconds': 1800,   # wall clock per job; the agent is interrupted after this
+    'max_steps': 30,               # agent steps per job
+    'max_workspace_mb': 500,       # outputs written by a job (plots, models, results, report)
+    'memory_budget_mb': 2048,      # session memory budget of each worker (see tools/memory_governor.py)
+    'max_queued_jobs': 100,        # jobs waiting for a worker, over all tenants
+    'max_jobs_per_tenant': 4,      # queued + running jobs of one tenant
+}
+TENANT_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+FINISHED_STATES = ('ok', 'error', 'quota_exceeded', 'cancelled')
+
+# Worker-process state: the quotas and the job currently running in this worker
+_worker_quotas = None
+_current_job = {}
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _quota_callback(memory_step, agent=None):
+    """Step callback: stop the agent once its workspace outgrows the quota"""
+    workspace = _current_job.get('workspace')
+    if agent is None or not workspace:
+        return
+    size = directory_size(workspace)
+    if size > _worker_quotas['max_workspace_mb'] * 1024 * 1024:
+        _current_job['violation'] = f"workspace exceeded {_worker_quotas['max_workspace_mb']} MB ({size / 1024 ** 2:.0f} MB)"
+        agent.interrupt()
+
+
+def _init_service_worker(quotas):
+    """Build the agent once per worker and install the quota hooks"""
+    global _worker_quotas
+    _worker_quotas = quotas
+    batch._init_worker()
+    from tools.memory_governor import governor
+    governor.budget_bytes = quotas['memory_budget_mb'] * 1024 * 1024
+
+    callbacks = batch._worker_agent.step_callbacks
+    if hasattr(callbacks, 'register'):
+        from smolagents.memory import ActionStep
+        callbacks.register(ActionStep, _quota_callback)
+    else:
+        callbacks.append(_quota_callback)
+
+
+def _run_job(data_path, workspace):
+    """Run one job in a worker process; nothing from earlier jobs is visible to it
+    (batch.analyze_dataset resets the session and the executor state first)"""
+    agent = batch._worker_agent
+
+    agent.max_steps = _worker_quotas['max_steps']
+    _current_job.clear()
+    _current_job.update({'workspace': workspace, 'violation': None})
+
+    def _timeout():
+        _current_job['violation'] = f"runtime exceeded {_worker_quotas['max_runtime_seconds']}s"
+        agent.interrupt()
+
+    timer = threading.Timer(_worker_quotas['max_runtime_seconds'], _timeout)
+    timer.daemon = True
+    timer.start()
+    try:
+        summary = batch.analyze_dataset(data_path, workspace)
+    finally:
+        timer.cancel()
+        _current_job['workspace'] = None
+
+    if _current_job.get('violation'):
+        summary['status'] = 'quota_exceeded'
+        summary['error'] = _current_job['violation']
+    summary['workspace_bytes'] = directory_size(workspace)
+    return summary
+
+
+class JobManager:
+    """Job registry, per-tenant admission control and the bounded worker pool"""
+
+    def __init__(self, root, workers, quotas):
+        self.root = os.path.abspath(root)
+        self.quotas = quotas
+        self.workers = workers
+        self.jobs = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        self._load_finished_jobs()
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_service_worker, initargs=(quotas,))
+
+    def _load_finished_jobs(self):
+        """Finished jobs survive a restart through their job.json"""
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name, 'job.json')
+            if os.path.exists(path):
+                try:
+                    with open(path) as f:
+                        job = json.load(f)
+                    self.jobs[job['id']] = job
+                except (OSError, ValueError, KeyError):
+                    continue
+
+    def _active(self, tenant=None):
+        return [job for job in self.jobs.values()
+                if job['status'] not in FINISHED_STATES and (tenant is None or job['tenant'] == tenant)]
+
+    def submit(self, tenant, filename, body):
+        """Create a workspace for the upload and queue it. Returns (http_status, payload)"""
+        with self._lock:
+            if len(self._active(tenant)) >= self.quotas['max_jobs_per_tenant']:
+                return 429, {'error': f"tenant '{tenant}' already has {self.quotas['max_jobs_per_tenant']} active jobs"}
+            queued = sum(1 for job in self._active() if not job['_future'].running())
+            if queued >= self.quotas['max_queued_jobs']:
+                return 503, {'error': "job queue is full, retry later"}
+
+            job_id = uuid.uuid4().hex[:12]
+            workspace = os.path.join(self.root, f"{tenant}_{job_id}")
+            os.makedirs(os.path.join(workspace, 'input'))
+            data_path = os.path.join(workspace, 'input', filename)
+            with open(data_path, 'wb') as f:
+                f.write(body)
+
+            job = {
+                'id': job_id,
+                'tenant': tenant,
+                'filename': filename,
+                'status': 'queued',
+                'submitted_at': datetime.now().isoformat(),
+                'finished_at': None,
+                'workspace': workspace,
+                'summary': None,
+            }
+            job['_future'] = self.pool.submit(_run_job, data_path, os.path.join(workspace, 'output'))
+            self.jobs[job_id] = job
+        job['_future'].add_done_callback(lambda future, job_id=job_id: self._finish(job_id, future))
+        return 202, self.public(job)
+
+    def _finish(self, job_id, future):
+        with self._lock:
+            job = self.jobs[job_id]
+            if future.cancelled():
+                job['status'] = 'cancelled'
+            else:
+                try:
+                    job['summary'] = future.result()
+                    job['status'] = job['summary']['status']
+                except Exception as e:
+                    # The worker died (e.g. killed for memory) before returning a summary
+                    job['summary'] = {'status': 'error', 'error': str(e)}
+                    job['status'] = 'error'
+            job['finished_at'] = datetime.now().isoformat()
+            record = self.public(job)
+        tmp_path = os.path.join(job['workspace'], 'job.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(record, f, indent=2)
+        os.replace(tmp_path, os.path.join(job['workspace'], 'job.json'))
+
+    def get(self, tenant, job_id):
+        job = self.jobs.get(job_id)
+        return job if job is not None and job['tenant'] == tenant else None
+
+    def public(self, job):
+        """Job record without internal fields; 'running' is read from the pool"""
+        record = {k: v for k, v in job.items() if not k.startswith('_')}
+        future = job.get('_future')
+        if record['status'] == 'queued' and future is not None and future.running():
+            record['status'] = 'running'
+        return record
+
+    def cancel(self, tenant, job_id):
+        """Cancel a queued job or delete a finished job's workspace"""
+        job = self.get(tenant, job_id)
+        if job is None:
+            return 404, {'error': "job not found"}
+        if job['status'] in FINISHED_STATES:
+            with self._lock:
+                self.jobs.pop(job_id, None)
+            shutil.rmtree(job['workspace'], ignore_errors=True)
+            return 200, {'id': job_id, 'deleted': True}
+        if job['_future'].cancel():
+            return 200, {'id': job_id, 'status': 'cancelled'}
+        return 409, {'error': "job is already running"}
+
+    def health(self):
+        with self._lock:
+            active = self._active()
+            running = sum(1 for job in active if job['_future'].running())
+            return {'workers': self.workers, 'running': running, 'queued': len(active) - running,
+                    'finished': len(self.jobs) - len(active), 'quotas': self.quotas}
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """Local HTTP API:
+
+    POST   /jobs?filename=sales.csv      upload a dataset (request body) and queue its analysis
+    GET    /jobs                         list the tenant's jobs
+    GET    /jobs/<id>                    job status and run summary
+    GET    /jobs/<id>/files              files in the job's workspace
+    GET    /jobs/<id>/files/<path>       download a file (e.g. output/analysis_report.pptx)
+    DELETE /jobs/<id>                    cancel a queued job or delete a finished one
+    GET    /health                       pool and queue status
+
+    The tenant is taken from the X-Tenant header (default 'default'); jobs
+    are only visible to their own tenant.
+    """
+
+    manager = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload=None, body=None, content_type='application/json'):
+        if body is None:
+            body = json.dumps(payload, indent=2, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _tenant(self):
+        tenant = self.headers.get('X-Tenant', 'default')
+        return tenant if TENANT_PATTERN.match(tenant) else None
+
+    def _route(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split('/') if p]
+        return parts, parse_qs(url.query)
+
+    def do_POST(self):
+        parts, query = self._route()
+        if parts != ['jobs']:
+            return self._send(404, {'error': "not found"})
+        tenant = self._tenant()
+        if tenant is None:
+            return self._send(400, {'error': "invalid X-Tenant header"})
+        filename = os.path.basename(query.get('filename', [''])[0])
+        if not filename.lower().endswith(batch.SUPPORTED_EXTENSIONS):
+            return self._send(400, {'error': f"filename must end with one of {', '.join(batch.SUPPORTED_EXTENSIONS)}"})
+        length = int(self.headers.get('Content-Length') or 0)
+        if length <= 0:
+            return self._send(400, {'error': "empty upload"})
+        if length > self.manager.quotas['max_upload_mb'] * 1024 * 1024:
+            # Not reading the body, so the connection cannot be reused
+            self.close_connection = True
+            return self._send(413, {'error': f"upload exceeds {self.manager.quotas['max_upload_mb']} MB"})
+        status, payload = self.manager.submit(tenant, filename, self.rfile.read(length))
+        self._send(status, payload)
+
+    def do_GET(self):
+        parts, _ = self._route()
+        if parts == ['health']:
+            return self._send(200, self.manager.health())
+        tenant = self._tenant()
+        if tenant is None:
+            return self._send(400, {'error': "invalid X-Tenant header"})
+        if parts == ['jobs']:
+            jobs = [self.manager.public(job) for job in list(self.manager.jobs.values()) if job['tenant'] == tenant]
+            return self._send(200, {'jobs': sorted(jobs, key=lambda j: j['submitted_at'])})
+        if len(parts) < 2 or parts[0] != 'jobs':
+            return self._send(404, {'error': "not found"})
+        job = self.manager.get(tenant, parts[1])
+        if job is None:
+            return self._send(404, {'error': "job not found"})
+        if len(parts) == 2:
+            return self._send(200, self.manager.public(job))
+        if parts[2] != 'files':
+            return self._send(404, {'error': "not found"})
+
+        workspace = os.path.realpath(job['workspace'])
+        if len(parts) == 3:
+            files = sorted(os.path.relpath(os.path.join(root, name), workspace).replace('\\', '/')
+                           for root, _, names in os.walk(workspace) for name in names)
+            return self._send(200, {'files': files})
+        path = os.path.realpath(os.path.join(workspace, *parts[3:]))
+        # Never serve anything outside the job's own workspace
+        if not path.startswith(workspace + os.sep) or not os.path.isfile(path):
+            return self._send(404, {'error': "file not found"})
+        with open(path, 'rb') as f:
+            self._send(200, body=f.read(), content_type='application/octet-stream')
+
+    def do_DELETE(self):
+        parts, _ = self._route()
+        tenant = self._tenant()
+        if tenant is None or len(parts) != 2 or parts[0] != 'jobs':
+            return self._send(404, {'error': "not found"})
+        status, payload = self.manager.cancel(tenant, parts[1])
+        self._send(status, payload)
+
+
+def create_server(host, port, root, workers, quotas):
+    manager = JobManager(root, workers, quotas)
+    handler = type('BoundServiceHandler', (ServiceHandler,), {'manager': manager})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server, manager
+
+
+def _request(method, url, tenant, body=None):
+    request = urllib.request.Request(url, data=body, method=method, headers={'X-Tenant': tenant})
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            return response.status, json.loads(response.read() or b'{}')
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b'{}')
+
+
+def load_test(url, dataset, jobs, concurrency, tenants, poll_interval=0.5):
+    """Submit many jobs through the HTTP API and report latency and throughput"""
+    with open(dataset, 'rb') as f:
+        body = f.read()
+    filename = quote(os.path.basename(dataset))
+
+    def _one(i):
+        tenant = f"tenant{i % tenants}"
+        submitted = time.perf_counter()
+        while True:
+            status, payload = _request('POST', f"{url}/jobs?filename={filename}", tenant, body)
+            if status == 202:
+                break
+            if status not in (429, 503):
+                return {'status': f"rejected ({status})", 'error': payload.get('error'), 'seconds': 0}
+            time.sleep(poll_interval)
+        job_id = payload['id']
+        while True:
+            time.sleep(poll_interval)
+            status, job = _request('GET', f"{url}/jobs/{job_id}", tenant)
+            if job.get('status') in FINISHED_STATES:
+                _, files = _request('GET', f"{url}/jobs/{job_id}/files", tenant)
+                return {'status': job['status'], 'error': (job.get('summary') or {}).get('error'),
+                        'seconds': time.perf_counter() - submitted, 'files': len(files.get('files', []))}
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        results = list(clients.map(_one, range(jobs)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(r['seconds'] for r in results if r['status'] == 'ok')
+    failures = [r for r in results if r['status'] != 'ok']
+    print(f"📊 {jobs} jobs in {elapsed:.1f}s ({jobs / elapsed:.2f} jobs/s), {len(failures)} failed")
+    if latencies:
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"   Latency p50 {p50:.1f}s, p95 {p95:.1f}s, max {latencies[-1]:.1f}s")
+    for failure in failures[:5]:
+        print(f"   ❌ {failure['status']}: {failure['error']}")
+    return results
+
+
+def _add_quota_arguments(parser):
+    for name, default in DEFAULT_QUOTAS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=default, dest=name,
+                            help=f"Quota: {name.replace('_', ' ')} (default: {default})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run analyses as jobs behind a local HTTP API.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve', help="Start the job service")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--root', default='service_jobs', help="Directory holding one workspace per job")
+    serve.add_argument('-w', '--workers', type=int, default=min(4, os.cpu_count() or 1),
+                       help="Maximum number of concurrent analyses")
+    _add_quota_arguments(serve)
+
+    bench = commands.add_parser('load-test', help="Submit many jobs and report latency and throughput")
+    bench.add_argument('dataset', help="Dataset uploaded by every job")
+    bench.add_argument('--url', help="Service to test (default: start one with the stub model)")
+    bench.add_argument('--jobs', type=int, default=20)
+    bench.add_argument('--concurrency', type=int, default=8, help="Concurrent clients")
+    bench.add_argument('--tenants', type=int, default=4)
+    bench.add_argument('--root', default=os.path.join('service_jobs', 'load_test'))
+    bench.add_argument('-w', '--workers', type=int, default=min(4, os.cpu_count() or 1))
+    bench.add_argument('--stub-latency', type=float, default=0.5, help="Simulated model latency per step (seconds)")
+    _add_quota_arguments(bench)
+    args = parser.parse_args(argv)
+
+    quotas = {name: getattr(args, name) for name in DEFAULT_QUOTAS}
+    if args.command == 'serve':
+        server, manager = create_server(args.host, args.port, args.root, args.workers, quotas)
+        print(f"🚀 Insight service on http://{args.host}:{args.port} ({args.workers} workers, workspaces in {manager.root})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\n👋 Shutting down")
+        finally:
+            server.server_close()
+            manager.shutdown()
+        return 0
+
+    url = args.url
+    server = manager = None
+    if url is None:
+        # Workers inherit the environment, so they build the agent on the local stand-in model
+        os.environ['INSIGHT_STUB_MODEL'] = '1'
+        os.environ['INSIGHT_STUB_LATENCY'] = str(args.stub_latency)
+        server, manager = create_server('127.0.0.1', 0, args.root, args.workers, quotas)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        print(f"🧪 Load-testing a local service with the stub model at {url} ({args.workers} workers)")
+    try:
+        results = load_test(url.rstrip('/'), args.dataset, args.jobs, args.concurrency, args.tenants)
+    finally:
+        if server is not None:
+            server.shutdown()
+            manager.shutdown()
+    return 0 if all(r['status'] == 'ok' for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
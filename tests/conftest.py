@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.session import session  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def workspace(tmp_path, monkeypatch):
+    """Tools write plots/, results/ and .cache/ relative to the working directory"""
+    monkeypatch.chdir(tmp_path)
+    session.clear()
+    yield tmp_path
+    session.clear()
@@ -0,0 +1,20 @@
+from types import SimpleNamespace
+
+import pandas as pd
+
+import batch
+from tools.session import session
+
+
+def test_reset_worker_state_forgets_previous_dataset(monkeypatch):
+    state = {'df': pd.DataFrame({'REGION': ['north']}), 'model': object()}
+    monkeypatch.setattr(batch, '_worker_agent', SimpleNamespace(python_executor=SimpleNamespace(state=state)))
+    session.register_dataset('north', state['df'])
+    session.register_model('model', state['model'])
+    generation = session.generation
+
+    batch._reset_worker_state()
+
+    assert session.datasets == {} and session.models == {}
+    assert session.generation == generation + 1
+    assert state == {'__name__': '__main__'}
@@ -0,0 +1,53 @@
+import os
+from types import SimpleNamespace
+
+import pandas as pd
+
+from tools.checkpoint import SessionCheckpointer
+from tools.session import session
+
+
+def _agent(state):
+    return SimpleNamespace(memory=SimpleNamespace(steps=['task', 'step 1']),
+                           python_executor=SimpleNamespace(state=state), task='analyze')
+
+
+def test_save_and_restore_round_trip():
+    sales = pd.DataFrame({'SALES': [1.5, 2.5], 'COUNTRY': ['FR', 'US']})
+    session.register_dataset('sales', sales)
+    session.register_model('total', {'sum': 4.0})
+    agent = _agent({'df_clean': sales.dropna(), 'threshold': 3, 'error': ValueError('bad row')})
+    checkpointer = SessionCheckpointer('checkpoints')
+    path = checkpointer.save(agent)
+
+    session.clear()
+    restored = _agent({})
+    manifest = checkpointer.restore(restored, path)
+
+    pd.testing.assert_frame_equal(session.get_dataset('sales'), sales)
+    assert session.models['total'] == {'sum': 4.0}
+    assert restored.memory.steps == ['task', 'step 1']
+    assert restored.python_executor.state['threshold'] == 3
+    assert str(restored.python_executor.state['error']) == 'bad row'
+    pd.testing.assert_frame_equal(restored.python_executor.state['df_clean'], sales)
+    assert manifest['task'] == 'analyze'
+
+
+def test_unchanged_frames_are_linked_and_edits_rewritten():
+    sales = pd.DataFrame({'SALES': [1.0, 2.0]})
+    session.register_dataset('sales', sales)
+    agent = _agent({})
+    checkpointer = SessionCheckpointer('checkpoints', keep_last=5)
+    first = checkpointer.save(agent)
+    agent.memory.steps.append('step 2')
+    second = checkpointer.save(agent)
+    first_frame, second_frame = (os.path.join(path, 'frames', os.listdir(os.path.join(path, 'frames'))[0])
+                                 for path in (first, second))
+    assert os.path.samefile(first_frame, second_frame)
+
+    sales.loc[0, 'SALES'] = 50.0
+    agent.memory.steps.append('step 3')
+    third = checkpointer.save(agent)
+    session.clear()
+    checkpointer.restore(_agent({}), third)
+    assert session.get_dataset('sales')['SALES'].tolist() == [50.0, 2.0]
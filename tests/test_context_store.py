@@ -0,0 +1,36 @@
+import os
+
+from tools.context_store import ContextStore
+
+
+def _stored_total(store):
+    meta = store._conn.execute("SELECT value FROM store_meta WHERE key = 'total_size'").fetchone()[0]
+    actual = store._conn.execute("SELECT COALESCE(SUM(size), 0) FROM contexts").fetchone()[0]
+    return meta, actual
+
+
+def test_versions_and_lookups():
+    store = ContextStore('contexts.db')
+    store.save({'step': 1}, session_id='a', dataset='sales')
+    store.save({'step': 2}, session_id='a', dataset='sales')
+    store.save({'step': 1}, session_id='b', dataset='orders')
+
+    assert store.get(session_id='a')['context'] == {'step': 2}
+    assert store.get(session_id='a', version=1)['context'] == {'step': 1}
+    assert store.get(dataset='orders')['session_id'] == 'b'
+    assert [v['version'] for v in store.list_versions('a')] == [2, 1]
+
+
+def test_running_total_follows_inserts_and_compaction():
+    store = ContextStore('contexts.db', max_versions_per_session=3, max_total_bytes=2000)
+    assert _stored_total(store) == (0, 0)
+    for i in range(20):
+        store.save({'i': i, 'text': os.urandom(200).hex()}, session_id=f"s{i % 4}")
+        meta, actual = _stored_total(store)
+        assert meta == actual
+        assert actual <= 2000
+    store.close()
+
+    reopened = ContextStore('contexts.db')
+    meta, actual = _stored_total(reopened)
+    assert meta == actual
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tools import explanation
+from tools.explanation import ExplanationTool, permutation_importance
+from tools.session import session
+
+
+@pytest.fixture
+def fitted():
+    linear_model = pytest.importorskip("sklearn.linear_model")
+    rng = np.random.default_rng(0)
+    n = 5000
+    df = pd.DataFrame({'QUANTITYORDERED': rng.integers(1, 50, n).astype(float),
+                       'PRICEEACH': rng.uniform(10, 100, n), 'MSRP': rng.uniform(10, 200, n)})
+    df['SALES'] = df['QUANTITYORDERED'] * 50 + df['PRICEEACH'] * 10 + rng.normal(0, 5, n)
+    features = ['QUANTITYORDERED', 'PRICEEACH', 'MSRP']
+    model = linear_model.LinearRegression().fit(df[features], df['SALES'])
+    session.register_model('sales_model', model)
+    return model, df, features
+
+
+def test_baseline_is_recomputed_when_feature_content_changes(fitted):
+    model, df, features = fitted
+    session.register_dataset('sales', df)
+    tool = ExplanationTool()
+    assert tool.forward('sales_model', df, target_column='SALES', method='permutation', workers=1).startswith("✅")
+    assert len(explanation._baselines) == 1
+
+    # Swapping two prices in place keeps the object, shape, dataset version and column sums; rows 1 and 2
+    # are also outside the rows the dataset's content signature samples
+    df.loc[[1, 2], 'PRICEEACH'] = df.loc[[2, 1], 'PRICEEACH'].to_numpy()
+    assert tool.forward('sales_model', df, target_column='SALES', method='permutation', workers=1).startswith("✅")
+
+    assert len(explanation._baselines) == 2
+    latest, _ = next(reversed(explanation._baselines.values()))
+    np.testing.assert_allclose(latest, model.predict(df[features]))
+
+
+def test_pool_and_sequential_importances_agree(fitted, monkeypatch):
+    model, df, features = fitted
+    X, y = df[features], df['SALES'].to_numpy()
+    baseline = model.predict(X)
+
+    sequential, sequential_score = permutation_importance(model, X, y, baseline, workers=1)
+    monkeypatch.setattr(explanation, 'PARALLEL_MIN_CELLS', 0)
+    pooled, pooled_score = permutation_importance(model, X, y, baseline, workers=3)
+
+    assert pooled_score == sequential_score
+    pd.testing.assert_frame_equal(pooled, sequential)
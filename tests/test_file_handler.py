@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+from tools.file_handler import FileHandlerTool, compact_dataframe
+
+
+def _write(path, text, encoding, mode='w'):
+    with open(path, mode, encoding=encoding, newline='') as f:
+        f.write(text)
+
+
+def test_latin1_csv_falls_back_instead_of_loading_bytes():
+    _write('customers.csv', "CUSTOMERNAME,CITY,SALES\nLa Maison du Café,Lyon,10.5\nTräger GmbH,Köln,20\n", 'latin-1')
+    tool = FileHandlerTool()
+    df = tool.forward('customers.csv')
+
+    assert tool._encoding != 'utf-8'
+    assert df['CUSTOMERNAME'].tolist() == ["La Maison du Café", "Träger GmbH"]
+    assert df['CITY'].map(type).eq(str).all()
+
+
+def test_appended_rows_in_another_encoding_are_reparsed():
+    _write('orders.csv', "CUSTOMERNAME,SALES\n" + "".join(f"Customer {i},{i}\n" for i in range(50)), 'utf-8')
+    FileHandlerTool().forward('orders.csv')
+    _write('orders.csv', "Müller AG,99\n", 'latin-1', mode='a')
+
+    df = FileHandlerTool().forward('orders.csv')
+
+    assert len(df) == 51
+    assert df['CUSTOMERNAME'].iloc[-1] == "Müller AG"
+    assert df['CUSTOMERNAME'].map(type).eq(str).all()
+
+
+def test_compact_downcasts_keep_every_value():
+    df = pd.DataFrame({
+        'YEAR_ID': [2003, 2004, 2005, 2005],
+        'QUANTITYORDERED': [97, 20, 66, 41],
+        'ORDER_KEY': [np.iinfo(np.int32).min, 0, 1, np.iinfo(np.int32).max],
+        'HUGE': [1e19, 2.0, 3.0, 4.0],
+        'RETURNS': pd.array([1, None, 3, 4], dtype='Int64'),
+        'PRICEEACH': [95.7, 81.35, 94.74, 83.26],
+        'STATUS': ['Shipped', 'Shipped', 'Shipped', 'Cancelled'],
+    })
+
+    compacted, changed = compact_dataframe(df)
+
+    assert compacted['YEAR_ID'].dtype == np.int32
+    assert compacted['ORDER_KEY'].dtype == np.int32
+    assert compacted['RETURNS'].dtype == 'Int32'
+    assert compacted['HUGE'].dtype == np.float64 and 'HUGE' not in changed
+    assert compacted['PRICEEACH'].dtype == np.float64
+    assert isinstance(compacted['STATUS'].dtype, pd.CategoricalDtype)
+    pd.testing.assert_frame_equal(compacted.astype(df.dtypes.to_dict()), df)
+    # Derived keys and squares must not wrap around in the narrower type
+    assert (compacted['YEAR_ID'] * 100 + 12).tolist() == (df['YEAR_ID'] * 100 + 12).tolist()
+    assert (compacted['QUANTITYORDERED'] ** 2).tolist() == (df['QUANTITYORDERED'] ** 2).tolist()
+
+
+def test_compact_keeps_int64_outside_the_int32_range():
+    df = pd.DataFrame({'ORDER_KEY': [np.iinfo(np.int32).max + 1, 0], 'SHARE': [2.0 ** 40, 1.0]})
+
+    compacted, changed = compact_dataframe(df)
+
+    assert compacted['ORDER_KEY'].dtype == np.int64 and 'ORDER_KEY' not in changed
+    assert compacted['SHARE'].dtype == np.int64
+    assert compacted['SHARE'].tolist() == [2 ** 40, 1]
@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tools import file_handler, incremental
+from tools.aggregate_cube import AggregateCube
+from tools.file_handler import FileHandlerTool
+from tools.incremental_refresh import IncrementalRefreshTool
+from tools.session import session
+from tools.visualization import VisualizationTool
+
+
+def _orders(start, n, seed):
+    rng = np.random.default_rng(seed)
+    quantity = rng.integers(1, 50, n)
+    price = rng.uniform(10, 100, n).round(2)
+    return pd.DataFrame({
+        'ORDERNUMBER': np.arange(start, start + n),
+        'ORDERLINENUMBER': 1,
+        'QUANTITYORDERED': quantity,
+        'PRICEEACH': price,
+        'SALES': (quantity * price).round(2),
+        'ORDERDATE': pd.date_range('2024-01-01', periods=n, freq='D').shift(start, freq='D').strftime('%m/%d/%Y'),
+        'DEALSIZE': rng.choice(['Small', 'Medium'], n),
+        'COUNTRY': rng.choice(['France', 'USA', 'Spain'], n),
+    })
+
+
+def _append(path, rows):
+    rows.to_csv(path, mode='a', header=False, index=False)
+
+
+def _full_load(path, compact=False, monkeypatch=None):
+    monkeypatch.setattr(incremental, 'ENABLED', False)
+    df = FileHandlerTool().forward(path, compact=compact)
+    monkeypatch.setattr(incremental, 'ENABLED', True)
+    return df, session.get_quality()
+
+
+def _without_timing(report):
+    return {key: value for key, value in report.items() if key != 'seconds'}
+
+
+def test_append_prepares_only_the_tail_and_matches_a_full_load(monkeypatch):
+    _orders(0, 200, seed=1).to_csv('sales.csv', index=False)
+    FileHandlerTool().forward('sales.csv')
+
+    tail = _orders(200, 20, seed=2)
+    tail.loc[3, 'SALES'] = np.nan
+    tail.loc[5, 'DEALSIZE'] = 'Huge'
+    tail.loc[7, 'ORDERNUMBER'] = 10  # duplicates an order line loaded before
+    _append('sales.csv', tail)
+    checked, check_quality = [], file_handler.check_quality
+    monkeypatch.setattr(file_handler, 'check_quality', lambda df: checked.append(len(df)) or check_quality(df))
+    df = FileHandlerTool().forward('sales.csv')
+    quality = session.get_quality()
+
+    assert checked == [20]
+    monkeypatch.setattr(file_handler, 'check_quality', check_quality)
+    expected, expected_quality = _full_load('sales.csv', monkeypatch=monkeypatch)
+    pd.testing.assert_frame_equal(df, expected)
+    assert _without_timing(quality) == _without_timing(expected_quality)
+    assert {r['rule']: r['violations'] for r in quality['rules']}['order_line_unique'] == 2
+
+
+def test_compact_append_extends_categories_and_survives_a_reload(monkeypatch):
+    _orders(0, 300, seed=3).to_csv('sales.csv', index=False)
+    FileHandlerTool().forward('sales.csv', compact=True)
+    tail = _orders(300, 10, seed=4)
+    tail.loc[2, 'COUNTRY'] = 'Japan'
+    _append('sales.csv', tail)
+
+    df = FileHandlerTool().forward('sales.csv', compact=True)
+    reloaded = FileHandlerTool().forward('sales.csv', compact=True)
+
+    assert isinstance(df['COUNTRY'].dtype, pd.CategoricalDtype)
+    assert df['COUNTRY'].iloc[302] == 'Japan'
+    assert df['QUANTITYORDERED'].dtype == np.int32
+    pd.testing.assert_frame_equal(reloaded, df)
+    expected, _ = _full_load('sales.csv', monkeypatch=monkeypatch)
+    pd.testing.assert_frame_equal(df.astype(expected.dtypes.to_dict()), expected)
+
+
+def test_cube_update_after_append_matches_a_rebuild():
+    _orders(0, 150, seed=5).to_csv('sales.csv', index=False)
+    FileHandlerTool().forward('sales.csv')
+    _append('sales.csv', _orders(150, 40, seed=6))
+
+    df = FileHandlerTool().forward('sales.csv')
+    updated = session.get_cube(df)
+    rebuilt = AggregateCube.build(df)
+
+    assert updated.row_count == rebuilt.row_count == 190
+    stats = ('count', 'sum', 'min', 'max')
+    for dims in [(), 'COUNTRY', 'DEALSIZE', 'ORDERDATE_MONTH']:
+        pd.testing.assert_frame_equal(updated.query(dims, 'SALES', stats).sort_index(),
+                                      rebuilt.query(dims, 'SALES', stats).sort_index(), check_exact=False)
+
+
+def test_psi_pools_bins_a_short_tail_cannot_fill():
+    expected = [0.1] * 10
+    three_values = [1.0] + [0.0] * 9
+
+    assert incremental.psi(expected, three_values) > 1
+    assert incremental.psi(expected, three_values, count=3) is None
+    # 30 values: every bin expects 3, so all are pooled into one and then into nothing to compare
+    assert incremental.psi(expected, [0.1] * 10, count=30) is None
+    assert incremental.psi(expected, [0.1] * 10, count=100) == pytest.approx(0.0)
+
+    baseline = {'SALES': incremental.distribution(pd.Series(np.arange(1000.0)))}
+    assert incremental.feature_drift(baseline, pd.DataFrame({'SALES': [5.0, 6.0]})) == {'SALES': None}
+
+
+def test_refresh_redraws_every_chart_drawn_before_the_append():
+    _orders(0, 100, seed=7).to_csv('sales.csv', index=False)
+    df = FileHandlerTool().forward('sales.csv')
+    code = ("fig, ax = plt.subplots()\n"
+            "df.groupby('COUNTRY')['SALES'].sum().plot.bar(ax=ax)\n"
+            "plt.savefig('plots/sales_by_country.png')\n"
+            "plt.close(fig)\n")
+    assert not VisualizationTool().forward(code, df).startswith("❌")
+    _append('sales.csv', _orders(100, 5, seed=8).assign(COUNTRY=None))
+
+    result = IncrementalRefreshTool().forward('sales.csv')
+
+    assert "5 rows appended" in result
+    assert "redrew plots/sales_by_country.png" in result
+    assert "no new values" not in result
@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import batch
+from tools import incremental
+from tools.association import AssociationTool
+from tools.file_handler import FileHandlerTool
+from tools.memory_governor import governor
+from tools.session import session
+from tools.sql_query import SQLQueryTool
+
+
+def _job(tenant, sql_tool):
+    """What a service job does with the tools, minus the LLM: reset, load the upload, query it"""
+    batch._reset_worker_state()
+    rng = np.random.default_rng(len(tenant))
+    path = f"{tenant}.csv"
+    pd.DataFrame({'TENANT': [tenant] * 40, 'REGION': rng.choice(['n', 's'], 40),
+                  'SALES': rng.normal(100, 10, 40).round(2)}).to_csv(path, index=False)
+    df = FileHandlerTool().forward(path)
+    session.register_dataset('sales', df)
+    AssociationTool().forward(df)
+    governor.usage_report()
+    return sql_tool.forward("select distinct TENANT from sales"), sql_tool.forward("show tables")
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    state = {}
+    monkeypatch.setattr(batch, '_worker_agent', SimpleNamespace(python_executor=SimpleNamespace(state=state)))
+    return state
+
+
+def test_consecutive_jobs_do_not_see_each_other(worker):
+    sql_tool = SQLQueryTool()
+    first, _ = _job('acme', sql_tool)
+    assert 'acme' in first
+    worker['df'] = session.get_dataset('sales')
+
+    second, tables = _job('globex', sql_tool)
+    assert 'globex' in second and 'acme' not in second
+    assert 'acme' not in tables
+    assert worker == {'__name__': '__main__'}
+    assert all(set(df['TENANT']) == {'globex'} for df in session.datasets.values())
+
+
+def test_clear_empties_every_tool_cache(worker):
+    sql_tool = SQLQueryTool()
+    _job('acme', sql_tool)
+    assert governor.total_bytes([e for e in governor.measure() if e['kind'] == 'cache']) > 0
+
+    session.clear()
+
+    assert governor._sizes == {}
+    assert sum(e['bytes'] for e in governor.measure() if e['kind'] == 'cache') == 0
+    assert sql_tool._connection is None
+    assert incremental._states == {}
@@ -0,0 +1,38 @@
+import pandas as pd
+
+from tools.session import session
+from tools.sql_query import SQLQueryTool
+
+
+def _rows(result):
+    return result.splitlines()[1:]
+
+
+def test_tables_follow_session_clear():
+    tool = SQLQueryTool()
+    for job in range(20):
+        session.clear()
+        session.register_dataset('sales', pd.DataFrame({'tenant': [f"tenant_{job}"] * 3, 'SALES': [1.0, 2.0, 3.0]}))
+        result = tool.forward("select distinct tenant from sales")
+        assert _rows(result)[-1].strip() == f"tenant_{job}", result
+
+
+def test_earlier_session_tables_are_gone_after_clear():
+    tool = SQLQueryTool()
+    session.register_dataset('orders', pd.DataFrame({'tenant': ['a']}))
+    tool.forward("create table kept as select * from orders")
+    assert tool.forward("select * from kept").startswith("✅")
+
+    session.clear()
+    session.register_dataset('sales', pd.DataFrame({'tenant': ['b']}))
+    assert tool.forward("select * from orders").startswith("❌")
+    assert tool.forward("select * from kept").startswith("❌")
+
+
+def test_df_table_sees_in_place_edits():
+    tool = SQLQueryTool()
+    df = pd.DataFrame({'SALES': [1.0, 2.0, 3.0]})
+    assert _rows(tool.forward("select sum(SALES) as total from df", df=df))[-1].strip() == "6.0"
+    df.loc[0, 'SALES'] = 10.0
+    assert _rows(tool.forward("select sum(SALES) as total from df", df=df))[-1].strip() == "15.0"
+    assert tool.forward("select * from df").startswith("❌")
@@ -0,0 +1,301 @@
+import re
+from tools.lazy_imports import load
+
+# Integer columns with these names are treated as calendar dimensions
+DATE_PART_PATTERN = re.compile(r'(^|_)(YEAR|QTR|QUARTER|MONTH|WEEK|DAY)(_ID)?$', re.IGNORECASE)
+# Numeric columns with these names are identifiers, not measures. ID must be a whole name part
+# (CUSTOMER_ID, ID) so measures such as PAID are kept; NUMBER/CODE also end joined names (ORDERNUMBER)
+IDENTIFIER_PATTERN = re.compile(r'((^|_)ID|NUMBER|CODE)$', re.IGNORECASE)
+# Contact details repeat per customer and are never useful as roll-up dimensions
+CONTACT_PATTERN = re.compile(r'PHONE|FAX|EMAIL|ADDRESS|POSTAL|ZIP|CONTACT', re.IGNORECASE)
+
+STATS = ('count', 'sum', 'min', 'max')
+
+
+def is_identifier(column) -> bool:
+    """True for column names of identifiers and codes rather than measures"""
+    return bool(IDENTIFIER_PATTERN.search(str(column)))
+
+
+def _calendar_prefix(column) -> str:
+    """'ORDERDATE_' for ORDERDATE_MONTH, '' for MONTH_ID"""
+    return DATE_PART_PATTERN.sub('', str(column))
+
+
+class QuantileSketch:
+    """Mergeable quantile summary made of at most max_centroids (mean, weight) centroids"""
+
+    def __init__(self, means, weights, max_centroids: int = 64):
+        self.means = means
+        self.weights = weights
+        self.max_centroids = max_centroids
+
+    @classmethod
+    def from_values(cls, values, max_centroids: int = 64):
+        np = load("numpy")
+        values = np.sort(np.asarray(values, dtype=float))
+        return cls.from_sorted(values[~np.isnan(values)], max_centroids)
+
+    @classmethod
+    def from_sorted(cls, values, max_centroids: int = 64):
+        """Build from values that are already sorted and free of NaN"""
+        np = load("numpy")
+        if len(values) <= max_centroids:
+            return cls(values, np.ones(len(values)), max_centroids)
+        # Equal-count buckets over the sorted values
+        starts = np.linspace(0, len(values), max_centroids + 1).astype(int)[:-1]
+        weights = np.diff(np.append(starts, len(values))).astype(float)
+        means = np.add.reduceat(values, starts) / weights
+        return cls(means, weights, max_centroids)
+
+    def merge(self, other):
+        """Combine two sketches into a new one without touching the raw rows"""
+        np = load("numpy")
+        means = np.concatenate([self.means, other.means])
+        weights = np.concatenate([self.weights, other.weights])
+        order = np.argsort(means, kind='mergesort')
+        means, weights = means[order], weights[order]
+        max_centroids = max(self.max_centroids, other.max_centroids)
+        if len(means) <= max_centroids:
+            return QuantileSketch(means, weights, max_centroids)
+
+        # Re-bucket by cumulative weight so every centroid holds a similar share
+        cumulative = np.cumsum(weights) - weights
+        buckets = np.minimum((cumulative / weights.sum() * max_centroids).astype(int), max_centroids - 1)
+        starts = np.flatnonzero(np.diff(np.concatenate([[-1], buckets])))
+        merged_weights = np.add.reduceat(weights, starts)
+        merged_means = np.add.reduceat(means * weights, starts) / merged_weights
+        return QuantileSketch(merged_means, merged_weights, max_centroids)
+
+    def quantile(self, q):
+        np = load("numpy")
+        if len(self.means) == 0:
+            return float('nan')
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(q * self.weights.sum(), centers, self.means))
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+
+class AggregateCube:
+    """Materialized aggregates of a fact table over its business dimensions.
+
+    The cube stores count/sum/min/max per cell, plus optional quantile
+    sketches, for every single dimension, the calendar hierarchy and any
+    extra dimension combinations. Queries roll up from the smallest
+    materialized cuboid, so they cost O(cells) instead of O(rows). New rows
+    are folded in with update() without rescanning the history.
+    """
+
+    def __init__(self, dimensions, measures, date_columns, max_centroids: int = 64, with_quantiles: bool = True):
+        self.dimensions = list(dimensions)
+        self.measures = list(measures)
+        self.date_columns = list(date_columns)
+        self.max_centroids = max_centroids
+        self.with_quantiles = with_quantiles
+        self.cuboids = {}
+        self.sketches = {}
+        self.row_count = 0
+
+    @classmethod
+    def build(cls, df, dimensions=None, measures=None, max_cardinality: int = 200, extra_cuboids=None,
+              with_quantiles: bool = True, max_centroids: int = 64):
+        """Detect dimensions and measures (unless given) and materialize the cube"""
+        pd = load("pandas")
+
+        date_columns = [col for col in df.columns if pd.api.types.is_datetime64_any_dtype(df[col])]
+        frame = cls._with_date_parts(df, date_columns)
+
+        if dimensions is None:
+            dimensions = []
+            for col in frame.columns:
+                series = frame[col]
+                if pd.api.types.is_bool_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+                    continue
+                if CONTACT_PATTERN.search(str(col)):
+                    continue
+                is_text = not pd.api.types.is_numeric_dtype(series)
+                is_calendar = pd.api.types.is_numeric_dtype(series) and DATE_PART_PATTERN.search(str(col))
+                if not (is_text or is_calendar):
+                    continue
+                if 1 < series.nunique(dropna=True) <= max_cardinality:
+                    dimensions.append(col)
+
+        if measures is None:
+            measures = [col for col in frame.select_dtypes(include='number').columns
+                        if col not in dimensions and not is_identifier(col)]
+
+        cube = cls(dimensions, measures, date_columns, max_centroids=max_centroids, with_quantiles=with_quantiles)
+        for dims in cube._cuboid_layout(extra_cuboids):
+            cube.cuboids[dims], cube.sketches[dims] = cube._aggregate(frame, dims)
+        cube.row_count = len(frame)
+        return cube
+
+    @staticmethod
+    def _with_date_parts(df, date_columns):
+        """Add YEAR/QTR/MONTH columns derived from datetime columns"""
+        if not date_columns:
+            return df
+        frame = df.copy(deep=False)
+        for col in date_columns:
+            frame[f"{col}_YEAR"] = df[col].dt.year
+            frame[f"{col}_QTR"] = df[col].dt.quarter
+            frame[f"{col}_MONTH"] = df[col].dt.month
+        return frame
+
+    def _cuboid_layout(self, extra_cuboids=None):
+        """Grand total, every single dimension, calendar hierarchies and requested extras"""
+        layout = [()] + [(dim,) for dim in self.dimensions]
+
+        calendar = [dim for dim in self.dimensions if DATE_PART_PATTERN.search(str(dim))]
+        years = [dim for dim in calendar if re.search('YEAR', str(dim), re.IGNORECASE)]
+        for year in years:
+            for part in calendar:
+                if part != year and _calendar_prefix(part) == _calendar_prefix(year) \
+                        and re.search('QTR|QUARTER|MONTH', str(part), re.IGNORECASE):
+                    layout.append((year, part))
+        for year in years:
+            # Each categorical dimension broken down by year is a very common view
+            for dim in self.dimensions:
+                if dim not in calendar:
+                    layout.append((year, dim))
+
+        for dims in extra_cuboids or []:
+            dims = tuple(dims)
+            missing = [dim for dim in dims if dim not in self.dimensions]
+            if missing:
+                raise ValueError(f"Unknown cube dimensions: {missing}")
+            layout.append(dims)
+
+        unique = []
+        for dims in layout:
+            if dims not in unique:
+                unique.append(dims)
+        return unique
+
+    def _aggregate(self, frame, dims):
+        """count/sum/min/max (and sketches) of every measure for one cuboid"""
+        pd = load("pandas")
+        np = load("numpy")
+        measures = frame[self.measures]
+
+        if not dims:
+            table = pd.DataFrame({(m, stat): [getattr(measures[m], stat)()] for m in self.measures for stat in STATS})
+            sketches = {(): {m: QuantileSketch.from_values(measures[m].to_numpy(), self.max_centroids)
+                             for m in self.measures}} if self.with_quantiles else {}
+            return table, sketches
+
+        groupby = frame.groupby(list(dims), dropna=False, observed=True, sort=False)
+        table = groupby[self.measures].agg(list(STATS))
+
+        sketches = {}
+        if self.with_quantiles:
+            keys = [k if isinstance(k, tuple) else (k,) for k in table.index]
+            sketches = {key: {} for key in keys}
+            codes = groupby.ngroup().to_numpy()
+            for m in self.measures:
+                # One sort per measure orders rows by (cell, value); each cell is then a contiguous slice
+                values = measures[m].to_numpy(dtype=float)
+                valid = ~np.isnan(values)
+                cell_codes, values = codes[valid], values[valid]
+                order = np.lexsort((values, cell_codes))
+                cell_codes, values = cell_codes[order], values[order]
+                starts = np.flatnonzero(np.diff(cell_codes, prepend=-1))
+                for start, end in zip(starts, np.append(starts[1:], len(values))):
+                    sketches[keys[cell_codes[start]]][m] = QuantileSketch.from_sorted(values[start:end], self.max_centroids)
+                empty = QuantileSketch.from_sorted(values[:0], self.max_centroids)
+                for by_measure in sketches.values():
+                    by_measure.setdefault(m, empty)
+        return table, sketches
+
+    @property
+    def n_cells(self) -> int:
+        return sum(len(table) for table in self.cuboids.values())
+
+    def _best_cuboid(self, dims):
+        candidates = [c for c in self.cuboids if set(dims) <= set(c)]
+        if not candidates:
+            raise ValueError(f"No materialized cuboid covers {list(dims)}; available: {[list(c) for c in self.cuboids]}")
+        return min(candidates, key=lambda c: len(self.cuboids[c]))
+
+    def query(self, dimensions, measure: str, stats=('sum',), quantiles=None, top: int = None, ascending: bool = False):
+        """Aggregate a measure by the given dimensions from the materialized cells.
+
+        stats may contain count, sum, min, max and mean; quantiles (e.g. [0.5, 0.9])
+        are answered from merged sketches. With top, the result is sorted by the
+        first stat and truncated.
+        """
+        pd = load("pandas")
+        dims = tuple([dimensions] if isinstance(dimensions, str) else dimensions)
+        if measure not in self.measures:
+            raise ValueError(f"Unknown measure '{measure}'; available: {self.measures}")
+        source = self._best_cuboid(dims)
+        table = self.cuboids[source][measure]
+
+        if dims == source:
+            rolled = table.copy()
+        elif not dims:
+            rolled = pd.DataFrame({'count': [table['count'].sum()], 'sum': [table['sum'].sum()],
+                                   'min': [table['min'].min()], 'max': [table['max'].max()]})
+        else:
+            levels = [source.index(d) for d in dims]
+            rolled = table.groupby(level=levels, dropna=False, observed=True).agg(
+                {'count': 'sum', 'sum': 'sum', 'min': 'min', 'max': 'max'})
+        rolled['mean'] = rolled['sum'] / rolled['count']
+
+        result = rolled[[s for s in stats if s != 'quantile']].copy()
+        if quantiles:
+            if not self.with_quantiles:
+                raise ValueError("This cube was built without quantile sketches")
+            merged = {}
+            for key, by_measure in self.sketches[source].items():
+                target = tuple(key[source.index(d)] for d in dims)
+                sketch = by_measure[measure]
+                merged[target] = merged[target].merge(sketch) if target in merged else sketch
+            keys = [()] if not dims else [k if isinstance(k, tuple) else (k,) for k in rolled.index]
+            for q in quantiles:
+                result[f"p{int(round(q * 100))}"] = [merged[k].quantile(q) if k in merged else float('nan') for k in keys]
+
+        if top is not None and len(result.columns):
+            result = result.sort_values(result.columns[0], ascending=ascending).head(top)
+        return result
+
+    def update(self, new_rows):
+        """Fold appended rows into every cuboid without rescanning existing rows"""
+        pd = load("pandas")
+        if len(new_rows) == 0:
+            return self
+        frame = self._with_date_parts(new_rows, self.date_columns)
+        for dims in list(self.cuboids):
+            delta, delta_sketches = self._aggregate(frame, dims)
+            current = self.cuboids[dims]
+            if not dims:
+                combined = current.copy()
+                for m in self.measures:
+                    combined[(m, 'count')] += delta[(m, 'count')]
+                    combined[(m, 'sum')] += delta[(m, 'sum')]
+                    combined[(m, 'min')] = min(current[(m, 'min')].iloc[0], delta[(m, 'min')].iloc[0])
+                    combined[(m, 'max')] = max(current[(m, 'max')].iloc[0], delta[(m, 'max')].iloc[0])
+            else:
+                stacked = pd.concat([current, delta])
+                how = {(m, stat): ('sum' if stat in ('count', 'sum') else stat) for m in self.measures for stat in STATS}
+                combined = stacked.groupby(level=list(range(len(dims))), dropna=False, observed=True).agg(how)
+            self.cuboids[dims] = combined
+
+            sketches = self.sketches.get(dims, {})
+            for key, by_measure in delta_sketches.items():
+                if key in sketches:
+                    sketches[key] = {m: sketches[key][m].merge(s) for m, s in by_measure.items()}
+                else:
+                    sketches[key] = by_measure
+            self.sketches[dims] = sketches
+
+        self.row_count += len(frame)
+        return self
+
+    def describe(self) -> str:
+        return (f"AggregateCube: {self.row_count} rows -> {self.n_cells} cells in {len(self.cuboids)} cuboids\n"
+                f"   Dimensions: {self.dimensions}\n"
+                f"   Measures: {self.measures}")
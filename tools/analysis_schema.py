@@ -0,0 +1,188 @@
+import ast
+import json
+from dataclasses import dataclass, field, fields
+
+
+@dataclass
+class ModelSummary:
+    """Machine learning section of the analysis result"""
+    task: str = None
+    artifacts: dict = field(default_factory=dict)
+    top_features_sample: list = field(default_factory=list)
+    notes: str = None
+    extra: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ModelSummary":
+        known = {f.name for f in fields(cls)} - {'extra'}
+        features = data.get('top_features_sample') or data.get('feature_importances') or []
+        if isinstance(features, dict):
+            features = [{'feature': k, 'importance': v} for k, v in features.items()]
+        return cls(
+            task=_as_text(data.get('task')),
+            artifacts=data.get('artifacts') if isinstance(data.get('artifacts'), dict) else {},
+            top_features_sample=[f if isinstance(f, dict) else {'feature': str(f)} for f in features],
+            notes=_as_text(data.get('notes')),
+            extra={k: v for k, v in data.items() if k not in known and k != 'feature_importances'},
+        )
+
+    def to_dict(self) -> dict:
+        data = dict(self.extra)
+        data.update({k: v for k, v in (('task', self.task), ('artifacts', self.artifacts),
+                                       ('top_features_sample', self.top_features_sample),
+                                       ('notes', self.notes)) if v})
+        return data
+
+
+@dataclass
+class AnalysisResult:
+    """Typed form of the analysis JSON the agent returns with final_answer().
+
+    Field names are the keys ReportGeneratorTool reads. Values are coerced to
+    the expected shapes (e.g. a single recommendation string becomes a list)
+    and unknown keys are kept in extra so nothing the model wrote is lost.
+    """
+    title: str = 'Data Analysis Report'
+    dataset_overview: dict = field(default_factory=dict)
+    eda_summary: dict = field(default_factory=dict)
+    analysis_sections: list = field(default_factory=list)
+    key_findings: dict = field(default_factory=dict)
+    plot_descriptions: dict = field(default_factory=dict)
+    model: ModelSummary = None
+    recommendations: list = field(default_factory=list)
+    conclusion: str = None
+    extra: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "AnalysisResult":
+        if not isinstance(data, dict):
+            raise TypeError(f"Analysis result must be a JSON object, got {type(data).__name__}")
+        known = {f.name for f in fields(cls)} - {'extra'}
+
+        findings = data.get('key_findings') or {}
+        if isinstance(findings, list):
+            findings = {f"finding_{i + 1}": item for i, item in enumerate(findings)}
+        elif not isinstance(findings, dict):
+            findings = {'summary': str(findings)}
+
+        recommendations = data.get('recommendations') or []
+        if isinstance(recommendations, str):
+            recommendations = [recommendations]
+        elif isinstance(recommendations, dict):
+            recommendations = [f"{k}: {v}" for k, v in recommendations.items()]
+
+        descriptions = data.get('plot_descriptions') or {}
+        if isinstance(descriptions, list):
+            descriptions = {d.get('path', ''): d.get('description', '') for d in descriptions if isinstance(d, dict)}
+
+        model = data.get('model')
+        return cls(
+            title=_as_text(data.get('title')) or cls.title,
+            dataset_overview=_as_dict(data.get('dataset_overview')),
+            eda_summary=_as_dict(data.get('eda_summary')),
+            analysis_sections=[s for s in (data.get('analysis_sections') or []) if isinstance(s, dict)],
+            key_findings=findings,
+            plot_descriptions={str(k).replace('\\', '/'): str(v) for k, v in descriptions.items()},
+            model=ModelSummary.from_dict(model) if isinstance(model, dict) else None,
+            recommendations=[str(r) for r in recommendations],
+            conclusion=_as_text(data.get('conclusion')),
+            extra={k: v for k, v in data.items() if k not in known},
+        )
+
+    def to_dict(self) -> dict:
+        """Plain dict for ReportGeneratorTool; empty sections are left out so its defaults apply"""
+        data = dict(self.extra)
+        for f in fields(self):
+            if f.name == 'extra':
+                continue
+            value = getattr(self, f.name)
+            if isinstance(value, ModelSummary):
+                value = value.to_dict()
+            if value:
+                data[f.name] = value
+        return data
+
+
+def _as_text(value):
+    if value is None:
+        return None
+    return value if isinstance(value, str) else json.dumps(value, default=str)
+
+
+def _as_dict(value) -> dict:
+    return value if isinstance(value, dict) else {}
+
+
+class JSONObjectExtractor:
+    """Incrementally find top-level JSON objects in streamed text.
+
+    Tracks brace depth outside string literals, so braces inside strings and
+    text around the object (prose, code fences, 'final_answer(...)') do not
+    confuse it. Objects written as Python dict literals (single quotes,
+    True/None) are accepted as well.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._depth = 0
+        self._quote = None
+        self._escaped = False
+        self.objects = []
+
+    def feed(self, chunk: str) -> list:
+        """Consume more text and return the objects completed by it"""
+        completed = []
+        for char in chunk:
+            if self._depth == 0:
+                if char == '{':
+                    self._buffer = ['{']
+                    self._depth = 1
+                continue
+            self._buffer.append(char)
+            if self._quote:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == self._quote:
+                    self._quote = None
+            elif char in ('"', "'"):
+                self._quote = char
+            elif char == '{':
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    parsed = _parse_object(''.join(self._buffer))
+                    if parsed is not None:
+                        completed.append(parsed)
+        self.objects.extend(completed)
+        return completed
+
+
+def _parse_object(text: str):
+    try:
+        value = json.loads(text)
+    except ValueError:
+        try:
+            value = ast.literal_eval(text)
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            return None
+    return value if isinstance(value, dict) else None
+
+
+def extract_analysis(final_result) -> AnalysisResult:
+    """Analysis result from the agent's final answer (dict, JSON text or text around JSON).
+
+    When the text holds several objects, the one with the most known analysis
+    keys wins (ties go to the later, usually final, object).
+    """
+    if isinstance(final_result, dict):
+        return AnalysisResult.from_dict(final_result)
+    extractor = JSONObjectExtractor()
+    extractor.feed(str(final_result))
+    if not extractor.objects:
+        raise ValueError("No JSON object found in the final answer")
+    known = {f.name for f in fields(AnalysisResult)}
+    best = max(reversed(extractor.objects), key=lambda obj: len(known & set(obj)))
+    return AnalysisResult.from_dict(best)
@@ -0,0 +1,272 @@
+from smolagents import Tool
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from tools.lazy_imports import load
+from tools.session import session
+from tools.aggregate_cube import is_identifier
+
+DEFAULT_GROUPS = ['PRODUCTLINE', 'DEALSIZE']
+METHODS = ('both', 'robust', 'isolation_forest')
+# Iglewicz-Hoaglin cut-off for the modified z-score
+ROBUST_THRESHOLD = 3.5
+MAD_SCALE = 0.6745
+# Groups smaller than this are scored against the statistics of all rows instead
+MIN_GROUP_SIZE = 20
+# Below this many rows the forests are fitted in-process; worker start-up would dominate
+PARALLEL_MIN_ROWS = 50_000
+FOREST_TREES = 100
+# Upper bound on fitted forests; more groups than this share forests
+MAX_FORESTS = 16
+
+
+def default_features(df):
+    """Numeric columns that are measurements rather than identifiers or codes"""
+    pd = load("pandas")
+    features = []
+    for col in df.columns:
+        series = df[col]
+        if not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+            continue
+        if is_identifier(col):
+            continue
+        if pd.api.types.is_integer_dtype(series) and series.nunique() == len(series):
+            continue
+        features.append(col)
+    return features
+
+
+def group_codes(df, group_columns):
+    """Integer group id per row (-1 for rows with a missing key) and the group sizes"""
+    np = load("numpy")
+    if not group_columns:
+        return np.zeros(len(df), dtype=np.int64), np.asarray([len(df)])
+    codes = df.groupby(list(group_columns), sort=False, observed=True, dropna=True).ngroup()
+    codes = codes.fillna(-1).to_numpy(dtype=np.int64)
+    sizes = np.bincount(codes[codes >= 0]) if (codes >= 0).any() else np.zeros(0, dtype=np.int64)
+    return codes, sizes
+
+
+def robust_scores(df, value_columns, codes, sizes, min_group_size: int = MIN_GROUP_SIZE):
+    """Modified z-scores (x - median) / MAD of each value column within its group.
+
+    Medians and MADs come from grouped transforms, so the cost is a few sorts
+    regardless of the number of groups. Rows in groups smaller than
+    min_group_size, or whose group has a MAD of zero, use all rows' statistics.
+    Returns an (n_rows, n_columns) array.
+    """
+    np = load("numpy")
+    pd = load("pandas")
+    values = df[list(value_columns)].astype(float).reset_index(drop=True)
+    keys = pd.Series(codes)
+    small = (codes < 0) | (sizes[np.maximum(codes, 0)] < min_group_size) if len(sizes) else np.ones(len(df), dtype=bool)
+
+    grouped = values.groupby(keys)
+    median = grouped.transform('median')
+    mad = (values - median).abs().groupby(keys).transform('median')
+
+    global_median = values.median()
+    global_mad = (values - global_median).abs().median()
+    # Fall back to the mean absolute deviation where more than half the values are identical
+    global_mad = global_mad.where(global_mad > 0, (values - global_median).abs().mean() * 1.2533)
+
+    fallback = small[:, None] | ~(mad.to_numpy() > 0)
+    median = np.where(fallback, global_median.to_numpy()[None, :], median.to_numpy())
+    mad = np.where(fallback, global_mad.to_numpy()[None, :], mad.to_numpy())
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores = MAD_SCALE * (values.to_numpy() - median) / mad
+    return np.where(np.isfinite(scores), scores, 0.0)
+
+
+def _fit_forests(blocks, n_estimators: int, seed: int):
+    """Fit one IsolationForest per (row positions, feature matrix) block; runs in a worker process"""
+    np = load("numpy")
+    ensemble = load("sklearn.ensemble")
+    results = []
+    for positions, X in blocks:
+        forest = ensemble.IsolationForest(n_estimators=n_estimators, random_state=seed, n_jobs=1)
+        forest.fit(X)
+        # score_samples is the negated anomaly score from the paper, in (0, 1]
+        results.append((positions, -forest.score_samples(X)))
+    return results
+
+
+def isolation_scores(df, feature_columns, codes, sizes, min_group_size: int = MIN_GROUP_SIZE,
+                     n_estimators: int = FOREST_TREES, seed: int = 0, workers: int = None):
+    """IsolationForest anomaly score of every row relative to its group.
+
+    Features are first converted to per-group modified z-scores, so a row is
+    judged against its own group and missing values sit at the group median.
+    With up to MAX_FORESTS groups every group gets its own forest; beyond that
+    groups share forests by group id, which bounds the number of fits while
+    the standardization keeps the scores group-relative. Rows of small groups
+    share one forest. Forests are fitted and applied in parallel on a process
+    pool. Returns an array in (0, 1]; above ~0.6 is clearly anomalous.
+    """
+    np = load("numpy")
+    X = robust_scores(df, feature_columns, codes, sizes, min_group_size)
+
+    small = (codes < 0) | (sizes[np.maximum(codes, 0)] < min_group_size) if len(sizes) else np.ones(len(df), dtype=bool)
+    keys = np.where(small, -1, codes % MAX_FORESTS)
+    order = np.argsort(keys, kind='stable')
+    bounds = np.flatnonzero(np.diff(keys[order])) + 1
+    blocks = [(positions, X[positions]) for positions in np.split(order, bounds) if len(positions) > 1]
+
+    workers = workers or os.cpu_count() or 1
+    if len(df) < PARALLEL_MIN_ROWS or workers <= 1 or len(blocks) <= 1:
+        fitted = _fit_forests(blocks, n_estimators, seed)
+    else:
+        # Greedy packing so every worker gets a similar number of rows
+        chunks = [[] for _ in range(min(workers, len(blocks)))]
+        loads = np.zeros(len(chunks))
+        for block in sorted(blocks, key=lambda b: -len(b[0])):
+            target = int(loads.argmin())
+            chunks[target].append(block)
+            loads[target] += len(block[0])
+        with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+            futures = [pool.submit(_fit_forests, chunk, n_estimators, seed) for chunk in chunks]
+            fitted = [result for future in futures for result in future.result()]
+
+    scores = np.full(len(df), 0.5)
+    for positions, block_scores in fitted:
+        scores[positions] = block_scores
+    return scores
+
+
+def detect_anomalies(df, value_columns, group_columns, feature_columns, method: str = 'both',
+                     threshold: float = ROBUST_THRESHOLD, contamination: float = 0.01,
+                     min_group_size: int = MIN_GROUP_SIZE):
+    """Score every row and return them ranked, most anomalous first.
+
+    Rows are flagged when any value column's modified z-score exceeds the
+    threshold, or when their forest score is in the top `contamination`
+    fraction. With both detectors, anomaly_score is the mean of the two
+    percentile ranks.
+    """
+    np = load("numpy")
+    codes, sizes = group_codes(df, group_columns)
+    scored = df[list(dict.fromkeys(list(group_columns) + list(value_columns) + list(feature_columns)))].reset_index()
+    scored = scored.rename(columns={scored.columns[0]: 'row'})
+
+    flags, ranks = np.zeros(len(df), dtype=bool), []
+    if method in ('both', 'robust') and value_columns:
+        z = robust_scores(df, value_columns, codes, sizes, min_group_size)
+        for i, col in enumerate(value_columns):
+            scored[f'{col}_robust_z'] = z[:, i]
+        scored['max_abs_z'] = np.abs(z).max(axis=1)
+        flags |= scored['max_abs_z'].to_numpy() > threshold
+        ranks.append(scored['max_abs_z'].rank(pct=True))
+    if method in ('both', 'isolation_forest') and feature_columns:
+        scored['forest_score'] = isolation_scores(df, feature_columns, codes, sizes, min_group_size)
+        cutoff = scored['forest_score'].quantile(1 - contamination)
+        flags |= scored['forest_score'].to_numpy() >= cutoff
+        ranks.append(scored['forest_score'].rank(pct=True))
+
+    scored['anomaly_score'] = sum(ranks) / len(ranks)
+    scored['is_anomaly'] = flags
+    scored['group_size'] = np.where(codes >= 0, sizes[np.maximum(codes, 0)] if len(sizes) else 0, 0)
+    return scored.sort_values(['is_anomaly', 'anomaly_score'], ascending=False, kind='stable').reset_index(drop=True)
+
+
+class AnomalyDetectionTool(Tool):
+    name = "anomaly_detection_tool"
+    description = "Find rows that are anomalous for their group, e.g. an order whose SALES is unusual for its PRODUCTLINE and DEALSIZE. Combines robust per-group statistics (modified z-score from the group median and MAD) on the value columns with multivariate IsolationForest models on the group-standardized feature columns, fitted per group in parallel. Returns the ranked anomalies with scores, writes them to results/anomalies.csv and registers all scored rows as dataset 'anomalies'."
+    inputs = {
+        "df": {
+            "type": "object",
+            "description": "Pandas DataFrame to analyze (default: the most recently loaded dataset)",
+            "nullable": True
+        },
+        "value_columns": {
+            "type": "array",
+            "description": "Columns scored with per-group median/MAD (default ['SALES'], else all measurement columns)",
+            "nullable": True
+        },
+        "group_columns": {
+            "type": "array",
+            "description": "Columns defining the groups, e.g. ['PRODUCTLINE', 'DEALSIZE'] (default); [] for none",
+            "nullable": True
+        },
+        "feature_columns": {
+            "type": "array",
+            "description": "Numeric columns for the IsolationForest (default: all measurement columns such as QUANTITYORDERED, PRICEEACH, SALES, MSRP)",
+            "nullable": True
+        },
+        "method": {
+            "type": "string",
+            "description": "both (default), robust or isolation_forest",
+            "nullable": True
+        },
+        "threshold": {
+            "type": "number",
+            "description": "Modified z-score above which a value is anomalous (default 3.5)",
+            "nullable": True
+        },
+        "contamination": {
+            "type": "number",
+            "description": "Fraction of rows flagged by the IsolationForest (default 0.01)",
+            "nullable": True
+        },
+        "top": {
+            "type": "integer",
+            "description": "Number of anomalies to list (default 20)",
+            "nullable": True
+        }
+    }
+    output_type = "string"
+
+    def forward(self, df=None, value_columns: list = None, group_columns: list = None, feature_columns: list = None,
+                method: str = None, threshold: float = None, contamination: float = None, top: int = None) -> str:
+        """Score all rows, rank them and summarize the anomalies"""
+        try:
+            started = time.perf_counter()
+            df = df if df is not None else session.get_dataset()
+            if df is None:
+                return "❌ Error detecting anomalies: no DataFrame given and no dataset loaded"
+            method = (method or 'both').lower()
+            if method not in METHODS:
+                return f"❌ Unknown method: {method}. Use {', '.join(METHODS)}"
+            threshold = ROBUST_THRESHOLD if threshold is None else float(threshold)
+            contamination = 0.01 if contamination is None else min(max(float(contamination), 0.0001), 0.5)
+            top = 20 if top is None else max(1, int(top))
+
+            measurements = default_features(df)
+            if value_columns is None:
+                value_columns = ['SALES'] if 'SALES' in df.columns else measurements
+            if group_columns is None:
+                group_columns = [c for c in DEFAULT_GROUPS if c in df.columns]
+            if feature_columns is None:
+                feature_columns = measurements
+            missing = [c for c in list(value_columns) + list(group_columns) + list(feature_columns) if c not in df.columns]
+            if missing:
+                return f"❌ Error detecting anomalies: columns not found: {missing}"
+            if not value_columns and not feature_columns:
+                return "❌ Error detecting anomalies: no numeric columns to score"
+
+            ranked = detect_anomalies(df, list(value_columns), list(group_columns), list(feature_columns),
+                                      method, threshold, contamination)
+            elapsed = time.perf_counter() - started
+
+            os.makedirs('results', exist_ok=True)
+            output_path = 'results/anomalies.csv'
+            flagged = ranked[ranked['is_anomaly']]
+            flagged.to_csv(output_path, index=False)
+            session.register_dataset('anomalies', ranked, source=self.name)
+            n_groups = ranked.groupby(list(group_columns), observed=True).ngroups if group_columns else 1
+            lines = [
+                f"✅ Scored {len(ranked):,} rows in {n_groups} groups in {elapsed:.2f}s: {len(flagged):,} anomalies "
+                f"({method}; groups: {', '.join(group_columns) or 'none'})",
+                f"Saved the anomalies to {output_path}; all scored rows are dataset 'anomalies' ('row' is the index in the input)",
+            ]
+            if group_columns and len(flagged):
+                per_group = flagged.groupby(list(group_columns), observed=True).size().sort_values(ascending=False)
+                lines.append("\nAnomalies per group:")
+                lines.append(per_group.head(10).to_string())
+            lines.append(f"\nTop {min(top, len(ranked))} rows:")
+            shown = ['row'] + list(group_columns) + [c for c in ranked.columns if c in value_columns or c.endswith('_robust_z')
+                                                     or c in ('forest_score', 'anomaly_score', 'is_anomaly')]
+            lines.append(ranked[list(dict.fromkeys(shown))].head(top).round(3).to_string(index=False))
+            return "\n".join(lines)
+
+        except Exception as e:
+            return f"❌ Error detecting anomalies: {str(e)}"
@@ -0,0 +1,285 @@
+from smolagents import Tool
+import os
+import threading
+import time
+from collections import OrderedDict
+from tools.lazy_imports import load
+from tools.session import session
+from tools.memory_governor import governor
+from tools.exec_cache import dataset_fingerprint
+
+# Categorical columns with more levels than this are treated as identifiers and skipped
+DEFAULT_MAX_CATEGORIES = 50
+ASSOCIATION_CACHE_SIZE = 16
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_bytes() -> int:
+    with _cache_lock:
+        return sum(matrix.memory_usage(deep=True).sum() + kinds.memory_usage(deep=True).sum()
+                   for matrix, kinds, _ in _cache.values())
+
+
+def _clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+governor.register_cache("association_tool.matrices", _cache_bytes, _clear_cache, owner="association_tool")
+
+
+def classify_columns(df, max_categories: int = DEFAULT_MAX_CATEGORIES):
+    """Split columns into numeric, categorical and skipped (with the reason)"""
+    pd = load("pandas")
+    numeric, categorical, skipped = [], [], {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series):
+            categorical.append(col)
+        elif pd.api.types.is_numeric_dtype(series):
+            if series.nunique(dropna=True) > 1:
+                numeric.append(col)
+            else:
+                skipped[col] = "constant"
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            skipped[col] = "datetime"
+        else:
+            levels = series.nunique(dropna=True)
+            if levels < 2:
+                skipped[col] = "constant"
+            elif levels > max_categories:
+                skipped[col] = f"{levels} levels"
+            else:
+                categorical.append(col)
+    return numeric, categorical, skipped
+
+
+def _numeric_block(df, columns, method: str):
+    """Values with NaN set to 0 and the matching presence mask"""
+    np = load("numpy")
+    frame = df[columns].astype(float)
+    if method == 'spearman':
+        # Ranked per column, so with missing values this differs slightly from pairwise ranking
+        frame = frame.rank(method='average')
+    X = frame.to_numpy()
+    M = ~np.isnan(X)
+    return np.where(M, X, 0.0), M.astype(float)
+
+
+def _indicators(df, columns):
+    """Sparse one-hot matrix of all categorical columns and each column's level offsets"""
+    np = load("numpy")
+    pd = load("pandas")
+    sparse = load("scipy.sparse")
+    n = len(df)
+    rows, cols, offsets = [], [], [0]
+    for col in columns:
+        codes, _ = pd.factorize(df[col])
+        present = codes >= 0
+        rows.append(np.nonzero(present)[0])
+        cols.append(codes[present] + offsets[-1])
+        offsets.append(offsets[-1] + (codes.max() + 1 if present.any() else 0))
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    O = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n, offsets[-1]))
+    return O, np.asarray(offsets)
+
+
+def pairwise_correlation(X, M):
+    """Pearson correlation on pairwise-complete observations, as matrix products"""
+    np = load("numpy")
+    N = M.T @ M
+    Sx = X.T @ M            # sum of column i over rows where j is present
+    Sxx = (X * X).T @ M
+    Sxy = X.T @ X
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = Sxy - Sx * Sx.T / N
+        var_i = Sxx - Sx ** 2 / N
+        corr = cov / np.sqrt(var_i * var_i.T)
+    return np.clip(corr, -1.0, 1.0)
+
+
+def correlation_ratio(O, offsets, X, M):
+    """Correlation ratio (eta) of every numeric column given every categorical column"""
+    np = load("numpy")
+    C = np.asarray((O.T @ M))               # level x numeric counts
+    S = np.asarray((O.T @ X))               # level x numeric sums
+    SS = np.asarray((O.T @ (X * X)))        # level x numeric sums of squares
+    starts = offsets[:-1]
+    N = np.add.reduceat(C, starts, axis=0)
+    total = np.add.reduceat(S, starts, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        grand_mean_term = total ** 2 / N
+        sst = np.add.reduceat(SS, starts, axis=0) - grand_mean_term
+        ssb = np.add.reduceat(np.where(C > 0, S ** 2 / C, 0.0), starts, axis=0) - grand_mean_term
+        eta = np.sqrt(np.clip(ssb / sst, 0.0, 1.0))
+    return eta                               # categorical x numeric
+
+
+def cramers_v(O, offsets):
+    """Cramér's V for every pair of categorical columns from one co-occurrence matrix.
+
+    Each pair's table is a block of the counts; rows missing either column are
+    not in the block, so marginals are taken per block rather than per column.
+    """
+    np = load("numpy")
+    k = len(offsets) - 1
+    V = np.full((k, k), np.nan)
+    filled = np.flatnonzero(np.diff(offsets) > 0)   # columns with no values have no block
+    if len(filled):
+        keep = np.concatenate([np.arange(offsets[i], offsets[i + 1]) for i in filled])
+        sizes = np.diff(offsets)[filled]
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        block = np.repeat(np.arange(len(filled)), sizes)
+        counts = (O.T @ O).toarray()[np.ix_(keep, keep)]
+        row_totals = np.add.reduceat(counts, starts, axis=1)   # level x column: the level's count where that column is present
+        col_totals = np.add.reduceat(counts, starts, axis=0)   # column x level
+        n = np.add.reduceat(row_totals, starts, axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scaled = np.where(counts > 0, counts ** 2 / (row_totals[:, block] * col_totals[block, :]), 0.0)
+            chi2 = n * (np.add.reduceat(np.add.reduceat(scaled, starts, axis=0), starts, axis=1) - 1)
+            r = np.add.reduceat((row_totals > 0).astype(float), starts, axis=0)
+            c = np.add.reduceat((col_totals > 0).astype(float), starts, axis=1)
+            dof = np.minimum(r, c) - 1
+            v = np.sqrt(np.clip(chi2 / n / dof, 0.0, 1.0))
+        V[np.ix_(filled, filled)] = np.where((n > 0) & (dof > 0), v, np.nan)
+    np.fill_diagonal(V, 1.0)
+    return V
+
+
+def association_matrix(df, columns=None, method: str = 'pearson', max_categories: int = DEFAULT_MAX_CATEGORIES):
+    """Full mixed-type association matrix.
+
+    numeric-numeric pairs use Pearson or Spearman correlation, categorical-
+    categorical pairs Cramér's V and numeric-categorical pairs the correlation
+    ratio. Returns (matrix, measure names, skipped columns).
+    """
+    pd = load("pandas")
+    np = load("numpy")
+    frame = df[list(columns)] if columns else df
+    numeric, categorical, skipped = classify_columns(frame, max_categories)
+    names = numeric + categorical
+    values = np.full((len(names), len(names)), np.nan)
+    kinds = np.empty((len(names), len(names)), dtype=object)
+    p = len(numeric)
+
+    if numeric:
+        X, M = _numeric_block(frame, numeric, method)
+        values[:p, :p] = pairwise_correlation(X, M)
+        kinds[:p, :p] = method
+    if categorical:
+        O, offsets = _indicators(frame, categorical)
+        values[p:, p:] = cramers_v(O, offsets)
+        kinds[p:, p:] = 'cramers_v'
+        if numeric:
+            # The correlation ratio is defined on the raw values, not ranks
+            X, M = _numeric_block(frame, numeric, 'pearson')
+            eta = correlation_ratio(O, offsets, X, M)
+            values[p:, :p] = eta
+            values[:p, p:] = eta.T
+            kinds[p:, :p] = kinds[:p, p:] = 'correlation_ratio'
+
+    matrix = pd.DataFrame(values, index=names, columns=names)
+    return matrix, pd.DataFrame(kinds, index=names, columns=names), skipped
+
+
+class AssociationTool(Tool):
+    name = "association_tool"
+    description = "Compute the complete association matrix of a dataset in one call, across numeric and categorical columns: Pearson/Spearman correlation between numeric columns, Cramér's V between categorical columns (e.g. DEALSIZE, PRODUCTLINE, TERRITORY, STATUS) and the correlation ratio between numeric and categorical columns. Lists the strongest relationships and writes the matrix to results/association_matrix.csv. Results are cached per dataset version."
+    inputs = {
+        "df": {
+            "type": "object",
+            "description": "Pandas DataFrame to analyze (default: the most recently loaded dataset)",
+            "nullable": True
+        },
+        "columns": {
+            "type": "array",
+            "description": "Optional subset of columns (default: all)",
+            "nullable": True
+        },
+        "method": {
+            "type": "string",
+            "description": "Numeric correlation: pearson (default) or spearman",
+            "nullable": True
+        },
+        "max_categories": {
+            "type": "integer",
+            "description": "Skip categorical columns with more levels than this (default 50)",
+            "nullable": True
+        },
+        "top": {
+            "type": "integer",
+            "description": "Number of strongest pairs to list (default 15)",
+            "nullable": True
+        }
+    }
+    output_type = "string"
+
+    def forward(self, df=None, columns: list = None, method: str = None, max_categories: int = None, top: int = None) -> str:
+        """Compute (or reuse) the association matrix and summarize it"""
+        try:
+            np = load("numpy")
+            pd = load("pandas")
+            df = df if df is not None else session.get_dataset()
+            if df is None:
+                return "❌ Error computing associations: no DataFrame given and no dataset loaded"
+            method = (method or 'pearson').lower()
+            if method not in ('pearson', 'spearman'):
+                return f"❌ Unknown method: {method}. Use pearson or spearman"
+            max_categories = DEFAULT_MAX_CATEGORIES if max_categories is None else int(max_categories)
+            top = 15 if top is None else max(1, int(top))
+            if columns:
+                missing = [c for c in columns if c not in df.columns]
+                if missing:
+                    return f"❌ Error computing associations: columns not found: {missing}"
+
+            started = time.perf_counter()
+            fingerprint = dataset_fingerprint(df)
+            key = (fingerprint, tuple(columns or ()), method, max_categories) if fingerprint else None
+            with _cache_lock:
+                cached = _cache.get(key) if key else None
+                if cached is not None:
+                    _cache.move_to_end(key)
+            if cached is not None:
+                matrix, kinds, skipped = cached
+                source = "cached"
+            else:
+                matrix, kinds, skipped = association_matrix(df, columns, method, max_categories)
+                if key:
+                    with _cache_lock:
+                        _cache[key] = (matrix, kinds, skipped)
+                        while len(_cache) > ASSOCIATION_CACHE_SIZE:
+                            _cache.popitem(last=False)
+                source = "computed"
+            elapsed = time.perf_counter() - started
+
+            os.makedirs('results', exist_ok=True)
+            output_path = 'results/association_matrix.csv'
+            matrix.round(4).to_csv(output_path)
+
+            # Strongest pairs from the upper triangle
+            upper = np.triu(np.ones(matrix.shape, dtype=bool), k=1)
+            pairs = pd.DataFrame({
+                'column_a': np.repeat(matrix.index.to_numpy(), len(matrix))[upper.ravel()],
+                'column_b': np.tile(matrix.columns.to_numpy(), len(matrix))[upper.ravel()],
+                'value': matrix.to_numpy()[upper],
+                'measure': kinds.to_numpy()[upper],
+            }).dropna(subset=['value'])
+            pairs = pairs.reindex(pairs['value'].abs().sort_values(ascending=False).index).head(top)
+
+            n_numeric = int((kinds.to_numpy().diagonal() == method).sum())
+            lines = [
+                f"✅ Association matrix {source} in {elapsed:.2f}s: {len(matrix)} columns "
+                f"({n_numeric} numeric, {len(matrix) - n_numeric} categorical)",
+                f"Saved to {output_path}",
+            ]
+            if skipped:
+                lines.append("Skipped: " + ", ".join(f"{col} ({reason})" for col, reason in skipped.items()))
+            lines.append(f"\nStrongest associations ({method} for numeric pairs, Cramér's V for categorical pairs, "
+                         "correlation ratio for numeric-categorical):")
+            lines.append(pairs.round(3).to_string(index=False) if len(pairs) else "(none)")
+            return "\n".join(lines)
+
+        except Exception as e:
+            return f"❌ Error computing associations: {str(e)}"
@@ -0,0 +1,310 @@
+import io
+import json
+import os
+import pickle
+import shutil
+from datetime import datetime
+from tools.lazy_imports import load
+from tools.session import session, SpilledDataset
+from tools.exec_cache import content_signature
+
+LATEST_POINTER = "LATEST"
+
+
+def _rebuild_exception(cls, args, state):
+    exc = cls.__new__(cls)
+    exc.args = args
+    exc.__dict__.update(state)
+    return exc
+
+
+class _CheckpointPickler(pickle.Pickler):
+    """Pickler that saves exceptions without their unpicklable attributes.
+
+    Agent errors keep a reference to the logger and do not accept their
+    pickled args on reconstruction, so they are restored without calling
+    __init__. The override is local to this pickler; pickling elsewhere in
+    the process is unaffected.
+    """
+
+    def reducer_override(self, obj):
+        if isinstance(obj, BaseException):
+            state = {k: v for k, v in vars(obj).items() if _dumps(v) is not None}
+            return _rebuild_exception, (type(obj), obj.args, state)
+        return NotImplemented
+
+
+def _dumps(value):
+    """Pickled bytes of value, or None if it cannot be pickled"""
+    buffer = io.BytesIO()
+    try:
+        _CheckpointPickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(value)
+    except Exception:
+        return None
+    return buffer.getvalue()
+
+
+def _picklable(value):
+    """value itself if it pickles, else a copy without its unpicklable attributes (None if neither does)"""
+    if _dumps(value) is not None:
+        return value
+    return _without_unpicklable(value)
+
+
+def _without_unpicklable(value):
+    if not hasattr(value, '__dict__') or isinstance(value, type):
+        return None
+    clone = object.__new__(type(value))
+    for key, attr in vars(value).items():
+        clone.__dict__[key] = _picklable(attr)
+    return clone if _dumps(clone) is not None else None
+
+
+def _pickled(value):
+    """Pickled bytes of value, falling back to a copy without its unpicklable attributes"""
+    data = _dumps(value)
+    if data is None:
+        clone = _without_unpicklable(value)
+        data = _dumps(clone) if clone is not None else None
+    return data
+
+
+def _loads(data, what: str):
+    try:
+        return pickle.loads(data)
+    except Exception as e:
+        print(f"⚠️ Checkpoint value {what} not restored: {e}")
+        return None
+
+
+def _is_dataframe(value) -> bool:
+    pd = load("pandas")
+    return isinstance(value, pd.DataFrame)
+
+
+def _save_frame(df, directory: str, name: str) -> str:
+    """Save a DataFrame in Parquet, falling back to pickle for unsupported dtypes"""
+    path = os.path.join(directory, f"{name}.parquet")
+    if isinstance(df, SpilledDataset):
+        # Straight from the memory-mapped spill file, without going through pandas
+        load("pyarrow.parquet").write_table(df.arrow_table(), path)
+        return os.path.basename(path)
+    try:
+        df.to_parquet(path)
+        return os.path.basename(path)
+    except Exception:
+        path = os.path.join(directory, f"{name}.pkl")
+        df.to_pickle(path)
+        return os.path.basename(path)
+
+
+def _load_frame(path: str):
+    pd = load("pandas")
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_pickle(path)
+
+
+class SessionCheckpointer:
+    """Periodically checkpoint an agent run so it can be resumed after a crash.
+
+    Instances are used as smolagents step callbacks. Each checkpoint is a
+    directory holding the pickled agent memory, the registered DataFrames and
+    executor DataFrames in Parquet, the fitted models and a JSON manifest that
+    also lists the generated plots.
+    """
+
+    def __init__(self, directory: str = "checkpoints", every_n_steps: int = 1, keep_last: int = 3):
+        self.directory = directory
+        self.every_n_steps = max(1, every_n_steps)
+        self.keep_last = max(1, keep_last)
+        self.task = None
+        # What the previous save wrote, reused while unchanged
+        self._pickled_steps = {}
+        self._pickled_models = {}
+        self._saved_frames = {}
+
+    def attach(self, agent):
+        """Register this checkpointer as a step callback on the agent"""
+        callbacks = agent.step_callbacks
+        if hasattr(callbacks, 'register'):
+            from smolagents.memory import ActionStep
+            callbacks.register(ActionStep, self)
+        else:
+            callbacks.append(self)
+        return self
+
+    def __call__(self, memory_step, agent=None):
+        step_number = getattr(memory_step, 'step_number', None)
+        if agent is None or step_number is None:
+            return
+        if step_number % self.every_n_steps == 0:
+            try:
+                self.save(agent, memory_step)
+            except Exception as e:
+                # A failed checkpoint must never stop the analysis itself
+                print(f"⚠️ Checkpoint at step {step_number} failed: {e}")
+
+    def save(self, agent, memory_step=None) -> str:
+        """Write a checkpoint for the agent's current state and return its path"""
+        # Callbacks run before smolagents appends the finished step to memory
+        memory_steps = list(agent.memory.steps)
+        if memory_step is not None and not any(step is memory_step for step in memory_steps):
+            memory_steps.append(memory_step)
+
+        # Named by memory length, which keeps growing across resumed runs
+        # (step_number restarts at 1 on every agent.run call)
+        step_number = getattr(memory_step, 'step_number', None)
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"step_{len(memory_steps):04d}"
+        final_dir = os.path.join(self.directory, name)
+        tmp_dir = final_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        frames_dir = os.path.join(tmp_dir, "frames")
+        os.makedirs(frames_dir)
+
+        # Agent memory (task, planning and action steps); finished steps do not change, so each is pickled once
+        pickled_steps = {}
+        for step in memory_steps:
+            cached = self._pickled_steps.get(id(step))
+            if cached is None or cached[0] is not step:
+                cached = (step, _pickled(step))
+            pickled_steps[id(step)] = cached
+        self._pickled_steps = pickled_steps
+        with open(os.path.join(tmp_dir, "memory.pkl"), 'wb') as f:
+            pickle.dump([data for _, data in pickled_steps.values() if data is not None], f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+        # Variables defined by the agent's own code, each pickled once
+        state_frames = {}
+        state_values = {}
+        saved_frames = {}
+        executor_state = getattr(getattr(agent, 'python_executor', None), 'state', {}) or {}
+        for key, value in executor_state.items():
+            if key.startswith('__'):
+                continue
+            if _is_dataframe(value):
+                state_frames[key] = self._save_or_link(value, frames_dir, f"state__{key}", None, saved_frames)
+            else:
+                data = _dumps(value)
+                if data is not None:
+                    state_values[key] = data
+        with open(os.path.join(tmp_dir, "executor_state.pkl"), 'wb') as f:
+            pickle.dump(state_values, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        # Registered datasets and models; unchanged datasets are linked from the previous checkpoint
+        datasets = {}
+        for index, (dataset_name, df) in enumerate(list(session.datasets.items())):
+            version = session.dataset_versions.get(dataset_name, 1)
+            datasets[dataset_name] = {
+                'file': self._save_or_link(df, frames_dir, f"dataset__{index}", (dataset_name, version), saved_frames),
+                'version': version,
+            }
+        pickled_models = {}
+        for model_name, model in session.models.items():
+            registered_at = session.metadata.get(('model', model_name), {}).get('registered_at')
+            cached = self._pickled_models.get(model_name)
+            if cached is None or cached[0] is not model or cached[1] != registered_at:
+                cached = (model, registered_at, _dumps(model))
+            pickled_models[model_name] = cached
+        self._pickled_models = pickled_models
+        models = {name: data for name, (_, _, data) in pickled_models.items() if data is not None}
+        with open(os.path.join(tmp_dir, "models.pkl"), 'wb') as f:
+            pickle.dump(models, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        manifest = {
+            'saved_at': datetime.now().isoformat(),
+            'step_number': step_number,
+            'task': getattr(agent, 'task', None),
+            'datasets': datasets,
+            'state_frames': state_frames,
+            'models': sorted(models),
+            'skipped_models': sorted(set(session.models) - set(models)),
+            'plots': [dict(entry) for entry in session.plots],
+        }
+        with open(os.path.join(tmp_dir, "manifest.json"), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        # Publish: swap in the finished directory, then move the pointer
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.replace(tmp_dir, final_dir)
+        self._saved_frames = {key: (identity, os.path.join(final_dir, "frames", file_name))
+                              for key, (identity, file_name) in saved_frames.items()}
+        pointer_tmp = os.path.join(self.directory, LATEST_POINTER + ".tmp")
+        with open(pointer_tmp, 'w') as f:
+            f.write(name)
+        os.replace(pointer_tmp, os.path.join(self.directory, LATEST_POINTER))
+
+        self._prune()
+        return final_dir
+
+    def _save_or_link(self, df, frames_dir: str, key: str, version, saved: dict) -> str:
+        """Save a DataFrame, or hard-link the previous checkpoint's file when its content is unchanged"""
+        if isinstance(df, SpilledDataset):
+            identity = ('spilled', df.path, version)
+        else:
+            identity = (id(df), version, df.shape, content_signature(df))
+        previous = self._saved_frames.get(key)
+        if previous is not None and previous[0] == identity and os.path.exists(previous[1]):
+            file_name = os.path.basename(previous[1])
+            try:
+                os.link(previous[1], os.path.join(frames_dir, file_name))
+            except OSError:
+                shutil.copy2(previous[1], os.path.join(frames_dir, file_name))
+        else:
+            file_name = _save_frame(df, frames_dir, key)
+        saved[key] = (identity, file_name)
+        return file_name
+
+    def _prune(self):
+        checkpoints = sorted(d for d in os.listdir(self.directory)
+                             if d.startswith("step_") and not d.endswith(".tmp"))
+        for old in checkpoints[:-self.keep_last]:
+            shutil.rmtree(os.path.join(self.directory, old), ignore_errors=True)
+
+    def latest(self):
+        """Path of the last complete checkpoint, or None"""
+        pointer = os.path.join(self.directory, LATEST_POINTER)
+        if not os.path.exists(pointer):
+            return None
+        with open(pointer) as f:
+            path = os.path.join(self.directory, f.read().strip())
+        return path if os.path.exists(os.path.join(path, "manifest.json")) else None
+
+    def restore(self, agent, path: str = None) -> dict:
+        """Load a checkpoint into the agent and the tool session, returning its manifest"""
+        path = path or self.latest()
+        if path is None:
+            raise FileNotFoundError(f"No checkpoint found in {self.directory}")
+
+        with open(os.path.join(path, "manifest.json")) as f:
+            manifest = json.load(f)
+        frames_dir = os.path.join(path, "frames")
+
+        with open(os.path.join(path, "memory.pkl"), 'rb') as f:
+            steps = [step for step in (_loads(data, "memory step") for data in pickle.load(f)) if step is not None]
+        agent.memory.steps = steps
+
+        executor = getattr(agent, 'python_executor', None)
+        if executor is not None:
+            with open(os.path.join(path, "executor_state.pkl"), 'rb') as f:
+                state = {key: _loads(data, key) for key, data in pickle.load(f).items()}
+            for key, file_name in manifest['state_frames'].items():
+                state[key] = _load_frame(os.path.join(frames_dir, file_name))
+            executor.state.update(state)
+
+        session.clear()
+        for dataset_name, info in manifest['datasets'].items():
+            session.register_dataset(dataset_name, _load_frame(os.path.join(frames_dir, info['file'])), source="checkpoint")
+            session.dataset_versions[dataset_name] = info['version']
+        with open(os.path.join(path, "models.pkl"), 'rb') as f:
+            for model_name, model in pickle.load(f).items():
+                model = _loads(model, model_name)
+                if model is not None:
+                    session.register_model(model_name, model, source="checkpoint")
+        for entry in manifest['plots']:
+            if os.path.exists(entry['path']):
+                session.record_plot(entry['path'], source=entry.get('source'))
+
+        self.task = manifest.get('task')
+        return manifest
@@ -0,0 +1,130 @@
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+
+DEFAULT_DB_PATH = os.getenv("INSIGHT_CONTEXT_DB", "conversation_context.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS contexts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    dataset TEXT,
+    version INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    payload BLOB NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_contexts_session_version ON contexts (session_id, version);
+CREATE INDEX IF NOT EXISTS idx_contexts_dataset ON contexts (dataset, id);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('total_size', 0);
+-- Running payload total, kept in the same transaction as every insert and delete
+CREATE TRIGGER IF NOT EXISTS trg_contexts_size_insert AFTER INSERT ON contexts BEGIN
+    UPDATE store_meta SET value = value + NEW.size WHERE key = 'total_size';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_contexts_size_delete AFTER DELETE ON contexts BEGIN
+    UPDATE store_meta SET value = value - OLD.size WHERE key = 'total_size';
+END;
+"""
+
+
+class ContextStore:
+    """Indexed SQLite store for conversation contexts.
+
+    Every save creates a new version for its session. Lookups by id, by
+    session (latest or a given version) and by dataset (latest) are index
+    seeks, so resuming never depends on how many contexts have been saved.
+    Compaction keeps the newest versions per session and bounds the total
+    payload size.
+    """
+
+    def __init__(self, path: str = None, max_versions_per_session: int = 50, max_total_bytes: int = 64 * 1024 * 1024):
+        self.path = path or DEFAULT_DB_PATH
+        self.max_versions_per_session = max_versions_per_session
+        self.max_total_bytes = max_total_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def save(self, context, session_id: str = "default", dataset: str = None) -> dict:
+        """Store a new version of the session's context and return its metadata"""
+        payload = zlib.compress(json.dumps(context, default=str).encode('utf-8'))
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT MAX(version) FROM contexts WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            version = (row[0] or 0) + 1
+            created_at = datetime.now().isoformat()
+            cursor = self._conn.execute(
+                "INSERT INTO contexts (session_id, dataset, version, created_at, size, payload) VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, dataset, version, created_at, len(payload), payload),
+            )
+            self._compact(session_id)
+        return {'id': cursor.lastrowid, 'session_id': session_id, 'dataset': dataset,
+                'version': version, 'created_at': created_at, 'size': len(payload)}
+
+    def get(self, context_id: int = None, session_id: str = None, dataset: str = None, version: int = None):
+        """Return the matching context record (latest version unless one is given), or None"""
+        if context_id is not None:
+            query, params = "SELECT * FROM contexts WHERE id = ?", (int(context_id),)
+        elif session_id is not None and version is not None:
+            query, params = "SELECT * FROM contexts WHERE session_id = ? AND version = ?", (session_id, int(version))
+        elif session_id is not None:
+            query, params = "SELECT * FROM contexts WHERE session_id = ? ORDER BY version DESC LIMIT 1", (session_id,)
+        elif dataset is not None:
+            query, params = "SELECT * FROM contexts WHERE dataset = ? ORDER BY id DESC LIMIT 1", (dataset,)
+        else:
+            query, params = "SELECT * FROM contexts ORDER BY id DESC LIMIT 1", ()
+
+        with self._lock:
+            row = self._conn.execute(query, params).fetchone()
+        if row is None:
+            return None
+        record = {key: row[key] for key in row.keys() if key != 'payload'}
+        record['context'] = json.loads(zlib.decompress(row['payload']).decode('utf-8'))
+        return record
+
+    def list_versions(self, session_id: str, limit: int = 20) -> list:
+        """Metadata of the newest versions of a session, newest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, session_id, dataset, version, created_at, size FROM contexts "
+                "WHERE session_id = ? ORDER BY version DESC LIMIT ?",
+                (session_id, int(limit)),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _compact(self, session_id: str):
+        """Drop old versions of the session, then the oldest contexts over the size budget"""
+        self._conn.execute(
+            "DELETE FROM contexts WHERE session_id = ? AND version <= "
+            "(SELECT MAX(version) FROM contexts WHERE session_id = ?) - ?",
+            (session_id, session_id, self.max_versions_per_session),
+        )
+        total = self._conn.execute("SELECT value FROM store_meta WHERE key = 'total_size'").fetchone()[0]
+        if total <= self.max_total_bytes:
+            return
+        # Walk from the oldest rows until enough bytes are freed, never dropping the newest row
+        newest = self._conn.execute("SELECT MAX(id) FROM contexts").fetchone()[0]
+        to_free = total - self.max_total_bytes
+        cutoff = None
+        for row in self._conn.execute("SELECT id, size FROM contexts WHERE id < ? ORDER BY id", (newest,)):
+            to_free -= row['size']
+            cutoff = row['id']
+            if to_free <= 0:
+                break
+        if cutoff is not None:
+            self._conn.execute("DELETE FROM contexts WHERE id <= ?", (cutoff,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
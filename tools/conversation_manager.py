@@ -1,15 +1,15 @@
 from smolagents import Tool
 import json
 import os
-from datetime import datetime
+from tools.context_store import ContextStore
 
 class ConversationManagerTool(Tool):
     name = "conversation_manager"
-    description = "Manage conversation flow: ask clarifying questions, validate user responses, save conversation context, and resume from previous sessions."
+    description = "Manage conversation flow: ask clarifying questions, validate user responses, save conversation context, and resume from previous sessions. Contexts are versioned per session_id and can be resumed by context_id, session_id (optionally with version) or dataset."
     inputs = {
         "action": {
             "type": "string",
-            "description": "Action to perform (ask_question, validate_response, save_context, resume_context)"
+            "description": "Action to perform (ask_question, validate_response, save_context, resume_context, list_contexts)"
         },
         "data": {
             "type": "object",
@@ -18,6 +18,12 @@ class ConversationManagerTool(Tool):
     }
     output_type = "string"
 
+    def _get_store(self) -> ContextStore:
+        """Open the context store on first use"""
+        if getattr(self, '_store', None) is None:
+            self._store = ContextStore()
+        return self._store
+
     def forward(self, action: str, data) -> str:
         """Manage conversation flow and context"""
         try:
@@ -46,22 +52,45 @@ class ConversationManagerTool(Tool):
                 
             elif action == "save_context":
                 context = data.get("context", {})
-                timestamp = datetime.now().isoformat()
-                context_file = f"conversation_context_{timestamp}.json"
-                
-                with open(context_file, 'w') as f:
-                    json.dump(context, f, indent=2)
+                record = self._get_store().save(
+                    context,
+                    session_id=str(data.get("session_id", "default")),
+                    dataset=data.get("dataset"),
+                )
                 
-                return f"Conversation context saved to: {context_file}"
+                return (f"Conversation context saved: id={record['id']}, session={record['session_id']}, "
+                        f"version={record['version']}")
                 
             elif action == "resume_context":
-                context_file = data.get("context_file", "")
-                if os.path.exists(context_file):
-                    with open(context_file, 'r') as f:
-                        context = json.load(f)
-                    return f"Context resumed from: {context_file}\n{json.dumps(context, indent=2)}"
-                else:
+                # Legacy JSON files saved by earlier versions of this tool
+                context_file = data.get("context_file")
+                if context_file:
+                    if os.path.exists(context_file):
+                        with open(context_file, 'r') as f:
+                            context = json.load(f)
+                        return f"Context resumed from: {context_file}\n{json.dumps(context, indent=2)}"
                     return f"Context file not found: {context_file}"
+
+                record = self._get_store().get(
+                    context_id=data.get("context_id"),
+                    session_id=data.get("session_id"),
+                    dataset=data.get("dataset"),
+                    version=data.get("version"),
+                )
+                if record is None:
+                    return f"No saved context matches: {json.dumps(data, default=str)}"
+                return (f"Context resumed: id={record['id']}, session={record['session_id']}, "
+                        f"version={record['version']}, saved at {record['created_at']}\n"
+                        f"{json.dumps(record['context'], indent=2)}")
+
+            elif action == "list_contexts":
+                session_id = str(data.get("session_id", "default"))
+                versions = self._get_store().list_versions(session_id, limit=data.get("limit", 20))
+                if not versions:
+                    return f"No saved contexts for session: {session_id}"
+                lines = [f"v{v['version']} (id={v['id']}, dataset={v['dataset']}, saved {v['created_at']}, {v['size']} bytes)"
+                         for v in versions]
+                return f"Saved contexts for session {session_id}:\n" + "\n".join(lines)
             
             else:
                 return f"Unknown action: {action}"
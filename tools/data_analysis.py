@@ -1,7 +1,9 @@
 from smolagents import Tool
-import pandas as pd
-import numpy as np
 import os
+from tools.lazy_imports import load
+from tools.session import session
+from tools.memory_governor import governor
+from tools.exec_cache import exec_cache, REPLAY_NOTE
 
 class DataAnalysisTool(Tool):
     name = "data_analysis_tool"
@@ -9,34 +11,50 @@ class DataAnalysisTool(Tool):
     inputs = {
         "python_code": {
             "type": "string",
-            "description": "Python code to execute for data analysis. Use 'df' as the DataFrame variable. Can perform any analysis needed."
+            "description": "Python code to execute for data analysis. Use 'df' as the DataFrame variable. Can perform any analysis needed. If 'cube' is not None it holds pre-computed aggregates of df, e.g. cube.query(['COUNTRY'], 'SALES', stats=['sum'], top=10) or cube.query(['YEAR_ID', 'MONTH_ID'], 'SALES', quantiles=[0.5]); prefer it over re-scanning df for group totals."
         },
         "df": {
             "type": "object",
             "description": "Pandas DataFrame to analyze",
             "nullable": True
+        },
+        "use_cache": {
+            "type": "boolean",
+            "description": "Reuse the result of an identical earlier call on the same data (default true); set false for code whose result should differ between runs",
+            "nullable": True
         }
     }
     output_type = "string"
 
-    def forward(self, python_code: str, df=None) -> str:
+    def forward(self, python_code: str, df=None, use_cache: bool = True) -> str:
         """
         Execute the provided Python code for data analysis.
         
         Available variables in the execution context:
         - df: The input DataFrame
+        - cube: AggregateCube pre-built for df at load time (None if df is not a loaded dataset)
         - pd: pandas
         - np: numpy
         - os: os module
         - Common statistical functions
         
         Can perform any analysis: statistics, correlations, distributions, etc.
+        Identical code on the same data returns the memoized result.
         """
         
         try:
+            cache_key = exec_cache.result_key(self.name, python_code, df) if use_cache is not False else None
+            cached = exec_cache.get(cache_key)
+            if cached is not None:
+                return f"{cached['output']}\n{REPLAY_NOTE}"
+
+            pd = load("pandas")
+            np = load("numpy")
+
             # Set up the execution environment
             exec_globals = {
                 'df': df,
+                'cube': session.get_cube(df),
                 'pd': pd,
                 'np': np,
                 'os': os
@@ -44,8 +62,7 @@ class DataAnalysisTool(Tool):
             
             # Add statistical imports
             try:
-                from scipy import stats
-                exec_globals['stats'] = stats
+                exec_globals['stats'] = load("scipy.stats")
             except ImportError:
                 pass
             
@@ -58,15 +75,20 @@ class DataAnalysisTool(Tool):
             sys.stdout = captured_output = StringIO()
             
             try:
-                exec(python_code, exec_globals)
+                exec(exec_cache.compile(python_code, f"<{self.name}>"), exec_globals)
                 output = captured_output.getvalue()
             finally:
                 sys.stdout = old_stdout
+
+            # Intermediate copies made by the code may have pushed the session over budget
+            governor.enforce()
             
             if output.strip():
-                return f"✅ Analysis completed:\n{output}"
+                result = f"✅ Analysis completed:\n{output}"
             else:
-                return "✅ Analysis code executed successfully"
+                result = "✅ Analysis code executed successfully"
+            exec_cache.put(cache_key, result, source=self.name)
+            return result
                 
         except Exception as e:
             return f"❌ Error executing analysis code: {str(e)}"
@@ -0,0 +1,313 @@
+from smolagents import Tool
+import ast
+import json
+import os
+import re
+import time
+from tools.lazy_imports import load
+from tools.session import session
+
+# Checks for the sales extracts; rules whose columns are missing are skipped.
+# A rule is either a boolean expression that must hold for every row ('expr',
+# evaluated with DataFrame.eval) or checks on one column ('column' with any of
+# 'allowed', 'min', 'max', 'not_null', 'unique', 'pattern').
+DEFAULT_RULES = [
+    {"name": "sales_matches_quantity_x_price",
+     "expr": "abs(SALES - QUANTITYORDERED * PRICEEACH) <= 0.01 * abs(SALES) + 0.01"},
+    {"name": "quarter_matches_month", "expr": "QTR_ID == (MONTH_ID - 1) // 3 + 1"},
+    {"name": "month_in_range", "column": "MONTH_ID", "min": 1, "max": 12},
+    {"name": "quantity_non_negative", "column": "QUANTITYORDERED", "min": 0},
+    {"name": "price_positive", "expr": "PRICEEACH > 0"},
+    {"name": "sales_non_negative", "column": "SALES", "min": 0},
+    {"name": "dealsize_valid", "column": "DEALSIZE", "allowed": ["Small", "Medium", "Large"]},
+    {"name": "order_line_unique", "column": ["ORDERNUMBER", "ORDERLINENUMBER"], "unique": True},
+]
+SAMPLE_SIZE = 5
+# String columns with at most this many distinct values get an allowed-values list in the schema
+SCHEMA_MAX_ALLOWED = 50
+
+
+def rule_columns(rule: dict) -> list:
+    """Columns a rule reads (for expressions: every name that is not a called function)"""
+    if 'expr' in rule:
+        quoted = re.findall(r'`([^`]+)`', rule['expr'])
+        tree = ast.parse(re.sub(r'`[^`]+`', '_quoted', rule['expr']), mode='eval')
+        functions = {node.func.id for node in ast.walk(tree) if isinstance(node, ast.Call) and isinstance(node.func, ast.Name)}
+        names = [node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and node.id not in functions]
+        return list(dict.fromkeys([n for n in names if n != '_quoted'] + quoted))
+    column = rule['column']
+    return list(column) if isinstance(column, (list, tuple)) else [column]
+
+
+def _column_checks(df, rule: dict):
+    """Boolean mask of rows passing every check of a column rule"""
+    np = load("numpy")
+    pd = load("pandas")
+    columns = rule_columns(rule)
+    if rule.get('unique'):
+        return ~df.duplicated(subset=columns, keep=False).to_numpy()
+    series = df[columns[0]]
+    ok = np.ones(len(df), dtype=bool)
+    if 'allowed' in rule:
+        ok &= series.isin(rule['allowed']).to_numpy() | series.isna().to_numpy()
+    if 'min' in rule or 'max' in rule:
+        values = pd.to_datetime(series, errors='coerce') if pd.api.types.is_datetime64_any_dtype(series) else series
+        if 'min' in rule:
+            ok &= ~(values < rule['min']).to_numpy(dtype=bool, na_value=False)
+        if 'max' in rule:
+            ok &= ~(values > rule['max']).to_numpy(dtype=bool, na_value=False)
+    if 'pattern' in rule:
+        ok &= series.astype('string').str.fullmatch(rule['pattern']).fillna(True).to_numpy(dtype=bool)
+    if rule.get('not_null'):
+        ok &= series.notna().to_numpy()
+    return ok
+
+
+def evaluate_rule(df, rule: dict, sample_size: int = SAMPLE_SIZE) -> dict:
+    """Run one rule over all rows and return its violation count and sample rows.
+
+    Expression rules skip rows where a column they read is missing (missing
+    values are the not_null checks' business), so NaN comparisons are not
+    counted as violations.
+    """
+    np = load("numpy")
+    columns = rule_columns(rule)
+    result = {'rule': rule['name'], 'columns': columns, 'checked': len(df), 'violations': 0,
+              'violation_rate': 0.0, 'sample': []}
+    if 'expr' in rule:
+        present = df[columns].notna().all(axis=1).to_numpy() if columns else np.ones(len(df), dtype=bool)
+        passed = df.eval(rule['expr'])
+        passed = np.asarray(passed, dtype=bool) if np.ndim(passed) else np.full(len(df), bool(passed))
+        failed = present & ~passed
+        result['checked'] = int(present.sum())
+    else:
+        failed = ~_column_checks(df, rule)
+    violations = int(failed.sum())
+    result['violations'] = violations
+    result['violation_rate'] = violations / result['checked'] if result['checked'] else 0.0
+    if violations:
+        rows = np.flatnonzero(failed)[:sample_size]
+        sample = df.iloc[rows][columns]
+        result['sample'] = [{'row': int(r), **{c: _json_value(v) for c, v in values.items()}}
+                            for r, values in zip(rows, sample.to_dict('records'))]
+    return result
+
+
+def check_quality(df, rules: list = None, sample_size: int = SAMPLE_SIZE) -> dict:
+    """Evaluate the rules (default: DEFAULT_RULES that apply to df) and count nulls per column"""
+    applicable, skipped = [], []
+    for rule in (DEFAULT_RULES if rules is None else rules):
+        missing = [c for c in rule_columns(rule) if c not in df.columns]
+        if missing:
+            skipped.append({'rule': rule['name'], 'missing': missing})
+        else:
+            applicable.append(rule)
+
+    started = time.perf_counter()
+    results = []
+    for rule in applicable:
+        try:
+            results.append(evaluate_rule(df, rule, sample_size))
+        except Exception as e:
+            results.append({'rule': rule['name'], 'error': str(e)})
+    nulls = df.isna().sum()
+    return {
+        'rows': len(df),
+        'rules': results,
+        'skipped_rules': skipped,
+        'nulls': {str(c): int(n) for c, n in nulls[nulls > 0].items()},
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def merge_quality(previous: dict, earlier, tail, report: dict, sample_size: int = SAMPLE_SIZE) -> dict:
+    """Quality of the earlier rows followed by the tail, from the report on each part.
+
+    Counts and nulls add up and tail sample rows are numbered after the earlier
+    rows; uniqueness rules are evaluated again on their columns over both parts,
+    since a duplicate can pair an earlier row with a new one.
+    """
+    pd = load("pandas")
+    before = {r['rule']: r for r in previous.get('rules', [])}
+    unique = {rule['name']: rule for rule in DEFAULT_RULES if rule.get('unique')}
+    rules = []
+    for result in report['rules']:
+        old = before.get(result['rule'])
+        if 'error' in result or old is None or 'error' in old:
+            pass
+        elif result['rule'] in unique:
+            columns = result['columns']
+            both = pd.concat([earlier[columns], tail[columns]], ignore_index=True)
+            result = evaluate_rule(both, unique[result['rule']], sample_size)
+        else:
+            checked = old['checked'] + result['checked']
+            violations = old['violations'] + result['violations']
+            sample = old['sample'] + [{**row, 'row': row['row'] + len(earlier)} for row in result['sample']]
+            result = {**result, 'checked': checked, 'violations': violations,
+                      'violation_rate': violations / checked if checked else 0.0, 'sample': sample[:sample_size]}
+        rules.append(result)
+    nulls = dict(previous.get('nulls') or {})
+    for col, n in report['nulls'].items():
+        nulls[col] = nulls.get(col, 0) + n
+    return {**report, 'rows': len(earlier) + report['rows'], 'rules': rules, 'nulls': nulls}
+
+
+def infer_schema(df, max_allowed: int = SCHEMA_MAX_ALLOWED) -> dict:
+    """Column types, null fractions, cardinalities, ranges and (for low-cardinality text) allowed values"""
+    pd = load("pandas")
+    schema = {}
+    for col in df.columns:
+        series = df[col]
+        distinct = int(series.nunique(dropna=True))
+        entry = {
+            'dtype': str(series.dtype),
+            'null_fraction': round(float(series.isna().mean()), 6) if len(series) else 0.0,
+            'cardinality': distinct,
+            'unique': distinct == len(series) and len(series) > 0,
+        }
+        if pd.api.types.is_bool_dtype(series):
+            pass
+        elif pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+            if distinct:
+                entry['min'] = _json_value(series.min())
+                entry['max'] = _json_value(series.max())
+        elif distinct <= max_allowed:
+            entry['allowed'] = sorted(str(v) for v in series.dropna().unique())
+        schema[str(col)] = entry
+    return schema
+
+
+def rules_from_schema(schema: dict) -> list:
+    """Rules that hold for the data the schema was inferred from, for validating later extracts"""
+    rules = []
+    for col, entry in schema.items():
+        rule = {'name': f"{col}_matches_schema", 'column': col}
+        if 'allowed' in entry:
+            rule['allowed'] = entry['allowed']
+        for bound in ('min', 'max'):
+            if bound in entry and isinstance(entry[bound], (int, float)):
+                rule[bound] = entry[bound]
+        if entry.get('null_fraction') == 0:
+            rule['not_null'] = True
+        if len(rule) > 2:
+            rules.append(rule)
+        if entry.get('unique'):
+            rules.append({'name': f"{col}_unique", 'column': col, 'unique': True})
+    return rules
+
+
+def schema_drift(schema: dict, df) -> list:
+    """Columns added, removed or with a changed dtype compared with a stored schema"""
+    changes = [f"missing column {col}" for col in schema if col not in df.columns]
+    changes += [f"new column {col}" for col in df.columns if str(col) not in schema]
+    changes += [f"{col}: dtype {schema[str(col)]['dtype']} -> {df[col].dtype}" for col in df.columns
+                if str(col) in schema and schema[str(col)]['dtype'] != str(df[col].dtype)]
+    return changes
+
+
+def quality_points(report: dict, limit: int = 6) -> list:
+    """Short bullet points for the report's Data Quality slide"""
+    rules = [r for r in report.get('rules', []) if 'error' not in r]
+    failed = sorted((r for r in rules if r['violations']), key=lambda r: -r['violations'])
+    points = [f"{len(rules) - len(failed)} of {len(rules)} data quality rules passed on {report.get('rows', 0):,} rows"]
+    for r in failed[:limit - 2]:
+        points.append(f"{r['rule'].replace('_', ' ')}: {r['violations']:,} violations ({r['violation_rate']:.1%})")
+    nulls = report.get('nulls') or {}
+    if nulls:
+        worst = sorted(nulls.items(), key=lambda item: -item[1])[:3]
+        points.append("Missing values: " + ", ".join(f"{col} ({n:,})" for col, n in worst)
+                      + (f" and {len(nulls) - 3} more columns" if len(nulls) > 3 else ""))
+    else:
+        points.append("No missing values")
+    if report.get('empty_rows_dropped'):
+        points.append(f"{report['empty_rows_dropped']:,} empty rows removed at load")
+    return points
+
+
+def _json_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+class DataQualityTool(Tool):
+    name = "data_quality_tool"
+    description = "Check a dataset against declarative data quality rules and infer its schema. Default rules for sales data: SALES ≈ QUANTITYORDERED × PRICEEACH, QTR_ID consistent with MONTH_ID, valid DEALSIZE values, non-negative quantities and sales, unique order lines. Custom rules are dicts with 'name' and either 'expr' (a boolean pandas expression that must hold, e.g. 'PRICEEACH <= MSRP * 1.5') or 'column' with checks 'allowed', 'min', 'max', 'not_null', 'unique', 'pattern'. Returns violation counts with sample rows and writes results/data_quality.json; the result is used for the report's Data Quality slide."
+    inputs = {
+        "df": {
+            "type": "object",
+            "description": "Pandas DataFrame to check (default: the most recently loaded dataset)",
+            "nullable": True
+        },
+        "rules": {
+            "type": "array",
+            "description": "Rules to evaluate (default: the built-in sales rules that apply to the data)",
+            "nullable": True
+        },
+        "include_default_rules": {
+            "type": "boolean",
+            "description": "Also evaluate the built-in rules when custom rules are given (default true)",
+            "nullable": True
+        },
+        "schema_path": {
+            "type": "string",
+            "description": "JSON schema written by an earlier run (e.g. results/schema.json); the data is also checked against its types, ranges and allowed values",
+            "nullable": True
+        }
+    }
+    output_type = "string"
+
+    def forward(self, df=None, rules: list = None, include_default_rules: bool = True, schema_path: str = None) -> str:
+        """Evaluate the rules, infer the schema and summarize the violations"""
+        try:
+            df = df if df is not None else session.get_dataset()
+            if df is None:
+                return "❌ Error checking data quality: no DataFrame given and no dataset loaded"
+            for rule in rules or []:
+                if not isinstance(rule, dict) or 'name' not in rule or ('expr' in rule) == ('column' in rule):
+                    return f"❌ Invalid rule {rule!r}: needs 'name' and exactly one of 'expr' or 'column'"
+
+            selected = list(rules or [])
+            if include_default_rules is not False or not rules:
+                selected = DEFAULT_RULES + selected
+            drift = []
+            if schema_path:
+                with open(schema_path) as f:
+                    stored = json.load(f)
+                selected += rules_from_schema(stored)
+                drift = schema_drift(stored, df)
+
+            report = check_quality(df, selected)
+            schema = infer_schema(df)
+            report['schema_drift'] = drift
+            name = session.name_of(df) or 'data'
+            session.record_quality(name, report)
+
+            os.makedirs('results', exist_ok=True)
+            with open('results/data_quality.json', 'w') as f:
+                json.dump(report, f, indent=2, default=str)
+            with open('results/schema.json', 'w') as f:
+                json.dump(schema, f, indent=2, default=str)
+
+            lines = [f"✅ Checked {len(report['rules'])} rules on {report['rows']:,} rows in {report['seconds']:.2f}s",
+                     "Saved results/data_quality.json and the inferred schema to results/schema.json"]
+            for result in report['rules']:
+                if 'error' in result:
+                    lines.append(f"❌ {result['rule']}: {result['error']}")
+                elif result['violations']:
+                    lines.append(f"⚠️ {result['rule']}: {result['violations']:,} of {result['checked']:,} rows "
+                                 f"({result['violation_rate']:.2%}), e.g. {result['sample'][:3]}")
+                else:
+                    lines.append(f"✅ {result['rule']}")
+            if report['skipped_rules']:
+                lines.append("Skipped (columns not in data): " + ", ".join(r['rule'] for r in report['skipped_rules']))
+            if report['nulls']:
+                lines.append(f"Missing values: {report['nulls']}")
+            if drift:
+                lines.append("⚠️ Schema changes: " + "; ".join(drift))
+            return "\n".join(lines)
+
+        except Exception as e:
+            return f"❌ Error checking data quality: {str(e)}"
@@ -0,0 +1,289 @@
+from smolagents import Tool
+import hashlib
+import os
+import time
+import unicodedata
+from tools.lazy_imports import load
+from tools.session import session
+
+DEFAULT_FIELDS = {
+    'name': 'CUSTOMERNAME',
+    'phone': 'PHONE',
+    'postal': 'POSTALCODE',
+    'country': 'COUNTRY',
+    'city': 'CITY',
+    'address': 'ADDRESSLINE1',
+}
+# Words that say nothing about which company a name refers to
+LEGAL_SUFFIXES = {
+    'inc', 'incorporated', 'ltd', 'limited', 'co', 'corp', 'corporation', 'company', 'llc', 'plc',
+    'gmbh', 'ag', 'sa', 'sarl', 'srl', 'bv', 'nv', 'oy', 'ab', 'as', 'cie', 'pty', 'the', 'and',
+}
+# Trailing digits of a phone number used for matching; country and trunk prefixes vary between sources
+PHONE_KEY_DIGITS = 7
+# Blocks larger than this are too unspecific to compare all pairs in them; they are skipped
+MAX_BLOCK_SIZE = 500
+NAME_MATCH = 0.92           # names this similar match on their own
+CORROBORATED_NAME_MATCH = 0.7  # ... or this similar with the same phone, postal code or address
+
+
+def normalize_text(series):
+    """Lowercase ASCII words: accents folded, punctuation removed, whitespace collapsed"""
+    text = series.astype('string').fillna('')
+    unique = text.drop_duplicates()
+    folded = unique.map(lambda s: unicodedata.normalize('NFKD', s).encode('ascii', 'ignore').decode('ascii'))
+    folded = (folded.str.lower()
+              .str.replace(r'[&+]', ' and ', regex=True)
+              .str.replace(r'[^a-z0-9]+', ' ', regex=True)
+              .str.strip())
+    return text.map(dict(zip(unique, folded)))
+
+
+def normalize_name(series):
+    """Company name without legal suffixes, e.g. 'Mini Gifts Distributors Ltd.' -> 'mini gifts distributors'"""
+    words = normalize_text(series)
+    unique = words.drop_duplicates()
+    cleaned = unique.map(lambda s: ' '.join(w for w in s.split() if w not in LEGAL_SUFFIXES) or s)
+    return words.map(dict(zip(unique, cleaned)))
+
+
+def normalize_phone(series):
+    """Digits only, without a leading international prefix ('+33 1 46 62 7555' -> '33146627555')"""
+    digits = series.astype('string').fillna('').str.replace(r'\D+', '', regex=True)
+    return digits.str.replace(r'^00', '', regex=True)
+
+
+def normalize_postal(series):
+    return series.astype('string').fillna('').str.upper().str.replace(r'[^0-9A-Z]+', '', regex=True)
+
+
+def soundex(word: str) -> str:
+    """American Soundex code of a word ('' for words without letters)"""
+    codes = {c: d for d, letters in {'1': 'bfpv', '2': 'cgjkqsxz', '3': 'dt', '4': 'l', '5': 'mn', '6': 'r'}.items()
+             for c in letters}
+    letters = [c for c in word.lower() if c.isalpha()]
+    if not letters:
+        return ''
+    result, previous = letters[0].upper(), codes.get(letters[0], '')
+    for c in letters[1:]:
+        code = codes.get(c, '')
+        if code and code != previous:
+            result += code
+            if len(result) == 4:
+                break
+        if c not in 'hw':
+            previous = code
+    return result.ljust(4, '0')
+
+
+def build_records(df, fields: dict):
+    """One row per distinct normalized customer record, and each input row's record number"""
+    np = load("numpy")
+    pd = load("pandas")
+    normalized = pd.DataFrame(index=df.index)
+    normalized['name'] = normalize_name(df[fields['name']])
+    for key, normalize in (('phone', normalize_phone), ('postal', normalize_postal)):
+        normalized[key] = normalize(df[fields[key]]) if fields.get(key) else ''
+    for key in ('country', 'city', 'address'):
+        normalized[key] = normalize_text(df[fields[key]]) if fields.get(key) else ''
+    normalized['raw_name'] = df[fields['name']].astype('string').fillna('')
+
+    keys = ['name', 'phone', 'postal', 'country', 'city', 'address']
+    row_record = normalized.groupby(keys, sort=True).ngroup().to_numpy()
+    normalized['record'] = row_record
+    records = normalized.drop_duplicates('record').set_index('record').sort_index()[keys]
+    # Most frequent original spelling of each record
+    spelling = (normalized.groupby(['record', 'raw_name']).size().rename('n').reset_index()
+                .sort_values(['record', 'n'], ascending=[True, False], kind='stable')
+                .drop_duplicates('record').set_index('record')['raw_name'])
+    records['raw_name'] = spelling
+    records['rows'] = np.bincount(row_record)
+    records['first_row'] = pd.Series(np.arange(len(row_record))).groupby(row_record).min()
+    records.index.name = None
+    return records, row_record
+
+
+def blocking_keys(records):
+    """Candidate blocks per record: phonetic name key, postal code and phone number, each within a country"""
+    pd = load("pandas")
+    first_word = records['name'].str.split().str[0].fillna('')
+    unique = first_word.drop_duplicates()
+    phonetic = first_word.map(dict(zip(unique, unique.map(soundex))))
+    blocks = [
+        ('name', phonetic.where(phonetic != '', None) + '|' + records['country']),
+        ('postal', records['postal'].where(records['postal'].str.len() >= 3, None) + '|' + records['country']),
+        ('phone', records['phone'].str[-PHONE_KEY_DIGITS:].where(records['phone'].str.len() >= PHONE_KEY_DIGITS, None)),
+    ]
+    return pd.concat([
+        pd.DataFrame({'record': records.index, 'block': kind + ':' + key}) for kind, key in blocks
+    ]).dropna(subset=['block'])
+
+
+def candidate_pairs(keys, max_block_size: int = MAX_BLOCK_SIZE):
+    """Distinct record pairs sharing at least one block, via a self-join on the block key"""
+    np = load("numpy")
+    sizes = keys.groupby('block')['record'].transform('size')
+    oversized = keys.loc[sizes > max_block_size, 'block'].nunique()
+    keys = keys[(sizes > 1) & (sizes <= max_block_size)]
+    pairs = keys.merge(keys, on='block', suffixes=('_a', '_b'))
+    pairs = pairs[pairs['record_a'] < pairs['record_b']]
+    left, right = pairs['record_a'].to_numpy(), pairs['record_b'].to_numpy()
+    # Encode each pair as one integer so pairs found through several blocks are compared once
+    n = int(keys['record'].max()) + 1 if len(keys) else 1
+    unique = np.unique(left.astype(np.int64) * n + right)
+    return unique // n, unique % n, int(oversized)
+
+
+def ngram_similarity(texts, left, right, ngram_range=(2, 3)):
+    """Cosine similarity of character n-gram TF-IDF vectors for each (left, right) pair"""
+    np = load("numpy")
+    text = load("sklearn.feature_extraction.text")
+    if not len(left):
+        return np.zeros(0)
+    # Only records that appear in a candidate pair are vectorized
+    involved, positions = np.unique(np.concatenate([left, right]), return_inverse=True)
+    documents = [texts[i] for i in involved]
+    if not any(document.strip() for document in documents):
+        return np.zeros(len(left))   # field not given: nothing to compare
+    vectors = text.TfidfVectorizer(analyzer='char_wb', ngram_range=ngram_range, min_df=1).fit_transform(documents)
+    a, b = positions[:len(left)], positions[len(left):]
+    # Rows are L2-normalized, so the row-wise dot product is the cosine
+    return np.asarray(vectors[a].multiply(vectors[b]).sum(axis=1)).ravel()
+
+
+def resolve_entities(df, fields: dict, threshold: float = NAME_MATCH, max_block_size: int = MAX_BLOCK_SIZE):
+    """Cluster the rows of df into entities.
+
+    Returns (entity id per row, records with their entity id, matched pairs,
+    number of skipped oversized blocks). Entity ids are derived from the
+    normalized content of the entity's first-seen record, so they do not change
+    when rows are appended, including new spellings of a known customer. They
+    do change when the rows are reordered or when new rows join two entities.
+    """
+    np = load("numpy")
+    pd = load("pandas")
+    csgraph = load("scipy.sparse.csgraph")
+    sparse = load("scipy.sparse")
+
+    records, row_record = build_records(df, fields)
+    left, right, oversized = candidate_pairs(blocking_keys(records), max_block_size)
+
+    name_sim = ngram_similarity(records['name'].tolist(), left, right)
+    address_sim = ngram_similarity((records['address'] + ' ' + records['city']).tolist(), left, right)
+    phone = records['phone'].str[-PHONE_KEY_DIGITS:].to_numpy()
+    postal = records['postal'].to_numpy()
+    same_phone = (phone[left] == phone[right]) & (records['phone'].str.len().to_numpy()[left] >= PHONE_KEY_DIGITS)
+    same_postal = (postal[left] == postal[right]) & (postal[left] != '')
+    corroborated = same_phone | same_postal | (address_sim >= 0.8)
+    matched = (name_sim >= threshold) | ((name_sim >= CORROBORATED_NAME_MATCH) & corroborated)
+
+    n = len(records)
+    graph = sparse.coo_matrix((np.ones(matched.sum()), (left[matched], right[matched])), shape=(n, n))
+    _, component = csgraph.connected_components(graph, directed=False)
+
+    # Record positions equal the index labels, so idxmin gives each component's first-seen record
+    first = records['first_row'].groupby(component).transform('idxmin').to_numpy()
+    representatives = records.iloc[np.unique(first)]
+    key = (representatives['name'] + '|' + representatives['phone'] + '|'
+           + representatives['postal'] + '|' + representatives['country'])
+    entity_of = dict(zip(representatives.index, key.map(lambda k: 'E' + hashlib.sha1(k.encode('utf-8')).hexdigest()[:10])))
+    ids = records.index.to_numpy()[first]
+    ids = pd.Series(ids).map(entity_of).to_numpy()
+    records['entity_id'] = ids
+
+    pairs = pd.DataFrame({
+        'name_a': records['raw_name'].to_numpy()[left], 'name_b': records['raw_name'].to_numpy()[right],
+        'name_similarity': name_sim, 'address_similarity': address_sim,
+        'same_phone': same_phone, 'same_postal': same_postal, 'matched': matched,
+    })
+    return ids[row_record], records, pairs, oversized
+
+
+class EntityResolutionTool(Tool):
+    name = "entity_resolution_tool"
+    description = "Deduplicate customers whose name, PHONE or address is written inconsistently (e.g. '2125557818' vs '+1 212 555 7818', 'Ltd' vs 'Ltd.'). Normalizes the fields, compares only records that share a block (phonetic name key, postal code or phone number), scores candidate pairs with character n-gram TF-IDF similarity and clusters matches into entities with stable ids. Adds ENTITY_ID and ENTITY_NAME columns, registers the result as dataset '<name>_entities', writes results/entities.csv and shows the customer ranking by entity."
+    inputs = {
+        "df": {
+            "type": "object",
+            "description": "Pandas DataFrame with customer rows (default: the most recently loaded dataset)",
+            "nullable": True
+        },
+        "fields": {
+            "type": "object",
+            "description": "Column for each field: {'name': 'CUSTOMERNAME', 'phone': 'PHONE', 'postal': 'POSTALCODE', 'country': 'COUNTRY', 'city': 'CITY', 'address': 'ADDRESSLINE1'} (defaults shown; set a field to null to ignore it)",
+            "nullable": True
+        },
+        "threshold": {
+            "type": "number",
+            "description": "Name similarity (0-1) at which records match without a shared phone, postal code or address (default 0.92)",
+            "nullable": True
+        },
+        "value_column": {
+            "type": "string",
+            "description": "Column summed in the customer ranking (default SALES)",
+            "nullable": True
+        }
+    }
+    output_type = "string"
+
+    def forward(self, df=None, fields: dict = None, threshold: float = None, value_column: str = None) -> str:
+        """Resolve customer entities and summarize the clusters"""
+        try:
+            started = time.perf_counter()
+            df = df if df is not None else session.get_dataset()
+            if df is None:
+                return "❌ Error resolving entities: no DataFrame given and no dataset loaded"
+            fields = {**DEFAULT_FIELDS, **(fields or {})}
+            fields = {k: v for k, v in fields.items() if v and v in df.columns}
+            if 'name' not in fields:
+                return "❌ Error resolving entities: name column not found; pass fields={'name': ...}"
+            threshold = NAME_MATCH if threshold is None else float(threshold)
+
+            entity_ids, records, pairs, oversized = resolve_entities(df, fields, threshold)
+            elapsed = time.perf_counter() - started
+
+            resolved = df.copy()
+            resolved['ENTITY_ID'] = entity_ids
+            # Canonical name: the spelling used on most rows of the entity
+            canonical = (records.sort_values('rows', ascending=False, kind='stable')
+                         .drop_duplicates('entity_id').set_index('entity_id')['raw_name'])
+            resolved['ENTITY_NAME'] = resolved['ENTITY_ID'].map(canonical)
+            dataset_name = f"{session.name_of(df) or 'data'}_entities"
+            session.register_dataset(dataset_name, resolved, source=self.name)
+
+            entities = records.groupby('entity_id').agg(
+                variants=('raw_name', lambda names: ' | '.join(sorted(set(names)))),
+                records=('raw_name', 'size'),
+                rows=('rows', 'sum'),
+            )
+            entities.insert(0, 'entity_name', canonical.reindex(entities.index))
+            os.makedirs('results', exist_ok=True)
+            output_path = 'results/entities.csv'
+            entities.sort_values('rows', ascending=False).to_csv(output_path)
+
+            merged = entities[entities['records'] > 1]
+            lines = [
+                f"✅ Resolved {len(df):,} rows into {len(entities):,} entities in {elapsed:.2f}s "
+                f"({df[fields['name']].nunique():,} distinct names, {len(records):,} distinct records)",
+                f"Compared {len(pairs):,} candidate pairs from blocking instead of {len(records) * (len(records) - 1) // 2:,} "
+                f"all-pairs; {int(pairs['matched'].sum()):,} matched",
+                f"Saved to {output_path}; dataset '{dataset_name}' has ENTITY_ID and ENTITY_NAME columns",
+            ]
+            if oversized:
+                lines.append(f"⚠️ Skipped {oversized} blocks with more than {MAX_BLOCK_SIZE} records")
+            if len(merged):
+                lines.append(f"\nEntities with several spellings or contact details ({len(merged)}):")
+                lines.append(merged.sort_values('rows', ascending=False)[['entity_name', 'records', 'variants']]
+                             .head(10).to_string())
+            value_column = value_column or 'SALES'
+            if value_column in resolved.columns:
+                # Distinct entities may share a canonical name, so rank by id and show the name alongside
+                totals = resolved.groupby('ENTITY_ID')[value_column].sum().sort_values(ascending=False).head(10)
+                ranking = totals.round(2).to_frame()
+                ranking.insert(0, 'entity_name', canonical.reindex(totals.index))
+                lines.append(f"\nTop customers by {value_column} (per entity):")
+                lines.append(ranking.to_string())
+            return "\n".join(lines)
+
+        except Exception as e:
+            return f"❌ Error resolving entities: {str(e)}"
@@ -0,0 +1,167 @@
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from tools.lazy_imports import load
+
+EXCEL_CACHE_DIR = os.getenv("INSIGHT_EXCEL_CACHE_DIR", os.path.join(".cache", "excel"))
+
+
+def workbook_hash(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """Content hash of a workbook, used as its cache key"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+
+def _has_calamine() -> bool:
+    try:
+        load("python_calamine")
+        return True
+    except ImportError:
+        return False
+
+
+def sheet_names(file_path: str) -> list:
+    """Sheet names without parsing any cells"""
+    if _has_calamine():
+        calamine = load("python_calamine")
+        return list(calamine.CalamineWorkbook.from_path(file_path).sheet_names)
+    if file_path.lower().endswith('.xlsx'):
+        openpyxl = load("openpyxl")
+        workbook = openpyxl.load_workbook(file_path, read_only=True)
+        try:
+            return list(workbook.sheetnames)
+        finally:
+            workbook.close()
+    pd = load("pandas")
+    return list(pd.ExcelFile(file_path).sheet_names)
+
+
+def _read_with_openpyxl(file_path: str, sheet: str, columns=None):
+    """Stream rows with openpyxl's read-only mode, keeping only the requested columns"""
+    pd = load("pandas")
+    openpyxl = load("openpyxl")
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+        header = [str(h) if h is not None else f"Unnamed: {i}" for i, h in enumerate(header)]
+        if columns:
+            missing = [c for c in columns if c not in header]
+            if missing:
+                raise ValueError(f"Columns not found in sheet '{sheet}': {missing}")
+            positions = [header.index(c) for c in columns]
+            records = ([row[i] if i < len(row) else None for i in positions] for row in rows)
+            return pd.DataFrame.from_records(records, columns=list(columns))
+        return pd.DataFrame.from_records(rows, columns=header)
+    finally:
+        workbook.close()
+
+
+def read_sheet(file_path: str, sheet: str, columns=None):
+    """Parse one sheet with the fastest available engine. Returns (df, engine)"""
+    pd = load("pandas")
+    if _has_calamine():
+        return pd.read_excel(file_path, sheet_name=sheet, usecols=columns, engine="calamine"), "calamine"
+    if file_path.lower().endswith('.xlsx'):
+        return _read_with_openpyxl(file_path, sheet, columns), "openpyxl-read-only"
+    return pd.read_excel(file_path, sheet_name=sheet, usecols=columns), "default"
+
+
+def _cache_path(digest: str, sheet: str, cache_dir: str, columns=None) -> str:
+    """Parquet file for a whole sheet, or for one column projection of it"""
+    safe_sheet = re.sub(r'[^\w.-]+', '_', sheet)
+    if columns:
+        projection = hashlib.sha1("\x1f".join(sorted(map(str, columns))).encode()).hexdigest()[:12]
+        safe_sheet += f".cols-{projection}"
+    return os.path.join(cache_dir, digest, f"{safe_sheet}.parquet")
+
+
+def _parse_and_cache(file_path: str, sheet: str, columns, cache_path: str):
+    """Parse a sheet (only the requested columns) and cache it; runs in a worker process for multi-sheet loads.
+    Returns (df, engine, elapsed, cache_error)"""
+    started = time.perf_counter()
+    df, engine = read_sheet(file_path, sheet, columns)
+    elapsed = time.perf_counter() - started
+    cache_error = None
+    if cache_path:
+        tmp_path = cache_path + f".{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            cache_error = str(e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return df, engine, elapsed, cache_error
+
+
+def read_workbook(file_path: str, sheets=None, columns=None, use_cache: bool = True, cache_dir: str = None):
+    """Load one or more sheets, in parallel when several must be parsed.
+
+    sheets may be None (first sheet), a sheet name, a comma-separated list or
+    '*' for all sheets. Parsed sheets are cached as Parquet under the
+    workbook's content hash, so unchanged workbooks reload in milliseconds.
+    With columns, only those are parsed and cached; a cached full sheet is
+    projected instead when one exists.
+    Returns {sheet_name: DataFrame}.
+    """
+    pd = load("pandas")
+    cache_dir = cache_dir or EXCEL_CACHE_DIR
+    available = sheet_names(file_path)
+
+    if sheets is None or sheets == "":
+        selected = available[:1]
+    elif sheets == "*":
+        selected = available
+    else:
+        requested = sheets if isinstance(sheets, (list, tuple)) else [s.strip() for s in str(sheets).split(',')]
+        missing = [s for s in requested if s not in available]
+        if missing:
+            raise ValueError(f"Sheets not found: {missing}. Available sheets: {available}")
+        selected = list(requested)
+
+    digest = workbook_hash(file_path) if use_cache else None
+    frames = {}
+    to_parse = []
+    for sheet in selected:
+        candidates = [_cache_path(digest, sheet, cache_dir)] if digest else []
+        if digest and columns:
+            candidates.append(_cache_path(digest, sheet, cache_dir, columns))
+        cached = next((path for path in candidates if os.path.exists(path)), None)
+        if cached:
+            started = time.perf_counter()
+            frames[sheet] = pd.read_parquet(cached, columns=list(columns) if columns else None)
+            print(f"   Sheet '{sheet}': {len(frames[sheet])} rows from cache in {time.perf_counter() - started:.2f}s")
+        else:
+            to_parse.append((sheet, candidates[-1] if candidates else None))
+
+    workers = min(len(to_parse), os.cpu_count() or 1)
+    if workers == 1:
+        results = {sheet: _parse_and_cache(file_path, sheet, columns, cache_path) for sheet, cache_path in to_parse}
+    elif to_parse:
+        print(f"   Parsing {len(to_parse)} sheets on {workers} worker processes")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {sheet: pool.submit(_parse_and_cache, file_path, sheet, columns, cache_path)
+                       for sheet, cache_path in to_parse}
+            results = {sheet: future.result() for sheet, future in futures.items()}
+    else:
+        results = {}
+
+    cache_paths = dict(to_parse)
+    for sheet, (df, engine, elapsed, cache_error) in results.items():
+        frames[sheet] = df
+        saved = " (cached)" if cache_paths[sheet] and cache_error is None else ""
+        print(f"   Sheet '{sheet}': {len(df)} rows parsed with {engine} in {elapsed:.2f}s{saved}")
+        if cache_error:
+            print(f"   ⚠️ Cache for sheet '{sheet}' not saved: {cache_error}")
+
+    # Keep the caller's sheet order
+    return {sheet: frames[sheet] for sheet in selected}
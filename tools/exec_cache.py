@@ -0,0 +1,217 @@
+import ast
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from tools.lazy_imports import load
+from tools.session import session
+from tools.memory_governor import governor
+
+EXEC_CACHE_SIZE = int(os.getenv("INSIGHT_EXEC_CACHE_SIZE", "128"))
+# Rows hashed by content_signature besides the per-column sums
+SIGNATURE_SAMPLE_ROWS = 1024
+
+# Code whose output depends on the clock or on unseeded randomness is never replayed
+_CLOCK_PATTERN = re.compile(r'\b(datetime\.now|datetime\.today|date\.today|time\.time|uuid\d?\()|\binput\(')
+_RANDOM_PATTERN = re.compile(r'\brandom\.|\bnp\.random\.|\bsample\(|\bshuffle')
+_SEED_PATTERN = re.compile(r'random_state\s*=\s*\d|\.seed\(|default_rng\(\s*\d')
+
+
+def normalized_code_hash(code: str) -> str:
+    """Hash of the code's syntax tree, so whitespace and comment edits still hit"""
+    try:
+        normalized = ast.dump(ast.parse(code))
+    except SyntaxError:
+        normalized = "\n".join(line.rstrip() for line in code.strip().splitlines())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def is_deterministic(code: str) -> bool:
+    """Heuristic: no clock reads, and any randomness is seeded"""
+    if _CLOCK_PATTERN.search(code):
+        return False
+    return not _RANDOM_PATTERN.search(code) or bool(_SEED_PATTERN.search(code))
+
+
+def content_signature(df) -> str:
+    """Cheap digest of a DataFrame's values, to catch in-place edits of registered datasets.
+
+    Every numeric, boolean and datetime column contributes its sum and
+    non-null count, so a changed number anywhere changes the digest; other
+    columns are covered through a hash of evenly spaced sample rows.
+    """
+    np = load("numpy")
+    pd = load("pandas")
+    digest = hashlib.sha1()
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series, pd.DataFrame):
+            continue
+        if pd.api.types.is_datetime64_any_dtype(series) or pd.api.types.is_timedelta64_dtype(series):
+            values = series.dropna().astype('int64').to_numpy()
+            digest.update(f"{col}:{int(values.sum(dtype='uint64'))}:{len(values)}".encode())
+        elif pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+            digest.update(f"{col}:{series.sum()!r}:{series.count()}".encode())
+        elif isinstance(series.dtype, pd.CategoricalDtype):
+            digest.update(f"{col}:{int(series.cat.codes.to_numpy().sum(dtype='int64'))}".encode())
+    if len(df):
+        positions = np.unique(np.linspace(0, len(df) - 1, min(len(df), SIGNATURE_SAMPLE_ROWS)).astype(np.int64))
+        try:
+            digest.update(pd.util.hash_pandas_object(df.iloc[positions], index=False).values.tobytes())
+        except TypeError:
+            digest.update(repr(df.iloc[positions].values.tolist()).encode())
+    return digest.hexdigest()
+
+
+def dataset_fingerprint(df):
+    """Cheap identity for registered datasets, content hash for anything else.
+
+    Returns None when the input cannot be fingerprinted (results are then not cached).
+    """
+    if df is None:
+        return "none"
+    pd = load("pandas")
+    if not isinstance(df, pd.DataFrame):
+        return None
+    layout = f"{df.shape}:{hashlib.sha1(repr(list(zip(df.columns, df.dtypes))).encode()).hexdigest()}"
+    name = session.name_of(df)
+    if name is not None:
+        # Registered datasets are versioned; the layout catches columns added in place and
+        # the content signature values edited in place (df.loc[0, 'SALES'] = 50)
+        try:
+            signature = content_signature(df)
+        except Exception:
+            return None
+        return (f"{name}:v{session.dataset_versions.get(name)}:g{session.generation}:{id(df)}:{layout}:"
+                f"{signature}")
+    try:
+        values = pd.util.hash_pandas_object(df, index=True).values
+    except TypeError:
+        return None
+    return f"content:{hashlib.sha1(values.tobytes()).hexdigest()}:{layout}"
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshot(directories) -> dict:
+    """{path: mtime} of the files in the given directories"""
+    files = {}
+    for directory in directories:
+        if os.path.isdir(directory):
+            for f in os.listdir(directory):
+                path = f"{directory}/{f}"
+                if os.path.isfile(path):
+                    files[path] = os.path.getmtime(path)
+    return files
+
+
+def changed_files(before: dict, directories) -> list:
+    after = snapshot(directories)
+    return sorted(path for path, mtime in after.items() if before.get(path) != mtime)
+
+
+class ExecCache:
+    """LRU memoization for the exec-based tools.
+
+    Compiled code objects are cached by normalized code hash. Results (the
+    returned text, the files the code wrote with their hashes and any models it
+    fitted) are cached by code hash, tool inputs and dataset versions, and are
+    replayed only while the recorded files are unchanged on disk.
+    """
+
+    def __init__(self, max_entries: int = EXEC_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._compiled = OrderedDict()
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, code: str, filename: str):
+        """Compiled code object, reused for identical code"""
+        key = (normalized_code_hash(code), filename)
+        with self._lock:
+            compiled = self._compiled.get(key)
+            if compiled is not None:
+                self._compiled.move_to_end(key)
+                return compiled
+        compiled = compile(code, filename, 'exec')
+        with self._lock:
+            self._compiled[key] = compiled
+            while len(self._compiled) > self.max_entries:
+                self._compiled.popitem(last=False)
+        return compiled
+
+    def result_key(self, tool_name: str, code: str, df, **inputs):
+        """Key for a result, or None when the call must not be replayed"""
+        if not is_deterministic(code):
+            return None
+        fingerprint = dataset_fingerprint(df)
+        if fingerprint is None:
+            return None
+        # Code may also read the other registered datasets (or their cubes)
+        versions = sorted(session.dataset_versions.items())
+        parts = [tool_name, normalized_code_hash(code), fingerprint, repr(versions), repr(sorted(inputs.items()))]
+        return hashlib.sha256("\x1f".join(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Cached result entry, if its recorded files are still intact"""
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._results.get(key)
+        if entry is not None:
+            intact = all(os.path.exists(path) and file_digest(path) == digest
+                         for path, digest in entry['artifacts'].items())
+            if intact:
+                with self._lock:
+                    self._results.move_to_end(key)
+                    self.hits += 1
+                for name, model in entry['models'].items():
+                    if session.models.get(name) is not model:
+                        session.register_model(name, model, source=entry['source'])
+                return entry
+            with self._lock:
+                self._results.pop(key, None)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, output: str, source: str, artifacts=(), models=None):
+        if key is None:
+            return
+        entry = {
+            'output': output,
+            'source': source,
+            'artifacts': {path: file_digest(path) for path in artifacts if os.path.exists(path)},
+            'models': dict(models or {}),
+        }
+        with self._lock:
+            self._results[key] = entry
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+    def size_bytes(self) -> int:
+        # Models are accounted by the session registry they are also held in
+        with self._lock:
+            return sum(len(entry['output']) for entry in self._results.values())
+
+    def clear(self):
+        with self._lock:
+            self._compiled.clear()
+            self._results.clear()
+
+
+# Process-wide cache shared by the exec tools
+exec_cache = ExecCache()
+governor.register_cache("exec_cache", exec_cache.size_bytes, exec_cache.clear, owner="exec_cache")
+
+REPLAY_NOTE = "♻️ Replayed the result of an identical earlier run (pass use_cache=False to re-execute)"
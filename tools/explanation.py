@@ -0,0 +1,491 @@
+from smolagents import Tool
+import hashlib
+import os
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from tools.lazy_imports import load
+from tools.session import session
+from tools.memory_governor import governor
+
+METHODS = ('auto', 'permutation', 'tree_path')
+# Rows explained by default; importances are stable long before the full history is scored
+DEFAULT_MAX_ROWS = 10_000
+MAX_REPEATS = 10
+MIN_REPEATS = 3
+# A feature stops being permuted once the standard error of its importance is below this (in score units)
+DEFAULT_TOLERANCE = 0.005
+# rows x features below which a process pool costs more than it saves
+PARALLEL_MIN_CELLS = 500_000
+BASELINE_CACHE_SIZE = 8
+
+_baselines = OrderedDict()
+_baselines_lock = threading.Lock()
+
+
+def _baselines_bytes() -> int:
+    with _baselines_lock:
+        return sum(predictions.nbytes for predictions, _ in _baselines.values())
+
+
+def _clear_baselines():
+    with _baselines_lock:
+        _baselines.clear()
+
+
+governor.register_cache("explanation_tool.baselines", _baselines_bytes, _clear_baselines, owner="explanation_tool")
+
+
+def is_classifier(model) -> bool:
+    return load("sklearn.base").is_classifier(model)
+
+
+def score(y, predictions, classifier: bool) -> float:
+    """Accuracy for classifiers, R² for regressors (higher is better for both)"""
+    np = load("numpy")
+    if classifier:
+        return float(np.mean(predictions == y))
+    residual = float(((y - predictions) ** 2).sum())
+    total = float(((y - y.mean()) ** 2).sum())
+    return 1.0 - residual / total if total > 0 else 0.0
+
+
+def feature_frame(model, df, feature_columns=None, target_column: str = None):
+    """The columns of df the model was fitted on, in the order it expects them.
+
+    Features named like pd.get_dummies output (PRODUCTLINE_Ships) are rebuilt
+    from their source columns when df holds the unencoded data.
+    """
+    pd = load("pandas")
+    if feature_columns:
+        columns = list(feature_columns)
+    elif getattr(model, 'feature_names_in_', None) is not None:
+        columns = [str(c) for c in model.feature_names_in_]
+    else:
+        columns = [c for c in df.columns if c != target_column and pd.api.types.is_numeric_dtype(df[c])
+                   and not pd.api.types.is_bool_dtype(df[c])]
+        expected = getattr(model, 'n_features_in_', None)
+        if expected is not None and expected != len(columns):
+            raise ValueError(f"the model was fitted on {expected} unnamed features but df has {len(columns)} numeric "
+                             "columns; pass feature_columns in the training order")
+    missing = [c for c in columns if c not in df.columns]
+    if not missing:
+        return df[columns]
+    sources = [c for c in df.columns if c != target_column and not pd.api.types.is_numeric_dtype(df[c])
+               and any(m.startswith(f"{c}_") for m in missing)]
+    if sources:
+        encoded = pd.get_dummies(df[sources], dtype=float)
+        missing = [c for c in missing if c not in encoded.columns and not any(c.startswith(f"{s}_") for s in sources)]
+    if missing:
+        raise ValueError(f"df lacks columns the model was fitted on: {missing[:10]}"
+                         f"{' ...' if len(missing) > 10 else ''}; pass the feature frame the model was trained on "
+                         "(e.g. X_test with the target added)")
+    # Categories absent from these rows are all-zero indicator columns
+    encoded = encoded.reindex(columns=[c for c in columns if c not in df.columns], fill_value=0.0)
+    return pd.concat([df[[c for c in columns if c in df.columns]], encoded], axis=1)[columns]
+
+
+def _fast_input(model, X, baseline):
+    """X as a float matrix when the model predicts the same from it, else the DataFrame.
+
+    Fitted-with-names estimators validate and convert a DataFrame on every
+    predict; a matrix permuted in place avoids that copy per repeat.
+    """
+    np = load("numpy")
+    pd = load("pandas")
+    if not all(pd.api.types.is_numeric_dtype(X[c]) for c in X.columns) or hasattr(model, 'steps'):
+        return X
+    matrix = X.to_numpy(dtype=float, copy=True)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            predictions = model.predict(matrix)
+    except Exception:
+        return X
+    same = (predictions == baseline) if predictions.dtype.kind not in 'fc' else np.isclose(predictions, baseline)
+    return matrix if bool(np.all(same)) else X
+
+
+# Set per worker process by _init_worker, so the model and rows are sent once per worker rather than per task
+_worker = {}
+
+
+def _init_worker(model, X, y, classifier: bool, baseline_score: float):
+    _worker.update(model=model, X=X, y=y, classifier=classifier, baseline_score=baseline_score)
+
+
+def _permute_features(features, max_repeats: int, min_repeats: int, tolerance: float, seed: int):
+    """Importance of each (position, name) feature: mean score drop over repeated permutations.
+
+    Repeats stop early once the standard error of the mean drop is below
+    tolerance. Every feature has its own seeded generator, so results do not
+    depend on how features are split across workers.
+    """
+    np = load("numpy")
+    model, X, y = _worker['model'], _worker['X'], _worker['y']
+    classifier, baseline_score = _worker['classifier'], _worker['baseline_score']
+    matrix = isinstance(X, np.ndarray)
+    X = X.copy()
+    results = []
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        for position, name in features:
+            rng = np.random.default_rng([seed, position])
+            original = X[:, position].copy() if matrix else X[name].to_numpy(copy=True)
+            drops = []
+            for repeat in range(max_repeats):
+                shuffled = original[rng.permutation(len(original))]
+                if matrix:
+                    X[:, position] = shuffled
+                else:
+                    X[name] = shuffled
+                drops.append(baseline_score - score(y, model.predict(X), classifier))
+                if repeat + 1 >= min_repeats and np.std(drops, ddof=1) / np.sqrt(len(drops)) <= tolerance:
+                    break
+            if matrix:
+                X[:, position] = original
+            else:
+                X[name] = original
+            results.append((name, float(np.mean(drops)), float(np.std(drops, ddof=1)) if len(drops) > 1 else 0.0,
+                            len(drops)))
+    return results
+
+
+def permutation_importance(model, X, y, baseline, max_repeats: int = MAX_REPEATS, tolerance: float = DEFAULT_TOLERANCE,
+                           workers: int = None, seed: int = 0):
+    """Permutation importance of every column of X against cached baseline predictions.
+
+    Features are spread over a process pool when the work is large enough.
+    Returns (DataFrame with importance/std/repeats per feature, baseline score).
+    """
+    pd = load("pandas")
+    classifier = is_classifier(model)
+    baseline_score = score(y, baseline, classifier)
+    data = _fast_input(model, X, baseline)
+    features = list(enumerate(X.columns))
+    min_repeats = min(MIN_REPEATS, max_repeats)
+
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(features) <= 1 or X.shape[0] * X.shape[1] < PARALLEL_MIN_CELLS:
+        _init_worker(model, data, y, classifier, baseline_score)
+        try:
+            rows = _permute_features(features, max_repeats, min_repeats, tolerance, seed)
+        finally:
+            _worker.clear()
+    else:
+        # Several small tasks per worker keep the pool busy when features converge at different speeds
+        n_tasks = min(len(features), workers * 4)
+        tasks = [features[i::n_tasks] for i in range(n_tasks)]
+        with ProcessPoolExecutor(max_workers=min(workers, n_tasks), initializer=_init_worker,
+                                 initargs=(model, data, y, classifier, baseline_score)) as pool:
+            futures = [pool.submit(_permute_features, task, max_repeats, min_repeats, tolerance, seed) for task in tasks]
+            rows = [row for future in futures for row in future.result()]
+        order = {name: position for position, name in features}
+        rows.sort(key=lambda row: order[row[0]])
+    table = pd.DataFrame(rows, columns=['feature', 'permutation_importance', 'permutation_std', 'repeats'])
+    return table, baseline_score
+
+
+def _tree_deltas(estimator, classifier: bool):
+    """(child node, feature split at its parent, value change parent -> child, root value) of one fitted tree"""
+    np = load("numpy")
+    tree = estimator.tree_
+    values = tree.value[:, 0, :]
+    if classifier:
+        values = values / np.maximum(values.sum(axis=1, keepdims=True), 1e-12)
+    parent = np.full(tree.node_count, -1)
+    internal = np.flatnonzero(tree.children_left >= 0)
+    parent[tree.children_left[internal]] = internal
+    parent[tree.children_right[internal]] = internal
+    child = np.flatnonzero(parent >= 0)
+    return child, tree.feature[parent[child]], values[child] - values[parent[child]], values[0]
+
+
+def _path_contributions(indicator, deltas, offsets, n_features: int, weight: float):
+    """Sum of weighted value changes along every row's decision paths, per feature (rows x features x outputs)"""
+    np = load("numpy")
+    sparse = load("scipy.sparse")
+    child = np.concatenate([c + offset for (c, _, _, _), offset in zip(deltas, offsets)])
+    feature = np.concatenate([f for _, f, _, _ in deltas])
+    change = np.concatenate([d for _, _, d, _ in deltas]) * weight
+    contributions = np.empty((indicator.shape[0], n_features, change.shape[1]))
+    for output in range(change.shape[1]):
+        by_feature = sparse.csr_matrix((change[:, output], (child, feature)), shape=(indicator.shape[1], n_features))
+        contributions[:, :, output] = (indicator @ by_feature).toarray()
+    return contributions
+
+
+def tree_path_contributions(model, X):
+    """Per-row additive feature contributions of a tree model by decision path (Saabas).
+
+    Every split on a row's path credits the change in node value to the split
+    feature, so bias + contributions.sum(features) reproduces the prediction:
+    class probabilities for forest and tree classifiers, the raw score
+    (log-odds) for gradient boosting classifiers. Supports scikit-learn
+    decision trees, random forests, extra trees and gradient boosting.
+    Returns (bias per row and output, contributions rows x features x outputs).
+    """
+    np = load("numpy")
+    ensemble = load("sklearn.ensemble")
+    tree_module = load("sklearn.tree")
+    classifier = is_classifier(model)
+    matrix = X.to_numpy(dtype=np.float32)
+    n_features = X.shape[1]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        if isinstance(model, (ensemble.GradientBoostingRegressor, ensemble.GradientBoostingClassifier)):
+            stages = model.estimators_
+            contributions = np.zeros((len(matrix), n_features, stages.shape[1]))
+            for stage in stages:
+                for k, estimator in enumerate(stage):
+                    indicator = estimator.decision_path(matrix)
+                    deltas = [_tree_deltas(estimator, classifier=False)]
+                    contributions[:, :, k:k + 1] += _path_contributions(indicator, deltas, [0], n_features,
+                                                                        model.learning_rate)
+            raw = model.decision_function(X) if classifier else model.predict(X)
+            raw = raw.reshape(len(matrix), -1)
+            return raw - contributions.sum(axis=1), contributions
+        if isinstance(model, (ensemble.RandomForestRegressor, ensemble.RandomForestClassifier,
+                              ensemble.ExtraTreesRegressor, ensemble.ExtraTreesClassifier)):
+            estimators = model.estimators_
+        elif isinstance(model, (tree_module.DecisionTreeRegressor, tree_module.DecisionTreeClassifier)):
+            estimators = [model]
+        else:
+            raise TypeError(f"tree-path contributions need a scikit-learn tree ensemble, not {type(model).__name__}")
+        if estimators[0].tree_.n_outputs != 1:
+            raise TypeError("tree-path contributions support single-output models only")
+        # One pass over all trees: a forest's decision_path stacks every tree's nodes side by side
+        if len(estimators) > 1:
+            indicator, offsets = model.decision_path(matrix)
+        else:
+            indicator, offsets = model.decision_path(matrix), [0]
+        deltas = [_tree_deltas(estimator, classifier) for estimator in estimators]
+        contributions = _path_contributions(indicator, deltas, offsets, n_features, 1.0 / len(estimators))
+        bias = np.mean([root for _, _, _, root in deltas], axis=0)
+        return np.broadcast_to(bias, (len(matrix), len(bias))), contributions
+
+
+def _unwrap_pipeline(model, X):
+    """Final estimator of a Pipeline and X transformed by the steps before it"""
+    pd = load("pandas")
+    if not hasattr(model, 'steps'):
+        return model, X
+    head, model = model[:-1], model[-1]
+    transformed = head.transform(X)
+    if hasattr(transformed, 'toarray'):
+        transformed = transformed.toarray()
+    try:
+        names = [str(n) for n in head.get_feature_names_out()]
+    except Exception:
+        names = [f"x{i}" for i in range(transformed.shape[1])]
+    return model, pd.DataFrame(transformed, columns=names, index=X.index)
+
+
+def _sum_by_source(contributions, names, sources):
+    """Contributions of encoded columns (onehotencoder__COUNTRY_USA) summed per source column (COUNTRY).
+
+    Contributions are additive, so the sum is the source column's own
+    contribution. Returns None when some encoded column has no source.
+    """
+    np = load("numpy")
+    index = []
+    for name in names:
+        base = name.split('__', 1)[-1]
+        matches = [i for i, source in enumerate(sources) if base == source or base.startswith(f"{source}_")]
+        if not matches:
+            return None
+        index.append(max(matches, key=lambda i: len(sources[i])))
+    grouped = np.zeros((contributions.shape[0], len(sources), contributions.shape[2]))
+    for position, source in enumerate(index):
+        grouped[:, source, :] += contributions[:, position, :]
+    return grouped
+
+
+class ExplanationTool(Tool):
+    name = "explanation_tool"
+    description = "Explain a fitted model registered by ml_model_tool: permutation importance (score drop when a feature is shuffled, against cached baseline predictions, parallel across features, with row subsampling and early stopping once stable) and fast tree-path contributions for tree ensembles (per-row additive contributions, seconds even for wide models). Saves results/<model>_feature_importance.csv and registers dataset '<model>_importance' for plotting."
+    inputs = {
+        "model_name": {
+            "type": "string",
+            "description": "Name of a model registered by ml_model_tool (default: the most recent one)",
+            "nullable": True
+        },
+        "df": {
+            "type": "object",
+            "description": "DataFrame with the model's feature columns (and target_column for permutation importance), ideally held-out rows such as X_test joined with y_test",
+            "nullable": True
+        },
+        "target_column": {
+            "type": "string",
+            "description": "Target column in df; needed for permutation importance",
+            "nullable": True
+        },
+        "method": {
+            "type": "string",
+            "description": "'auto' (default: both where possible), 'permutation' or 'tree_path'",
+            "nullable": True
+        },
+        "feature_columns": {
+            "type": "array",
+            "description": "Feature columns in training order; only needed for models fitted without column names",
+            "nullable": True
+        },
+        "max_rows": {
+            "type": "integer",
+            "description": "Rows sampled for the explanation (default 10000; 0 uses every row)",
+            "nullable": True
+        },
+        "max_repeats": {
+            "type": "integer",
+            "description": "Most permutations per feature (default 10); fewer are used once the importance is stable",
+            "nullable": True
+        },
+        "tolerance": {
+            "type": "number",
+            "description": "Stop permuting a feature once the standard error of its importance is below this (default 0.005)",
+            "nullable": True
+        },
+        "workers": {
+            "type": "integer",
+            "description": "Worker processes for permutation importance (default: CPU count)",
+            "nullable": True
+        },
+        "top": {
+            "type": "integer",
+            "description": "Number of features to list (default 20)",
+            "nullable": True
+        }
+    }
+    output_type = "string"
+
+    def forward(self, model_name: str = None, df=None, target_column: str = None, method: str = None,
+                feature_columns: list = None, max_rows: int = None, max_repeats: int = None, tolerance: float = None,
+                workers: int = None, top: int = None) -> str:
+        """Compute the requested importances and summarize them"""
+        try:
+            pd = load("pandas")
+            np = load("numpy")
+            started = time.perf_counter()
+            if model_name is None:
+                if not session.models:
+                    return "❌ Error explaining model: no model registered; fit one with ml_model_tool first"
+                model_name = next(reversed(session.models))
+            model = session.models.get(model_name)
+            if model is None:
+                return f"❌ Unknown model '{model_name}'. Registered models: {', '.join(session.models) or 'none'}"
+            df = df if df is not None else session.get_dataset()
+            if df is None:
+                return "❌ Error explaining model: no DataFrame given and no dataset loaded"
+            method = (method or 'auto').lower()
+            if method not in METHODS:
+                return f"❌ Unknown method: {method}. Use {', '.join(METHODS)}"
+            if target_column is not None and target_column not in df.columns:
+                return f"❌ Error explaining model: target column '{target_column}' not found"
+            if method == 'permutation' and target_column is None:
+                return "❌ Error explaining model: permutation importance needs target_column"
+            max_rows = DEFAULT_MAX_ROWS if max_rows is None else int(max_rows)
+            max_repeats = MAX_REPEATS if max_repeats is None else max(1, int(max_repeats))
+            tolerance = DEFAULT_TOLERANCE if tolerance is None else float(tolerance)
+            top = 20 if top is None else max(1, int(top))
+
+            rows = df if target_column is None else df[df[target_column].notna()]
+            if max_rows and len(rows) > max_rows:
+                positions = np.sort(np.random.default_rng(0).choice(len(rows), max_rows, replace=False))
+                rows = rows.iloc[positions]
+            X = feature_frame(model, rows, feature_columns, target_column)
+            features = list(X.columns)
+
+            os.makedirs('results', exist_ok=True)
+            table = pd.DataFrame({'feature': [str(f) for f in features]})
+            lines = []
+            if method in ('auto', 'permutation') and target_column is not None:
+                baseline = self._baseline(model_name, model, X)
+                y = rows[target_column].to_numpy()
+                perm_started = time.perf_counter()
+                importance, baseline_score = permutation_importance(model, X, y, baseline, max_repeats, tolerance, workers)
+                table = table.merge(importance, on='feature', how='left')
+                metric = "accuracy" if is_classifier(model) else "R²"
+                lines.append(f"Permutation importance: baseline {metric} {baseline_score:.4f} on {len(X):,} rows; "
+                             f"{int(importance['repeats'].sum())} permutations over {len(features)} features "
+                             f"(mean {importance['repeats'].mean():.1f} of at most {max_repeats} repeats) "
+                             f"in {time.perf_counter() - perm_started:.2f}s")
+
+            if method in ('auto', 'tree_path'):
+                tree_started = time.perf_counter()
+                try:
+                    estimator, X_tree = _unwrap_pipeline(model, X)
+                    bias, contributions = tree_path_contributions(estimator, X_tree)
+                    if X_tree is not X:
+                        grouped = _sum_by_source(contributions, list(X_tree.columns), [str(f) for f in features])
+                        if grouped is not None:
+                            contributions, X_tree = grouped, X
+                except TypeError as e:
+                    if method == 'tree_path':
+                        return f"❌ Error explaining model: {e}"
+                    contributions = None
+                    lines.append(f"Tree-path contributions skipped: {e}")
+                if contributions is not None:
+                    importance = pd.DataFrame({'feature': list(X_tree.columns),
+                                               'tree_path_importance': np.abs(contributions).mean(axis=(0, 2))})
+                    table = importance.merge(table, on='feature', how='outer') if list(X_tree.columns) != features \
+                        else table.merge(importance, on='feature', how='left')
+                    self._save_contributions(model_name, estimator, X_tree, bias, contributions)
+                    lines.append(f"Tree-path contributions: {len(X_tree):,} rows x {X_tree.shape[1]} features in "
+                                 f"{time.perf_counter() - tree_started:.2f}s; per-row values in "
+                                 f"results/{model_name}_contributions.csv")
+
+            if len(table.columns) == 1:
+                return ("❌ Error explaining model: nothing to compute; pass target_column for permutation importance "
+                        "or use a tree ensemble for tree-path contributions")
+            order = 'permutation_importance' if 'permutation_importance' in table.columns else 'tree_path_importance'
+            table = table.sort_values(order, ascending=False, na_position='last').reset_index(drop=True)
+
+            output_path = f"results/{model_name}_feature_importance.csv"
+            table.to_csv(output_path, index=False)
+            session.register_dataset(f"{model_name}_importance", table, source=self.name)
+            lines.insert(0, f"✅ Explained model '{model_name}' ({type(model).__name__}) in "
+                            f"{time.perf_counter() - started:.2f}s")
+            lines.append(f"Saved to {output_path}; dataset '{model_name}_importance' holds the table for plotting")
+            lines.append(f"\nTop {min(top, len(table))} features by {order.replace('_', ' ')}:")
+            lines.append(table.head(top).round(4).to_string(index=False))
+            return "\n".join(lines)
+
+        except Exception as e:
+            return f"❌ Error explaining model: {str(e)}"
+
+    def _baseline(self, model_name: str, model, X):
+        """Predictions on the sampled rows, computed once per model and sampled feature content"""
+        pd = load("pandas")
+        registered = session.metadata.get(('model', model_name), {}).get('registered_at')
+        # Predictions depend only on X, so its content (not the dataset it was sampled from) is the key
+        content = hashlib.sha1(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes()).hexdigest()
+        key = (model_name, id(model), registered, tuple(map(str, X.columns)), X.shape, content)
+        with _baselines_lock:
+            if key in _baselines:
+                _baselines.move_to_end(key)
+                return _baselines[key][0]
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            predictions = load("numpy").asarray(model.predict(X))
+        with _baselines_lock:
+            _baselines[key] = (predictions, time.time())
+            while len(_baselines) > BASELINE_CACHE_SIZE:
+                _baselines.popitem(last=False)
+        return predictions
+
+    def _save_contributions(self, model_name: str, estimator, X, bias, contributions):
+        """Per-row contributions toward the predicted class (classifiers) or the prediction (regressors)"""
+        pd = load("pandas")
+        np = load("numpy")
+        if contributions.shape[2] > 1:
+            chosen = (bias + contributions.sum(axis=1)).argmax(axis=1)
+        else:
+            chosen = np.zeros(len(X), dtype=int)
+        rows = np.arange(len(X))
+        frame = pd.DataFrame(contributions[rows, :, chosen], columns=list(X.columns), index=X.index)
+        frame.insert(0, 'bias', bias[rows, chosen])
+        if contributions.shape[2] > 1 and hasattr(estimator, 'classes_'):
+            frame.insert(0, 'explained_class', np.asarray(estimator.classes_)[chosen])
+        frame.to_csv(f"results/{model_name}_contributions.csv", index_label='row')
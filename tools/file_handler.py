@@ -1,73 +1,225 @@
 from smolagents import Tool
-import pandas as pd
 import os
-import chardet
+import time
+from tools.lazy_imports import load
+from tools.session import session
+from tools.memory_governor import governor, dataframe_bytes
+from tools.aggregate_cube import AggregateCube
+from tools.excel_reader import read_workbook
+from tools.data_quality import check_quality, merge_quality
+from tools import incremental
+
+# Bytes sampled for encoding detection
+ENCODING_SAMPLE_BYTES = 1024 * 1024
+# Compact mode stores text columns as categoricals when at most this share of their values is distinct
+COMPACT_MAX_CARDINALITY_RATIO = 0.5
 
 class FileHandlerTool(Tool):
     name = "file_handler"
-    description = "Load, validate, and preprocess data files (CSV/Excel). Detect encoding, validate format, and prepare data for analysis."
+    description = "Load, validate, and preprocess data files (CSV/Excel). Detect encoding, validate format, and prepare data for analysis. For Excel workbooks, choose sheets with sheet_name ('*' loads every sheet and returns a dict of DataFrames keyed by sheet name)."
     inputs = {
         "file_path": {
             "type": "string",
             "description": "Path to the data file (CSV/Excel) to load and process"
+        },
+        "sheet_name": {
+            "type": "string",
+            "description": "Excel only: sheet to load, a comma-separated list of sheets, or '*' for all sheets (default: first sheet)",
+            "nullable": True
+        },
+        "columns": {
+            "type": "array",
+            "description": "Optional list of column names to load; other columns are never parsed",
+            "nullable": True
+        },
+        "dtypes": {
+            "type": "object",
+            "description": "Optional CSV dtype hints as {column: dtype}, e.g. {'SALES': 'float32', 'STATUS': 'category'}",
+            "nullable": True
+        },
+        "compact": {
+            "type": "boolean",
+            "description": "Compact in-memory representation: repetitive text columns (COUNTRY, PRODUCTCODE, STATUS, ...) become categoricals and numeric columns are downcast where no value changes. Uses several times less memory and speeds up groupby; group categoricals with observed=True (default false)",
+            "nullable": True
         }
     }
     output_type = "object"
 
-    def forward(self, file_path: str):
-        """Load and preprocess data file, returning the DataFrame"""
+    def forward(self, file_path: str, sheet_name: str = None, columns: list = None, dtypes: dict = None,
+                compact: bool = False):
+        """Load and preprocess data file, returning the DataFrame (or a dict of DataFrames for several sheets)"""
         try:
             # Detect file extension
             file_ext = os.path.splitext(file_path)[1].lower()
+            dataset_name = os.path.splitext(os.path.basename(file_path))[0]
 
             if file_ext == '.csv':
-                df = self._load_csv_with_encoding_detection(file_path)
+                if not incremental.ENABLED:
+                    df = self._load_csv_with_encoding_detection(file_path, columns=columns, dtypes=dtypes)
+                    return self._prepare(df, file_path, dataset_name, compact)
+                # Append-only growth of a file loaded before only parses the new tail
+                df, state = incremental.load_csv(
+                    file_path,
+                    parse=lambda path: (self._load_csv_with_encoding_detection(path, columns=columns, dtypes=dtypes),
+                                        self._encoding),
+                    parse_tail=lambda path, encoding: self._read_csv(path, encoding, columns, dtypes),
+                    variant=repr((columns, dtypes, bool(compact))),
+                )
+                return self._prepare(df, file_path, dataset_name, compact, append_state=state)
             elif file_ext in ['.xlsx', '.xls']:
-                df = pd.read_excel(file_path)
+                sheets = read_workbook(file_path, sheets=sheet_name, columns=columns)
+                if len(sheets) == 1 and sheet_name != '*':
+                    return self._prepare(next(iter(sheets.values())), file_path, dataset_name, compact)
+                return {
+                    sheet: self._prepare(df, f"{file_path} [{sheet}]", f"{dataset_name}_{sheet}", compact)
+                    for sheet, df in sheets.items()
+                }
             else:
                 raise ValueError(f"Unsupported file format: {file_ext}")
 
-            # Basic data validation and cleaning
-            print(f"✅ Data loaded successfully from {file_path}")
+        except Exception as e:
+            print(f"❌ Error loading file: {str(e)}")
+            raise e
+
+    def _prepare(self, df, source: str, dataset_name: str, compact: bool = False, append_state=None):
+        """Validate and clean a loaded DataFrame, then register it with the session.
+
+        With the append state of an extended CSV, the rows prepared at the last
+        load are reused as they are and only the new rows are checked, imputed
+        (with the values pinned at the first load), converted and compacted;
+        the cached cube is updated with the new rows only, so nothing computed
+        for earlier rows changes.
+        """
+        pd = load("pandas")
+        incremental_update = append_state is not None and append_state.status in ('appended', 'unchanged')
+        pinned = append_state.manifest.get('fill_values', {}) if incremental_update else {}
+        earlier = append_state.prepared if incremental_update else None
+
+        # Basic data validation and cleaning
+        print(f"✅ Data loaded successfully from {source}")
+        if earlier is not None:
+            df = append_state.tail
+            print(f"   Reused {len(earlier)} prepared rows; preparing {len(df)} new rows")
+        else:
             print(f"   Shape: {df.shape[0]} rows, {df.shape[1]} columns")
             print(f"   Columns: {list(df.columns)}")
             print(f"   Data types: {df.dtypes.to_dict()}")
 
-            # Handle missing values
-            if df.isnull().sum().sum() > 0:
-                print(f"   Missing values found: {df.isnull().sum().sum()} total")
-                # Fill numeric columns with mean, categorical with mode
-                for col in df.columns:
-                    if df[col].dtype in ['int64', 'float64']:
-                        df[col].fillna(df[col].mean(), inplace=True)
-                    else:
-                        df[col].fillna(df[col].mode().iloc[0] if not df[col].mode().empty else 'Unknown', inplace=True)
-                print("   Missing values handled")
-
-            # Convert date columns if they exist
+        # Rows without a single value (e.g. trailing ',,,' lines in exports) carry nothing to impute
+        empty = df.isnull().all(axis=1)
+        if empty.any():
+            df = df[~empty].reset_index(drop=True)
+            print(f"   Dropped {int(empty.sum())} empty rows")
+
+        # Rule checks and null counts run on the data as loaded, before anything is imputed
+        quality = check_quality(df)
+        if earlier is not None:
+            previous = append_state.manifest['quality']
+            quality = merge_quality(previous, earlier, df, quality)
+            quality['empty_rows_dropped'] = previous.get('empty_rows_dropped', 0) + int(empty.sum())
+            if 'imputed' in previous:
+                quality['imputed'] = dict(previous['imputed'])
+        else:
+            quality['empty_rows_dropped'] = int(empty.sum())
+        failed = [r for r in quality['rules'] if r.get('violations')]
+        print(f"   Data quality: {len(quality['rules']) - len(failed)} of {len(quality['rules'])} rules passed"
+              + "".join(f"\n     ⚠️ {r['rule']}: {r['violations']} rows" for r in failed))
+
+        # Handle missing values
+        imputed = {}
+        if quality['nulls']:
+            print(f"   Missing values found: {sum(quality['nulls'].values())} total")
+            # Fill numeric columns with mean, categorical with mode
             for col in df.columns:
-                if 'date' in col.lower() or 'time' in col.lower():
-                    try:
-                        df[col] = pd.to_datetime(df[col], errors='coerce')
-                        print(f"   Converted {col} to datetime")
-                    except:
-                        pass
+                if not df[col].isnull().any():
+                    continue
+                # Earlier rows of a column without a pinned value had no nulls: they count as loaded
+                values = pd.concat([earlier[col], df[col]], ignore_index=True) if earlier is not None else df[col]
+                if str(col) in pinned:
+                    value = pinned[str(col)]
+                elif df[col].dtype in ['int64', 'float64']:
+                    value = values.mean()
+                else:
+                    value = values.mode().iloc[0] if not values.mode().empty else 'Unknown'
+                df[col] = df[col].fillna(value)
+                imputed[str(col)] = value
+            quality['imputed'] = {**quality.get('imputed', {}), **imputed}
+            if imputed:
+                print("   Missing values imputed: " + ", ".join(f"{col} ({quality['nulls'][col]} -> {value!r})"
+                                                            for col, value in imputed.items()))
+        session.record_quality(dataset_name, quality)
 
-            return df
+        # Convert date columns if they exist
+        for col in df.columns:
+            if 'date' in str(col).lower() or 'time' in str(col).lower():
+                try:
+                    df[col] = pd.to_datetime(df[col], errors='coerce')
+                    print(f"   Converted {col} to datetime")
+                except:
+                    pass
 
+        if compact and earlier is not None:
+            # New rows take the earlier rows' encoding wherever it holds their values
+            df, earlier = match_dtypes(df, earlier)
+        elif compact:
+            before = dataframe_bytes(df)
+            df, changed = compact_dataframe(df)
+            after = dataframe_bytes(df)
+            print(f"   Compact representation: {before / 1024 ** 2:.1f} MB -> {after / 1024 ** 2:.1f} MB "
+                  f"({before / max(after, 1):.1f}x smaller, {len(changed)} columns re-encoded)")
+            categorical = [col for col, (_, new) in changed.items() if new == 'category']
+            if categorical:
+                print(f"   Categorical columns (group with observed=True): {categorical}")
+
+        prepared = df
+        if earlier is not None:
+            # Concatenating no rows would still widen dtypes (e.g. to object) to fit the empty frame's
+            df = pd.concat([earlier, df], ignore_index=True) if len(df) else earlier
+
+        # Make the DataFrame available to the rest of the session
+        session.register_dataset(dataset_name, df, source=self.name)
+
+        # Pre-aggregate the common business dimensions once so later
+        # analysis and plots can read O(cells) instead of O(rows)
+        cube = append_state.load_cube() if incremental_update else None
+        try:
+            if cube is not None:
+                new_rows = len(df) - cube.row_count
+                cube.update(df.iloc[cube.row_count:])
+                print(f"   Updated aggregate cube with {new_rows} new rows: {cube.n_cells} cells over {len(cube.dimensions)} dimensions")
+            else:
+                cube = AggregateCube.build(df)
+                print(f"   Built aggregate cube: {cube.n_cells} cells over {len(cube.dimensions)} dimensions")
+            session.register_cube(dataset_name, cube)
         except Exception as e:
-            print(f"❌ Error loading file: {str(e)}")
-            raise e
+            cube = None
+            print(f"   Aggregate cube not built: {e}")
+
+        if append_state is not None and append_state.status != 'unsupported':
+            try:
+                append_state.commit_prepared(dataset_name, len(df), cube, fill_values={**pinned, **imputed},
+                                             new_rows=prepared, quality=quality)
+            except Exception as e:
+                print(f"   Incremental state not saved: {e}")
 
-    def _load_csv_with_encoding_detection(self, file_path: str) -> pd.DataFrame:
+        # Loading another dataset is the most common way to exceed the memory budget
+        governor.enforce()
+
+        return df
+
+    def _load_csv_with_encoding_detection(self, file_path: str, columns: list = None, dtypes: dict = None) -> "pd.DataFrame":
         """Load CSV file with automatic encoding detection"""
+        pd = load("pandas")
+
         # List of encodings to try in order of preference
         encodings_to_try = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1', 'utf-16']
 
-        # First, try to detect encoding using chardet
+        # First, try to detect encoding using chardet (a sample is enough and
+        # avoids reading the whole file into memory twice)
         try:
+            chardet = load("chardet")
             with open(file_path, 'rb') as f:
-                raw_data = f.read()
+                raw_data = f.read(ENCODING_SAMPLE_BYTES)
                 detected = chardet.detect(raw_data)
                 if detected['encoding'] and detected['confidence'] > 0.7:
                     encodings_to_try.insert(0, detected['encoding'])
@@ -79,8 +231,9 @@ class FileHandlerTool(Tool):
         for encoding in encodings_to_try:
             try:
                 print(f"   Trying encoding: {encoding}")
-                df = pd.read_csv(file_path, encoding=encoding)
+                df = self._read_csv(file_path, encoding, columns, dtypes)
                 print(f"   ✅ Successfully loaded with {encoding} encoding")
+                self._encoding = encoding
                 return df
             except UnicodeDecodeError:
                 print(f"   ❌ Failed with {encoding} encoding")
@@ -91,10 +244,160 @@ class FileHandlerTool(Tool):
 
         # If all encodings fail, try with error handling
         try:
-            print("   Trying with error handling (errors='ignore')")
-            df = pd.read_csv(file_path, encoding='utf-8', errors='ignore')
+            print("   Trying with error handling (encoding_errors='ignore')")
+            df = pd.read_csv(file_path, encoding='utf-8', encoding_errors='ignore', usecols=columns, dtype=dtypes)
             print("   ✅ Loaded with error handling")
+            self._encoding = None
             return df
         except Exception as e:
             print(f"   ❌ All encoding attempts failed: {e}")
             raise ValueError(f"Unable to read CSV file with any encoding. Last error: {e}")
+
+    def _read_csv(self, file_path: str, encoding: str, columns: list = None, dtypes: dict = None):
+        """Parse a CSV with the multi-threaded Arrow reader, falling back to pandas.
+
+        Only the requested columns are converted and dtype hints are applied
+        while parsing, so unneeded columns are never materialized.
+        """
+        pd = load("pandas")
+        size_mb = os.path.getsize(file_path) / (1024 * 1024)
+        started = time.perf_counter()
+        try:
+            pa_csv = load("pyarrow.csv")
+            table = pa_csv.read_csv(
+                file_path,
+                read_options=pa_csv.ReadOptions(use_threads=True, encoding=encoding),
+                convert_options=pa_csv.ConvertOptions(
+                    include_columns=list(columns) if columns else None,
+                    column_types=_arrow_column_types(dtypes),
+                    # Match pandas: empty strings are missing values
+                    strings_can_be_null=True,
+                ),
+            )
+            # Arrow keeps text it cannot decode as binary columns instead of failing like pandas does,
+            # so raise the error pandas would and let the caller try the next encoding
+            pa_types = load("pyarrow").types
+            undecoded = [field.name for field in table.schema if field.name not in (dtypes or {})
+                         and (pa_types.is_binary(field.type) or pa_types.is_large_binary(field.type))]
+            if undecoded:
+                raise UnicodeDecodeError(encoding, b"", 0, 1, f"columns {undecoded} are not valid {encoding}")
+            df = table.to_pandas()
+            engine = "pyarrow (multi-threaded)"
+        except UnicodeDecodeError:
+            raise
+        except ImportError:
+            df = pd.read_csv(file_path, encoding=encoding, usecols=columns, dtype=dtypes)
+            engine = "pandas"
+        except Exception as arrow_error:
+            # Arrow is stricter (e.g. ragged rows); pandas decides whether the encoding is really wrong
+            df = pd.read_csv(file_path, encoding=encoding, usecols=columns, dtype=dtypes)
+            engine = f"pandas (Arrow failed: {str(arrow_error).splitlines()[0]})"
+
+        # Remaining hints Arrow cannot express directly (e.g. category)
+        if dtypes:
+            pending = {col: dtype for col, dtype in dtypes.items() if col in df.columns and str(df[col].dtype) != str(dtype)}
+            if pending:
+                df = df.astype(pending)
+
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        print(f"   Parsed {size_mb:.1f} MB with {engine} in {elapsed:.2f}s ({size_mb / elapsed:.1f} MB/s)"
+              + (f", {len(df.columns)} of the file's columns" if columns else ""))
+        return df
+
+
+def _fits_integer(low, high, dtype) -> bool:
+    """True if every value between low and high converts to the integer dtype unchanged"""
+    np = load("numpy")
+    info = np.iinfo(dtype)
+    # 2**63 is exact as a float but one past int64's max, so the upper bound is exclusive
+    return float(low) >= float(info.min) and float(high) < float(info.max) + 1
+
+
+def compact_dataframe(df, max_cardinality_ratio: float = COMPACT_MAX_CARDINALITY_RATIO):
+    """Dictionary-encode repetitive text columns and downcast numerics without changing any value.
+
+    Integers within the int32 range become int32 (never narrower, so derived
+    arithmetic such as YEAR_ID * 100 or QUANTITY ** 2 does not overflow),
+    floats that are whole numbers without NaN become int32 or int64 when
+    their range fits, and other floats become float32 only where every value
+    survives the round trip. Returns the new DataFrame and
+    {column: (old dtype, new dtype)} for the changed columns.
+    """
+    pd = load("pandas")
+    np = load("numpy")
+    columns = []
+    changed = {}
+    for col in df.columns:
+        series = df[col]
+        new = series
+        if pd.api.types.is_bool_dtype(series) or pd.api.types.is_datetime64_any_dtype(series) \
+                or isinstance(series.dtype, pd.CategoricalDtype):
+            pass
+        elif pd.api.types.is_integer_dtype(series):
+            if len(series) and series.dtype.itemsize > 4 and _fits_integer(series.min(), series.max(), np.int32):
+                nullable = isinstance(series.dtype, pd.api.extensions.ExtensionDtype)
+                new = series.astype('Int32' if nullable else np.int32)
+        elif pd.api.types.is_float_dtype(series):
+            values = series.to_numpy()
+            finite = np.isfinite(values)
+            whole = len(values) and finite.all() and (values == np.round(values)).all()
+            if whole and _fits_integer(values.min(), values.max(), np.int64):
+                target = np.int32 if _fits_integer(values.min(), values.max(), np.int32) else np.int64
+                new = series.astype(target)
+            else:
+                narrowed = values.astype(np.float32)
+                if ((narrowed.astype(values.dtype) == values) | ~finite).all():
+                    new = series.astype(np.float32)
+        elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            if series.nunique(dropna=True) <= max_cardinality_ratio * len(series):
+                new = series.astype('category')
+        if new.dtype != series.dtype:
+            changed[col] = (str(series.dtype), str(new.dtype))
+        columns.append(new)
+    return pd.concat(columns, axis=1), changed
+
+
+def match_dtypes(df, reference):
+    """Cast df's columns to reference's dtypes where no value changes, so the two concatenate
+    without widening; categoricals get the union of both frames' categories.
+    Returns (df, reference)."""
+    pd = load("pandas")
+    for col in df.columns:
+        if col not in reference.columns or df[col].dtype == reference[col].dtype:
+            continue
+        target = reference[col].dtype
+        if isinstance(target, pd.CategoricalDtype):
+            missing = pd.Index(df[col].dropna().unique()).difference(target.categories)
+            if len(missing):
+                reference[col] = reference[col].cat.add_categories(missing)
+            df[col] = pd.Categorical(df[col], categories=reference[col].cat.categories)
+            continue
+        try:
+            cast = df[col].astype(target)
+        except (TypeError, ValueError, OverflowError):
+            continue
+        if cast.astype(df[col].dtype).equals(df[col]):
+            df[col] = cast
+    return df, reference
+
+
+def _arrow_column_types(dtypes: dict):
+    """Translate pandas dtype hints into Arrow column types where possible"""
+    if not dtypes:
+        return None
+    pa = load("pyarrow")
+    np = load("numpy")
+    types = {}
+    for col, dtype in dtypes.items():
+        name = str(dtype)
+        if name == 'category':
+            types[col] = pa.dictionary(pa.int32(), pa.string())
+        elif name in ('str', 'string', 'object'):
+            types[col] = pa.string()
+        else:
+            try:
+                types[col] = pa.from_numpy_dtype(np.dtype(name))
+            except Exception:
+                # Applied after parsing instead
+                continue
+    return types
@@ -0,0 +1,427 @@
+from smolagents import Tool
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+from tools.lazy_imports import load
+from tools.session import session
+
+DEFAULT_HIERARCHY = ['PRODUCTLINE', 'COUNTRY', 'PRODUCTCODE']
+SES_ALPHAS = (0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
+HOLT_ALPHAS = (0.1, 0.3, 0.5, 0.7, 0.9)
+HOLT_BETAS = (0.01, 0.05, 0.1, 0.2, 0.3)
+FAST_METHODS = ('ses', 'holt', 'seasonal_naive')
+# Fitted one series at a time (statsmodels), spread over worker processes
+HEAVY_METHODS = ('holt_winters',)
+HEAVY_CHUNK_SIZE = 64
+FREQUENCIES = {'D': 'D', 'W': 'W', 'M': 'M', 'Q': 'Q', 'Y': 'Y'}
+
+
+def _started(Y):
+    """True from each series' first non-zero observation onwards"""
+    np = load("numpy")
+    return np.cumsum(Y != 0, axis=1) > 0
+
+
+def fit_ses(Y, alphas=SES_ALPHAS):
+    """Simple exponential smoothing for every row of Y at once.
+
+    All alphas are run side by side and each series keeps the one with the
+    lowest one-step squared error. Returns (level, alpha, one-step errors).
+    """
+    np = load("numpy")
+    n, T = Y.shape
+    started = _started(Y)
+    a = np.asarray(alphas)[None, :]
+    level = np.full((n, len(alphas)), np.nan)
+    errors = np.full((n, len(alphas), T), np.nan)
+    for t in range(T):
+        y = Y[:, t][:, None]
+        err = y - level
+        scored = ~np.isnan(level)
+        errors[:, :, t] = np.where(scored, err, np.nan)
+        level = np.where(scored, level + a * err, np.where(started[:, t][:, None], y, np.nan))
+    best = _best_by_sse(errors)
+    rows = np.arange(n)
+    return level[rows, best], np.asarray(alphas)[best], errors[rows, best]
+
+
+def fit_holt(Y, alphas=HOLT_ALPHAS, betas=HOLT_BETAS):
+    """Holt's linear trend method over a grid of (alpha, beta), vectorized across series.
+
+    Returns (level, trend, alpha, beta, one-step errors).
+    """
+    np = load("numpy")
+    n, T = Y.shape
+    started = _started(Y)
+    grid_a, grid_b = np.meshgrid(np.asarray(alphas), np.asarray(betas), indexing='ij')
+    a, b = grid_a.ravel()[None, :], grid_b.ravel()[None, :]
+    k = a.shape[1]
+    level = np.full((n, k), np.nan)
+    trend = np.zeros((n, k))
+    errors = np.full((n, k, T), np.nan)
+    for t in range(T):
+        y = Y[:, t][:, None]
+        prediction = level + trend
+        err = y - prediction
+        scored = ~np.isnan(level)
+        errors[:, :, t] = np.where(scored, err, np.nan)
+        # Error-correction form: l = l + b + a*e, b = b + a*beta*e
+        level = np.where(scored, prediction + a * err, np.where(started[:, t][:, None], y, np.nan))
+        trend = np.where(scored, trend + a * b * err, trend)
+    best = _best_by_sse(errors)
+    rows = np.arange(n)
+    return level[rows, best], trend[rows, best], a[0, best], b[0, best], errors[rows, best]
+
+
+def fit_seasonal_naive(Y, season_length: int):
+    """Seasonal-naive one-step errors (NaN where no full season is available)"""
+    np = load("numpy")
+    n, T = Y.shape
+    errors = np.full((n, T), np.nan)
+    if T > season_length:
+        started = _started(Y)
+        lagged_started = started[:, :-season_length]
+        diff = Y[:, season_length:] - Y[:, :-season_length]
+        errors[:, season_length:] = np.where(lagged_started, diff, np.nan)
+    return errors
+
+
+def _best_by_sse(errors):
+    """Index of the parameter setting with the lowest mean squared one-step error"""
+    np = load("numpy")
+    counts = np.sum(~np.isnan(errors), axis=2)
+    sse = np.nansum(errors ** 2, axis=2)
+    mse = np.where(counts > 0, sse / np.maximum(counts, 1), np.inf)
+    return np.argmin(mse, axis=1)
+
+
+def _sigma(errors):
+    np = load("numpy")
+    counts = np.sum(~np.isnan(errors), axis=1)
+    sse = np.nansum(errors ** 2, axis=1)
+    return np.sqrt(sse / np.maximum(counts, 1))
+
+
+def _mean_abs_error(errors):
+    """Mean absolute one-step error per series (inf where nothing was scored)"""
+    np = load("numpy")
+    counts = np.sum(~np.isnan(errors), axis=1)
+    return np.where(counts > 0, np.nansum(np.abs(errors), axis=1) / np.maximum(counts, 1), np.inf)
+
+
+def forecast_fast(Y, horizon: int, season_length: int, method: str = 'auto'):
+    """Point forecasts, forecast variances and chosen method names for every row of Y"""
+    np = load("numpy")
+    n, T = Y.shape
+    steps = np.arange(1, horizon + 1)[None, :]
+    candidates = {}
+
+    level, alpha, ses_errors = fit_ses(Y)
+    ses_var_factor = 1 + (steps - 1) * alpha[:, None] ** 2
+    candidates['ses'] = (np.repeat(level[:, None], horizon, axis=1), ses_var_factor, ses_errors)
+
+    level, trend, alpha, beta, holt_errors = fit_holt(Y)
+    # c_j = alpha * (1 + j * beta); var_h = sigma^2 * (1 + sum_{j<h} c_j^2)
+    c = alpha[:, None] * (1 + np.arange(0, horizon)[None, :] * beta[:, None])
+    c[:, 0] = 0
+    holt_var_factor = 1 + np.cumsum(c ** 2, axis=1)
+    candidates['holt'] = (level[:, None] + steps * trend[:, None], holt_var_factor, holt_errors)
+
+    if T > season_length + 1:
+        snaive_errors = fit_seasonal_naive(Y, season_length)
+        positions = T - season_length + (steps[0] - 1) % season_length
+        snaive_var_factor = np.repeat(((steps - 1) // season_length + 1).astype(float), n, axis=0)
+        candidates['seasonal_naive'] = (Y[:, positions], snaive_var_factor, snaive_errors)
+
+    if method != 'auto':
+        if method not in candidates:
+            raise ValueError(f"Method '{method}' needs more than {season_length + 1} periods of history")
+        names = [method]
+    else:
+        names = list(candidates)
+
+    # Compare methods on the same window (after the first season when seasonal naive is a candidate)
+    window = season_length if 'seasonal_naive' in names else 2
+    scores = np.stack([_mean_abs_error(candidates[name][2][:, window:]) for name in names], axis=1)
+    choice = np.argmin(scores, axis=1)
+
+    means = np.stack([candidates[name][0] for name in names], axis=0)
+    var_factors = np.stack([candidates[name][1] for name in names], axis=0)
+    sigmas = np.stack([_sigma(candidates[name][2]) for name in names], axis=0)
+    rows = np.arange(n)
+    mean = means[choice, rows]
+    variance = var_factors[choice, rows] * sigmas[choice, rows][:, None] ** 2
+    return mean, variance, np.asarray(names)[choice]
+
+
+def _fit_holt_winters_chunk(rows, horizon: int, season_length: int, interval: float):
+    """Fit damped Holt-Winters models for a block of series (runs in a worker process)"""
+    np = load("numpy")
+    holtwinters = load("statsmodels.tsa.holtwinters")
+    lower_q, upper_q = (1 - interval) / 2, (1 + interval) / 2
+    results = []
+    for values in rows:
+        values = np.asarray(values, dtype=float)
+        try:
+            seasonal = 'add' if len(values) >= 2 * season_length else None
+            model = holtwinters.ExponentialSmoothing(
+                values, trend='add', damped_trend=True, seasonal=seasonal,
+                seasonal_periods=season_length if seasonal else None, initialization_method='estimated',
+            ).fit()
+            mean = model.forecast(horizon)
+            paths = model.simulate(horizon, repetitions=500, error='add', random_state=0)
+            results.append((mean, np.quantile(paths, lower_q, axis=1), np.quantile(paths, upper_q, axis=1)))
+        except Exception:
+            results.append(None)
+    return results
+
+
+class ForecastingTool(Tool):
+    name = "forecasting_tool"
+    description = "Forecast every series of a hierarchy in one call (by default total, PRODUCTLINE, PRODUCTLINE x COUNTRY and PRODUCTLINE x COUNTRY x PRODUCTCODE), with prediction intervals. Fast vectorized exponential smoothing (SES, Holt) and seasonal-naive models are fitted to all series at once and the best is picked per series ('auto'); 'holt_winters' fits heavier statsmodels models on worker processes. Writes results/forecasts.csv and registers the forecasts as dataset 'forecasts'."
+    inputs = {
+        "df": {
+            "type": "object",
+            "description": "Pandas DataFrame with the transactions (default: the most recently loaded dataset)",
+            "nullable": True
+        },
+        "value_column": {
+            "type": "string",
+            "description": "Numeric column to forecast (default SALES)",
+            "nullable": True
+        },
+        "date_column": {
+            "type": "string",
+            "description": "Date column (default: the first datetime column, e.g. ORDERDATE)",
+            "nullable": True
+        },
+        "group_columns": {
+            "type": "array",
+            "description": "Hierarchy from top to bottom, e.g. ['PRODUCTLINE', 'COUNTRY', 'PRODUCTCODE']; every prefix is forecast too",
+            "nullable": True
+        },
+        "horizon": {
+            "type": "integer",
+            "description": "Number of periods to forecast (default 6)",
+            "nullable": True
+        },
+        "method": {
+            "type": "string",
+            "description": "auto (default), ses, holt, seasonal_naive or holt_winters",
+            "nullable": True
+        },
+        "frequency": {
+            "type": "string",
+            "description": "Period of the series: D, W, M (default), Q or Y",
+            "nullable": True
+        },
+        "season_length": {
+            "type": "integer",
+            "description": "Periods per season (default 12 for monthly data)",
+            "nullable": True
+        },
+        "interval": {
+            "type": "number",
+            "description": "Prediction interval coverage (default 0.9)",
+            "nullable": True
+        }
+    }
+    output_type = "string"
+
+    def forward(self, df=None, value_column: str = None, date_column: str = None, group_columns: list = None,
+                horizon: int = None, method: str = None, frequency: str = None, season_length: int = None,
+                interval: float = None) -> str:
+        """Forecast all series of the hierarchy and summarize the results"""
+        try:
+            np = load("numpy")
+            pd = load("pandas")
+            started_at = time.perf_counter()
+
+            df = df if df is not None else session.get_dataset()
+            if df is None:
+                return "❌ Error forecasting: no DataFrame given and no dataset loaded"
+            horizon = 6 if horizon is None else max(1, int(horizon))
+            method = (method or 'auto').lower()
+            if method not in ('auto',) + FAST_METHODS + HEAVY_METHODS:
+                return f"❌ Unknown method: {method}. Use auto, {', '.join(FAST_METHODS + HEAVY_METHODS)}"
+            frequency = FREQUENCIES.get((frequency or 'M').upper())
+            if frequency is None:
+                return f"❌ Unknown frequency. Use one of {', '.join(FREQUENCIES)}"
+            season_length = int(season_length) if season_length else {'D': 7, 'W': 52, 'M': 12, 'Q': 4, 'Y': 1}[frequency]
+            interval = 0.9 if interval is None else float(interval)
+
+            value_column = value_column or 'SALES'
+            if value_column not in df.columns:
+                return f"❌ Error forecasting: column '{value_column}' not found"
+            date_column = date_column or _detect_date_column(df)
+            if date_column is None:
+                return "❌ Error forecasting: no date column found; pass date_column"
+            if group_columns is None:
+                group_columns = [c for c in DEFAULT_HIERARCHY if c in df.columns]
+            missing = [c for c in group_columns if c not in df.columns]
+            if missing:
+                return f"❌ Error forecasting: group columns not found: {missing}"
+
+            nodes, Y, periods = build_hierarchy(df, date_column, value_column, list(group_columns), frequency)
+
+            if method in HEAVY_METHODS:
+                mean, lower, upper, chosen = self._forecast_heavy(Y, horizon, season_length, interval)
+            else:
+                mean, variance, chosen = forecast_fast(Y, horizon, season_length, method)
+                z = NormalDist().inv_cdf((1 + interval) / 2)
+                spread = z * np.sqrt(variance)
+                lower, upper = mean - spread, mean + spread
+
+            # Sales-like series cannot go negative
+            if (Y >= 0).all():
+                mean, lower, upper = np.maximum(mean, 0), np.maximum(lower, 0), np.maximum(upper, 0)
+
+            future = pd.period_range(periods[-1] + 1, periods=horizon, freq=frequency).astype(str)
+            forecasts = _to_long(nodes, future, mean, lower, upper, chosen)
+            forecasts = _add_bottom_up(forecasts, list(group_columns))
+
+            os.makedirs('results', exist_ok=True)
+            output_path = 'results/forecasts.csv'
+            forecasts.to_csv(output_path, index=False)
+            session.register_dataset('forecasts', forecasts, source=self.name)
+            elapsed = time.perf_counter() - started_at
+
+            return self._summarize(forecasts, nodes, periods, horizon, interval, chosen, elapsed, output_path)
+
+        except ImportError as e:
+            return f"❌ Error forecasting: {str(e)}. Install statsmodels for holt_winters, or use method='auto'"
+        except Exception as e:
+            return f"❌ Error forecasting: {str(e)}"
+
+    def _forecast_heavy(self, Y, horizon: int, season_length: int, interval: float):
+        """Fit statsmodels models per series on a process pool; SES fills in where a fit fails"""
+        np = load("numpy")
+        load("statsmodels.tsa.holtwinters")
+        started = _started(Y)
+        series = [Y[i, started[i].argmax():] if started[i].any() else Y[i, -1:] for i in range(len(Y))]
+        chunks = [series[i:i + HEAVY_CHUNK_SIZE] for i in range(0, len(series), HEAVY_CHUNK_SIZE)]
+        workers = min(len(chunks), os.cpu_count() or 1)
+        if workers <= 1:
+            fitted = [r for chunk in chunks for r in _fit_holt_winters_chunk(chunk, horizon, season_length, interval)]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_fit_holt_winters_chunk, chunk, horizon, season_length, interval) for chunk in chunks]
+                fitted = [r for future in futures for r in future.result()]
+
+        mean, variance, chosen = forecast_fast(Y, horizon, season_length, 'ses')
+        spread = NormalDist().inv_cdf((1 + interval) / 2) * np.sqrt(variance)
+        lower, upper = mean - spread, mean + spread
+        chosen = chosen.astype(object)
+        for i, result in enumerate(fitted):
+            if result is not None:
+                mean[i], lower[i], upper[i] = result
+                chosen[i] = 'holt_winters'
+        return mean, lower, upper, chosen
+
+    def _summarize(self, forecasts, nodes, periods, horizon, interval, chosen, elapsed, output_path) -> str:
+        pd = load("pandas")
+        methods = pd.Series(chosen).value_counts()
+        lines = [
+            f"✅ Forecast {len(nodes)} series for {horizon} periods in {elapsed:.2f}s "
+            f"(history {periods[0]} to {periods[-1]}, {len(periods)} periods, {interval:.0%} intervals)",
+            "Series per level: " + ", ".join(f"{level}: {count}" for level, count in nodes['level'].value_counts(sort=False).items()),
+            "Methods chosen: " + ", ".join(f"{name}: {count}" for name, count in methods.items()),
+            f"Saved to {output_path} (dataset 'forecasts')",
+        ]
+        total = forecasts[forecasts['level'] == 'Total']
+        lines.append("\nTotal:")
+        lines.append(total[['period', 'forecast', 'lower', 'upper', 'method', 'bottom_up']].round(2).to_string(index=False))
+        top_levels = [level for level in nodes['level'].unique() if level != 'Total']
+        if top_levels:
+            first = forecasts[forecasts['level'] == top_levels[0]]
+            key = top_levels[0].split(' > ')[0]
+            totals = first.groupby(key)[['forecast', 'bottom_up']].sum().sort_values('forecast', ascending=False)
+            lines.append(f"\nBy {key} (sum over the horizon):")
+            lines.append(totals.head(10).round(2).to_string())
+        return "\n".join(lines)
+
+
+def _detect_date_column(df):
+    pd = load("pandas")
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            return col
+    for col in df.columns:
+        if 'date' in str(col).lower():
+            return col
+    return None
+
+
+def build_hierarchy(df, date_column: str, value_column: str, group_columns: list, frequency: str):
+    """Aggregate to one row per node of the hierarchy and one column per period.
+
+    The bottom level is grouped once; every level above it is summed from the
+    bottom matrix. Returns (nodes, values, periods) where nodes has a 'level'
+    column and one column per group key ('(all)' on aggregated levels).
+    """
+    pd = load("pandas")
+    np = load("numpy")
+    dates = pd.to_datetime(df[date_column], errors='coerce')
+    valid = dates.notna()
+    period = dates[valid].dt.to_period(frequency).rename('__period')
+    periods = pd.period_range(period.min(), period.max(), freq=frequency)
+    frame = df.loc[valid, group_columns + [value_column]]
+    values = pd.to_numeric(frame[value_column], errors='coerce').fillna(0)
+
+    keys = [frame[c].astype(str) for c in group_columns] + [period]
+    bottom = values.groupby(keys, observed=True, sort=True).sum().unstack('__period', fill_value=0)
+    bottom = bottom.reindex(columns=periods, fill_value=0)
+
+    node_frames, blocks = [], []
+    for depth in range(len(group_columns) + 1):
+        if depth == 0:
+            block = bottom.sum(axis=0).to_frame().T
+            index = pd.DataFrame({c: ['(all)'] for c in group_columns})
+            level = 'Total'
+        elif depth == len(group_columns):
+            block = bottom
+            index = bottom.index.to_frame(index=False)
+            level = ' > '.join(group_columns)
+        else:
+            block = bottom.groupby(level=list(range(depth)), sort=True).sum()
+            index = block.index.to_frame(index=False)
+            for c in group_columns[depth:]:
+                index[c] = '(all)'
+            level = ' > '.join(group_columns[:depth])
+        index.insert(0, 'level', level)
+        node_frames.append(index[['level'] + group_columns])
+        blocks.append(block.to_numpy(dtype=float))
+
+    nodes = pd.concat(node_frames, ignore_index=True)
+    return nodes, np.vstack(blocks), periods
+
+
+def _to_long(nodes, future, mean, lower, upper, chosen):
+    """One row per node and forecast period"""
+    np = load("numpy")
+    horizon = len(future)
+    long = nodes.loc[nodes.index.repeat(horizon)].reset_index(drop=True)
+    long['period'] = np.tile(np.asarray(future), len(nodes))
+    long['forecast'] = mean.ravel().round(2)
+    long['lower'] = lower.ravel().round(2)
+    long['upper'] = upper.ravel().round(2)
+    long['method'] = np.repeat(np.asarray(chosen), horizon)
+    return long
+
+
+def _add_bottom_up(forecasts, group_columns: list):
+    """Sum of the bottom-level forecasts under each node, to check coherence of the base forecasts"""
+    pd = load("pandas")
+    if not group_columns:
+        forecasts['bottom_up'] = forecasts['forecast']
+        return forecasts
+    bottom = forecasts[forecasts['level'] == ' > '.join(group_columns)]
+    pieces = []
+    for depth in range(len(group_columns) + 1):
+        keys = group_columns[:depth] + ['period']
+        sums = bottom.groupby(keys, sort=False)['forecast'].sum().rename('bottom_up').reset_index()
+        level = 'Total' if depth == 0 else ' > '.join(group_columns[:depth])
+        part = forecasts[forecasts['level'] == level].merge(sums, on=keys, how='left')
+        pieces.append(part)
+    return pd.concat(pieces, ignore_index=True)
@@ -0,0 +1,482 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import time
+from tools.lazy_imports import load
+from tools.session import session
+
+STATE_DIR = os.getenv("INSIGHT_INCREMENTAL_DIR", os.path.join(".cache", "incremental"))
+# Set INSIGHT_INCREMENTAL=0 to always parse CSV files from scratch
+ENABLED = os.getenv("INSIGHT_INCREMENTAL", "1") != "0"
+
+# Population stability index above which a feature counts as drifted (0.1-0.2 is the usual "moderate" band)
+PSI_THRESHOLD = 0.2
+PSI_BINS = 10
+# Bins expected to hold fewer new values than this are pooled, so a short tail cannot fake drift with empty bins
+PSI_MIN_EXPECTED = 5
+# Categories kept per feature in a baseline distribution; the rest are pooled as other
+PSI_MAX_CATEGORIES = 20
+HASH_BLOCK_BYTES = 1024 * 1024
+
+# State of every CSV loaded in this process, keyed by dataset name
+_states = {}
+session.on_clear(_states.clear)
+
+
+def column_stats(df) -> dict:
+    """count/sum/sumsq/min/max of every numeric column; mergeable across appends"""
+    pd = load("pandas")
+    stats = {}
+    for col in df.columns:
+        series = df[col]
+        if not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+            continue
+        values = series.dropna().to_numpy(dtype=float)
+        stats[str(col)] = {
+            'count': int(len(values)),
+            'sum': float(values.sum()),
+            'sumsq': float((values ** 2).sum()),
+            'min': float(values.min()) if len(values) else None,
+            'max': float(values.max()) if len(values) else None,
+        }
+    return stats
+
+
+def merge_stats(current: dict, delta: dict) -> dict:
+    merged = {col: dict(values) for col, values in current.items()}
+    for col, d in delta.items():
+        c = merged.get(col)
+        if c is None:
+            merged[col] = dict(d)
+            continue
+        c['count'] += d['count']
+        c['sum'] += d['sum']
+        c['sumsq'] += d['sumsq']
+        c['min'] = min(v for v in (c['min'], d['min']) if v is not None) if d['count'] or c['count'] else None
+        c['max'] = max(v for v in (c['max'], d['max']) if v is not None) if d['count'] or c['count'] else None
+    return merged
+
+
+def stats_moments(stats: dict) -> tuple:
+    """(mean, std) from merged column stats"""
+    count = stats['count']
+    if not count:
+        return None, None
+    mean = stats['sum'] / count
+    variance = max(stats['sumsq'] / count - mean ** 2, 0.0)
+    return mean, variance ** 0.5
+
+
+def referenced_columns(code: str, columns) -> list:
+    """DataFrame columns a piece of code mentions, as string literals or attributes"""
+    names = set(re.findall(r"""['"]([^'"\n]+)['"]""", code)) | set(re.findall(r"\.(\w+)", code))
+    return [col for col in columns if str(col) in names]
+
+
+def distribution(series, edges=None, categories=None) -> dict:
+    """Binned share of values: quantile bins for numbers, top categories otherwise"""
+    pd = load("pandas")
+    np = load("numpy")
+    series = series.dropna()
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series) and categories is None:
+        values = series.to_numpy(dtype=float)
+        if edges is None:
+            edges = np.unique(np.quantile(values, np.linspace(0, 1, PSI_BINS + 1))).tolist() if len(values) else []
+        # Inner edges only, so values outside the baseline range fall into the outer bins
+        bins = np.searchsorted(np.asarray(edges[1:-1], dtype=float), values, side='right')
+        counts = np.bincount(bins, minlength=max(len(edges) - 1, 1))
+        return {'edges': list(edges), 'shares': (counts / max(len(values), 1)).tolist(), 'count': int(len(values))}
+    values = series.astype(str)
+    if categories is None:
+        categories = values.value_counts().index[:PSI_MAX_CATEGORIES].tolist()
+    counts = values.value_counts()
+    shares = [float(counts.get(c, 0)) / max(len(values), 1) for c in categories]
+    return {'categories': list(categories), 'shares': shares + [max(1.0 - sum(shares), 0.0)], 'count': int(len(values))}
+
+
+def psi(expected: list, actual: list, count: int = None):
+    """Population stability index of actual against expected shares.
+
+    With count (the number of actual values), bins expected to hold fewer than
+    PSI_MIN_EXPECTED of them are pooled into one, and that pool into the
+    smallest other bin if it is still too small. Returns None when fewer than
+    two bins are left: too few values to compare.
+    """
+    np = load("numpy")
+    e = np.asarray(expected, dtype=float)
+    a = np.asarray(actual, dtype=float)
+    if count is not None:
+        small = e * count < PSI_MIN_EXPECTED
+        if small.any():
+            e = np.append(e[~small], e[small].sum())
+            a = np.append(a[~small], a[small].sum())
+            if e[-1] * count < PSI_MIN_EXPECTED and len(e) > 1:
+                smallest = np.argmin(e[:-1])
+                e[smallest] += e[-1]
+                a[smallest] += a[-1]
+                e, a = e[:-1], a[:-1]
+        if len(e) < 2:
+            return None
+    e = np.clip(e, 1e-4, None)
+    a = np.clip(a, 1e-4, None)
+    return float(((a - e) * np.log(a / e)).sum())
+
+
+def feature_drift(baseline: dict, df) -> dict:
+    """PSI of every baseline feature between its recorded distribution and df;
+    None for features with too few values in df to compare"""
+    drift = {}
+    for col, expected in baseline.items():
+        if col not in df.columns or not len(df):
+            continue
+        actual = distribution(df[col], edges=expected.get('edges'), categories=expected.get('categories'))
+        drift[col] = psi(expected['shares'], actual['shares'], actual['count'])
+    return drift
+
+
+class AppendState:
+    """What was loaded from one CSV file: a manifest, the parsed and prepared parts, the cube and the recorded steps.
+
+    The manifest keeps the file size and the SHA-256 of its content at that
+    size, so a later version whose first `size` bytes hash the same is an
+    append-only extension and only the bytes after it need parsing.
+    """
+
+    def __init__(self, file_path: str, variant: str = ""):
+        self.file_path = os.path.abspath(file_path)
+        key = hashlib.sha1(f"{self.file_path}|{variant}".encode()).hexdigest()[:16]
+        self.directory = os.path.join(STATE_DIR, key)
+        self.manifest = self._read_json('manifest.json', {})
+        self.steps = self._read_json('steps.json', [])
+        self.status = None
+        self.tail_rows = 0
+        self.previous = {}
+        # Rows prepared at the last load, when they were reused, and the raw rows parsed since
+        self.prepared = None
+        self.tail = None
+        self._digest = None
+
+    def _read_json(self, name: str, default):
+        try:
+            with open(os.path.join(self.directory, name)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return default
+
+    def _write_json(self, name: str, value):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(value, f, indent=2, default=str)
+        os.replace(f"{path}.tmp", path)
+
+    def detect(self) -> str:
+        """'new', 'unchanged', 'appended' or 'rewritten', hashing the file once"""
+        size = os.path.getsize(self.file_path)
+        known = self.manifest.get('size')
+        hasher = hashlib.sha256()
+        status = 'new' if known is None else 'rewritten'
+        with open(self.file_path, 'rb') as f:
+            if known is not None and known <= size:
+                remaining = known
+                while remaining:
+                    block = f.read(min(HASH_BLOCK_BYTES, remaining))
+                    if not block:
+                        break
+                    hasher.update(block)
+                    remaining -= len(block)
+                if hasher.hexdigest() == self.manifest.get('sha256'):
+                    status = 'unchanged' if known == size else 'appended'
+                # An unterminated last line may have been continued rather than followed by new lines
+                if status == 'appended' and not self.manifest.get('ends_with_newline') and f.read(1) not in (b'\n', b'\r'):
+                    status = 'rewritten'
+                f.seek(known)
+            if status in ('new', 'rewritten'):
+                hasher = hashlib.sha256()
+                f.seek(0)
+            for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b''):
+                hasher.update(block)
+        self._digest = hasher.hexdigest()
+        self.status = status
+        return status
+
+    def read_tail(self, parse):
+        """Parse only the bytes appended since the last load, under the file's header line"""
+        with open(self.file_path, 'rb') as f:
+            header = f.readline().rstrip(b'\r\n')
+            f.seek(self.manifest['size'])
+            tail = f.read().lstrip(b'\r\n')
+        os.makedirs(self.directory, exist_ok=True)
+        tail_path = os.path.join(self.directory, f"tail.{os.getpid()}.csv")
+        try:
+            with open(tail_path, 'wb') as f:
+                f.write(header + b'\n' + tail)
+            return parse(tail_path), len(tail)
+        finally:
+            os.remove(tail_path)
+
+    def load_parts(self):
+        parts = [self._read_part(name) for name in self.manifest.get('parts', [])]
+        if not parts:
+            raise FileNotFoundError(f"no parsed parts in {self.directory}")
+        return _concat(parts)
+
+    def load_prepared(self):
+        """Rows as prepared at the last load, or None if they were not all kept"""
+        names = self.manifest.get('prepared_parts')
+        if not names or 'quality' not in self.manifest:
+            return None
+        try:
+            df = _concat([self._read_part(name) for name in names])
+        except Exception as e:
+            print(f"   Prepared rows unreadable ({e}); preparing every row again")
+            return None
+        return df if len(df) == self.manifest.get('prepared_rows') else None
+
+    def _read_part(self, name: str):
+        path = os.path.join(self.directory, name)
+        if name.endswith('.parquet'):
+            return load("pandas").read_parquet(path)
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def add_part(self, df, kind: str = 'parts'):
+        """Store parsed (or, with kind='prepared_parts', prepared) rows as Parquet
+        (pickle where Arrow is unavailable or rejects a column)"""
+        os.makedirs(self.directory, exist_ok=True)
+        stem = f"{'prepared' if kind == 'prepared_parts' else 'part'}-{len(self.manifest.get(kind, [])):05d}"
+        try:
+            load("pyarrow")
+            df.to_parquet(os.path.join(self.directory, f"{stem}.parquet"), index=False)
+            name = f"{stem}.parquet"
+        except Exception:
+            name = f"{stem}.pkl"
+            with open(os.path.join(self.directory, name), 'wb') as f:
+                pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.manifest.setdefault(kind, []).append(name)
+
+    def _remove(self, names):
+        for name in names:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def reset(self):
+        """Forget everything parsed before; recorded steps are kept"""
+        self._remove(self.manifest.get('parts', []) + self.manifest.get('prepared_parts', []) + ['cube.pkl'])
+        self.manifest = {}
+
+    def commit_parse(self, raw_tail, encoding: str):
+        """Record the parsed file version: its size, hash and running column statistics"""
+        with open(self.file_path, 'rb') as f:
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(size - 1, 0))
+            last = f.read(1)
+        self.previous = {key: self.manifest.get(key) for key in ('rows', 'prepared_rows', 'stats', 'size')}
+        self.tail_rows = len(raw_tail)
+        self.manifest.update({
+            'file': self.file_path,
+            'size': size,
+            'sha256': self._digest,
+            'ends_with_newline': last in (b'\n', b'\r'),
+            'encoding': encoding,
+            'rows': (self.manifest.get('rows') or 0) + len(raw_tail),
+            'stats': merge_stats(self.manifest.get('stats') or {}, column_stats(raw_tail)),
+        })
+        if self.status in ('new', 'rewritten'):
+            # Appended rows are parsed to these types without the earlier rows at hand
+            self.manifest['raw_dtypes'] = {str(col): str(dtype) for col, dtype in raw_tail.dtypes.items()}
+        if self.status in ('new', 'rewritten', 'appended'):
+            self.manifest.setdefault('history', []).append(
+                {'at': time.strftime('%Y-%m-%d %H:%M:%S'), 'status': self.status, 'rows': len(raw_tail)})
+        self._write_json('manifest.json', self.manifest)
+
+    def load_cube(self):
+        """Cube of the previously prepared rows, if it matches them"""
+        if self.status not in ('appended', 'unchanged'):
+            return None
+        try:
+            with open(os.path.join(self.directory, 'cube.pkl'), 'rb') as f:
+                cube = pickle.load(f)
+        except Exception:
+            return None
+        return cube if cube.row_count == self.previous.get('prepared_rows') else None
+
+    def commit_prepared(self, dataset_name: str, prepared_rows: int, cube=None, fill_values: dict = None,
+                        new_rows=None, quality: dict = None):
+        """Persist the state that matches the registered dataset and remember it for record_step.
+
+        new_rows are the rows prepared by this load: appended to the kept
+        prepared rows when those were reused, replacing them otherwise.
+        """
+        self.manifest['dataset'] = dataset_name
+        self.manifest['prepared_rows'] = prepared_rows
+        if new_rows is not None:
+            if self.prepared is None:
+                self._remove(self.manifest.pop('prepared_parts', []))
+            if len(new_rows) or not self.manifest.get('prepared_parts'):
+                self.add_part(new_rows, 'prepared_parts')
+        if quality is not None:
+            self.manifest['quality'] = quality
+        if fill_values is not None:
+            self.manifest['fill_values'] = {col: _json_value(v) for col, v in fill_values.items()}
+        if cube is not None:
+            path = os.path.join(self.directory, 'cube.pkl')
+            with open(f"{path}.tmp", 'wb') as f:
+                pickle.dump(cube, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(f"{path}.tmp", path)
+        self._write_json('manifest.json', self.manifest)
+        _states[dataset_name] = self
+
+    def record(self, step: dict):
+        """Keep one step per code; a newer step writing the same outputs replaces the older one"""
+        outputs = set(step.get('outputs') or [])
+        self.steps = [s for s in self.steps if s['code_sha1'] != step['code_sha1']
+                      and not (outputs and outputs & set(s.get('outputs') or []))]
+        self.steps.append(step)
+        self._write_json('steps.json', self.steps)
+
+    def save_steps(self):
+        self._write_json('steps.json', self.steps)
+
+
+def _json_value(value):
+    """Fill values as stored in the manifest (numpy scalars and timestamps are not JSON)"""
+    if hasattr(value, 'item'):
+        value = value.item()
+    return value if isinstance(value, (int, float, str, bool)) or value is None else str(value)
+
+
+def _concat(parts):
+    """Concatenate stored parts; categoricals get the union of their categories instead of becoming object"""
+    pd = load("pandas")
+    if len(parts) == 1:
+        return parts[0]
+    for col in parts[0].columns:
+        if all(isinstance(part[col].dtype, pd.CategoricalDtype) for part in parts if col in part.columns):
+            categories = pd.api.types.union_categoricals([part[col] for part in parts if col in part.columns]).categories
+            for part in parts:
+                if col in part.columns:
+                    part[col] = part[col].cat.set_categories(categories)
+    return pd.concat(parts, ignore_index=True)
+
+
+def _align(tail, dtypes: dict):
+    """Give tail columns the dtype ({column: dtype}) the earlier rows were parsed with, where no value changes"""
+    pd = load("pandas")
+    for col in tail.columns:
+        try:
+            dtype = pd.api.types.pandas_dtype(dtypes[col])
+        except (KeyError, TypeError):
+            continue
+        if tail[col].dtype == dtype:
+            continue
+        if tail[col].isna().all():
+            # Nothing to infer a type from: keep the column's type rather than widening it to float/object
+            try:
+                tail[col] = pd.Series(None, index=tail.index, dtype=dtype)
+            except (TypeError, ValueError):
+                pass
+        elif pd.api.types.is_string_dtype(dtype) and not pd.api.types.is_string_dtype(tail[col]):
+            # e.g. codes that happen to be all digits in the new rows
+            tail[col] = tail[col].astype(str).where(tail[col].notna(), None).astype(dtype)
+    return tail
+
+
+def load_csv(file_path: str, parse, parse_tail, variant: str = ""):
+    """Load a CSV through its append state: parse everything once, later only the appended tail.
+
+    parse(path) -> (DataFrame, encoding) parses a whole file; parse_tail(path,
+    encoding) parses the tail file with the encoding found the first time.
+    Returns (DataFrame of every row, AppendState). When the rows prepared at
+    the last load were kept, the DataFrame is None instead: they are in
+    state.prepared and the newly parsed rows in state.tail.
+    """
+    pd = load("pandas")
+    state = AppendState(file_path, variant)
+    status = state.detect()
+    previous = None
+    if status in ('appended', 'unchanged'):
+        # The prepared rows make the parsed ones unnecessary, as long as new rows can be typed without them
+        state.prepared = state.load_prepared() if 'raw_dtypes' in state.manifest else None
+        if state.prepared is None:
+            try:
+                previous = state.load_parts()
+            except Exception as e:
+                print(f"   Incremental state unreadable ({e}); parsing the whole file")
+                state.status = status = 'rewritten'
+
+    if status == 'appended':
+        encoding = state.manifest.get('encoding')
+        started = time.perf_counter()
+        try:
+            tail, tail_bytes = state.read_tail(lambda path: parse_tail(path, encoding))
+        except UnicodeDecodeError as e:
+            # The new rows were written with another encoding: detect it again over the whole file
+            print(f"   Appended rows are not valid {encoding} ({e.reason}); parsing the whole file")
+            state.status = status = 'rewritten'
+
+    kept = previous if previous is not None else state.prepared
+    if status == 'unchanged':
+        df, tail = previous, kept.iloc[:0]
+        print(f"   File unchanged since the last load: reused {len(kept)} rows")
+    elif status == 'appended':
+        tail = _align(tail, previous.dtypes.to_dict() if previous is not None else state.manifest['raw_dtypes'])
+        df = pd.concat([previous, tail], ignore_index=True) if previous is not None else None
+        print(f"   Append-only change detected: parsed {len(tail)} new rows ({tail_bytes / 1024:.1f} KB) "
+              f"in {time.perf_counter() - started:.2f}s instead of the whole file; {len(kept)} rows reused")
+    else:
+        if status == 'rewritten':
+            print("   File changed beyond an append since the last load: parsing it from scratch")
+        state.prepared = None
+        state.reset()
+        df, encoding = parse(file_path)
+        tail = df
+    if status in ('new', 'rewritten') and encoding and encoding.lower().startswith('utf-16'):
+        # Byte offsets do not split UTF-16 text into lines; keep nothing
+        state.status = 'unsupported'
+        return df, state
+    if len(tail) or status in ('new', 'rewritten'):
+        state.add_part(tail)
+    state.commit_parse(tail, encoding if status != 'unchanged' else state.manifest.get('encoding'))
+    state.tail = tail
+    return df, state
+
+
+def state_for(df):
+    """AppendState of the dataset this DataFrame is registered as, if it was loaded from a CSV"""
+    name = session.name_of(df) if df is not None else None
+    return _states.get(name) if name is not None else None
+
+
+def record_step(kind: str, code: str, df, outputs=None, models=None):
+    """Remember a plot or model step on an incrementally loaded dataset so a refresh can redo it"""
+    state = state_for(df)
+    if state is None:
+        return
+    try:
+        columns = referenced_columns(code, df.columns)
+        step = {
+            'kind': kind,
+            'code': code,
+            'code_sha1': hashlib.sha1(code.encode()).hexdigest(),
+            'columns': [str(c) for c in columns],
+            'outputs': sorted(outputs or []),
+            'rows': len(df),
+            'recorded_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        if kind == 'model':
+            features = set()
+            for model in (models or {}).values():
+                features |= {str(f) for f in getattr(model, 'feature_names_in_', [])}
+            # Encoded feature names (e.g. PRODUCTLINE_Ships) are not columns: fall back to the code's columns
+            features = [col for col in df.columns if str(col) in features] or columns
+            step['models'] = sorted(models or {})
+            step['baseline'] = {str(col): distribution(df[col]) for col in features}
+        state.record(step)
+    except Exception as e:
+        print(f"   Step not recorded for incremental refresh: {e}")
+
@@ -0,0 +1,126 @@
+from smolagents import Tool
+from tools import incremental
+from tools.file_handler import FileHandlerTool
+from tools.visualization import VisualizationTool
+from tools.ml_model import MLModelTool
+
+# Columns whose statistics are listed in the refresh summary
+MAX_REPORTED_COLUMNS = 12
+
+
+class IncrementalRefreshTool(Tool):
+    name = "incremental_refresh"
+    description = "Refresh an earlier analysis after rows were appended to its CSV file: only the new tail is parsed, statistics and the aggregate cube are updated incrementally, charts drawn before the append are redrawn with the new rows, and models are retrained only where the new rows drift from their training data (PSI above the threshold)."
+    inputs = {
+        "file_path": {
+            "type": "string",
+            "description": "Path to the CSV file that was analyzed before and has grown since"
+        },
+        "psi_threshold": {
+            "type": "number",
+            "description": "Population stability index of a model feature above which the model is retrained (default 0.2)",
+            "nullable": True
+        },
+        "compact": {
+            "type": "boolean",
+            "description": "Same compact setting as the original file_handler call (default false)",
+            "nullable": True
+        }
+    }
+    output_type = "string"
+
+    def forward(self, file_path: str, psi_threshold: float = None, compact: bool = False) -> str:
+        """Reload the file incrementally, then redo the affected plot and model steps"""
+        try:
+            threshold = incremental.PSI_THRESHOLD if psi_threshold is None else float(psi_threshold)
+            df = FileHandlerTool().forward(file_path, compact=compact)
+            state = incremental.state_for(df)
+            if state is None:
+                return f"⚠️ {file_path} was loaded in full: incremental loading only applies to CSV files (and is off when INSIGHT_INCREMENTAL=0)"
+
+            plots = [s for s in state.steps if s['kind'] == 'plot']
+            models = [s for s in state.steps if s['kind'] == 'model']
+            if state.status in ('new', 'rewritten', 'unsupported'):
+                reason = {'new': "first load of this file",
+                          'rewritten': "the file changed beyond appended rows",
+                          'unsupported': "its encoding cannot be split at byte offsets"}[state.status]
+                if state.status == 'rewritten' and state.steps:
+                    follow_up = (f" {len(plots)} charts and {len(models)} model steps recorded earlier were not re-run; "
+                                 "re-run the analysis to bring them up to date.")
+                else:
+                    follow_up = " Charts and models created from now on are refreshed incrementally after the next append."
+                return f"✅ Loaded {file_path} from scratch ({len(df)} rows): {reason}.{follow_up}"
+            # Each step is compared with the rows it last saw: the grown file may already have been loaded
+            # (tail_rows is then 0) and steps redone since an earlier append have seen more rows than others
+            stale = [s for s in state.steps if max(s['rows'], s.get('checked_rows', 0)) < len(df)]
+            if not stale:
+                return (f"✅ No rows appended to {file_path} since the recorded steps ran ({len(df)} rows): statistics, "
+                        f"aggregates, {len(plots)} charts and {len(models)} model steps are current")
+
+            if state.tail_rows:
+                lines = [f"✅ {state.tail_rows} rows appended to {file_path} "
+                         f"({state.previous.get('rows')} -> {state.manifest['rows']} rows); only the new rows were parsed"]
+                lines += self._stat_changes(state.previous.get('stats') or {}, state.manifest.get('stats') or {})
+            else:
+                lines = [f"✅ {file_path} was already loaded with its appended rows ({len(df)} rows); "
+                         f"{len(stale)} recorded steps predate some of them"]
+
+            lines.append("\nCharts:")
+            if not plots:
+                lines.append("   none recorded for this file")
+            for step in plots:
+                outputs = ", ".join(step['outputs']) or "no files"
+                if step not in stale:
+                    lines.append(f"   kept {outputs} (already drawn from all {len(df)} rows)")
+                    continue
+                result = VisualizationTool().forward(step['code'], df, use_cache=False)
+                status = "redrew" if not result.startswith("❌") else f"failed to redraw ({result})"
+                lines.append(f"   {status} {outputs}")
+
+            lines.append(f"\nModels (retrained when a feature's PSI on the rows added since training exceeds {threshold}):")
+            if not models:
+                lines.append("   none recorded for this file")
+            for step in models:
+                names = ", ".join(step.get('models') or []) or "model step"
+                if step not in stale:
+                    lines.append(f"   kept {names} (no rows added since the last check)")
+                    continue
+                # All rows since training, so drift that builds up over several small appends is still seen
+                new_rows = df.iloc[step['rows']:]
+                drift = incremental.feature_drift(step.get('baseline') or {}, new_rows)
+                comparable = {feature: value for feature, value in drift.items() if value is not None}
+                if comparable:
+                    feature, worst = max(comparable.items(), key=lambda item: item[1])
+                    detail = f"max PSI {worst:.3f} on {feature}, {len(new_rows)} rows since training"
+                elif drift:
+                    worst, detail = 0.0, f"only {len(new_rows)} rows since training, too few to compare"
+                else:
+                    worst, detail = float('inf'), "no baseline features to compare"
+                if worst <= threshold:
+                    if comparable:
+                        step['checked_rows'] = len(df)
+                    lines.append(f"   kept {names} ({detail})")
+                    continue
+                result = MLModelTool().forward(step['code'], df, use_cache=False)
+                status = "retrained" if not result.startswith("❌") else f"failed to retrain ({result})"
+                lines.append(f"   {status} {names} ({detail})")
+            state.save_steps()
+            return "\n".join(lines)
+
+        except Exception as e:
+            return f"❌ Error refreshing analysis: {str(e)}"
+
+    def _stat_changes(self, before: dict, after: dict) -> list:
+        """Mean and range of numeric columns before and after the append, from the running statistics"""
+        lines = []
+        for col in list(after)[:MAX_REPORTED_COLUMNS]:
+            new_mean, new_std = incremental.stats_moments(after[col])
+            if new_mean is None:
+                continue
+            old_mean, _ = incremental.stats_moments(before[col]) if col in before else (None, None)
+            shift = f"{old_mean:,.2f} -> {new_mean:,.2f}" if old_mean is not None else f"{new_mean:,.2f}"
+            lines.append(f"   {col}: mean {shift}, std {new_std:,.2f}, "
+                         f"range {after[col]['min']:,.2f} to {after[col]['max']:,.2f}")
+        if lines:
+            lines.insert(0, "\nColumn statistics (as loaded, before imputation):")
+        return lines
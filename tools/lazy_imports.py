@@ -0,0 +1,71 @@
+import importlib
+import sys
+import threading
+import time
+
+# Heavy libraries the tools need, in the order they are worth pre-loading
+WARM_UP_MODULES = [
+    "numpy",
+    "pandas",
+    "chardet",
+    "matplotlib.pyplot",
+    "seaborn",
+    "scipy.stats",
+    "sklearn.ensemble",
+]
+
+_load_times = {}
+_lock = threading.Lock()
+
+
+def load(module_name: str):
+    """Import a module on first use and record how long the import took"""
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    with _lock:
+        _load_times.setdefault(module_name, time.perf_counter() - started)
+    return module
+
+
+def warm_up(module_names=None, background: bool = True):
+    """Pre-load heavy libraries, by default on a daemon thread.
+
+    Missing optional libraries are skipped; the tool that needs them reports
+    the ImportError when it is actually called.
+    """
+    module_names = list(module_names or WARM_UP_MODULES)
+
+    def _run():
+        for module_name in module_names:
+            try:
+                load(module_name)
+            except Exception:
+                pass
+
+    if not background:
+        _run()
+        return None
+
+    thread = threading.Thread(target=_run, name="insight-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def load_times() -> dict:
+    """Seconds spent importing each module loaded through this helper"""
+    with _lock:
+        return dict(_load_times)
+
+
+def format_report() -> str:
+    """Human-readable import-time report, slowest first"""
+    times = load_times()
+    if not times:
+        return "No deferred imports recorded"
+    lines = [f"   {name:<20} {seconds * 1000:8.1f} ms" for name, seconds in sorted(times.items(), key=lambda x: -x[1])]
+    lines.append(f"   {'total':<20} {sum(times.values()) * 1000:8.1f} ms")
+    return "\n".join(lines)
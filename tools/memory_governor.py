@@ -0,0 +1,261 @@
+import os
+import pickle
+import re
+import sys
+import threading
+from tools.lazy_imports import load
+from tools.session import session, SpilledDataset
+
+MEMORY_BUDGET_MB = int(os.getenv("INSIGHT_MEMORY_BUDGET_MB", "2048"))
+SPILL_DIR = os.getenv("INSIGHT_SPILL_DIR", os.path.join(".cache", "spill"))
+
+# Fraction of the budget at which a warning is printed, and the level enforce() brings usage back to
+WARN_FRACTION = 0.85
+TARGET_FRACTION = 0.75
+
+
+def _refcount(mapping: dict, key) -> int:
+    return sys.getrefcount(mapping[key])
+
+
+# Count seen for a value held only by its dict; the exact number differs between Python versions
+_REGISTRY_ONLY_REFCOUNT = _refcount({'probe': object()}, 'probe')
+
+
+def dataframe_bytes(df) -> int:
+    return int(df.memory_usage(deep=True).sum())
+
+
+def object_bytes(value) -> int:
+    """Best-effort size of an in-memory object (DataFrame, array, model, ...)"""
+    pd = sys.modules.get("pandas")
+    np = sys.modules.get("numpy")
+    if pd is not None and isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(deep=True).sum()) if isinstance(value, pd.DataFrame) else int(value.memory_usage(deep=True))
+    if np is not None and isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+def figure_bytes() -> list:
+    """(figure number, estimated bytes) for every open matplotlib figure"""
+    plt = sys.modules.get("matplotlib.pyplot")
+    if plt is None:
+        return []
+    sizes = []
+    # Read the figure managers directly: plt.figure(number) would change the current figure
+    for manager in sorted(plt._pylab_helpers.Gcf.get_all_fig_managers(), key=lambda m: m.num):
+        number, figure = manager.num, manager.canvas.figure
+        width, height = figure.get_size_inches() * figure.dpi
+        # RGBA raster buffer plus a rough allowance for the artist tree
+        sizes.append((number, int(width * height * 4) + 64 * 1024 * max(1, len(figure.axes))))
+    return sizes
+
+
+def process_rss_bytes():
+    """Current resident set size of this process, if the platform exposes it"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        psutil = load("psutil")
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return None
+
+
+class MemoryGovernor:
+    """Tracks the memory held by a session against a budget and relieves pressure.
+
+    Accounted objects are the registered datasets, models and cubes, open
+    matplotlib figures, registered caches and any watched namespaces (e.g. the
+    agent's executor variables, where copies like df_clean and feature matrices
+    live). Under pressure, caches are evicted first, then cold datasets that
+    nothing else references are spilled to memory-mapped Arrow files.
+    """
+
+    def __init__(self, budget_bytes: int = None, spill_dir: str = None):
+        self.budget_bytes = budget_bytes or MEMORY_BUDGET_MB * 1024 * 1024
+        self.spill_dir = spill_dir or SPILL_DIR
+        self._caches = {}
+        self._namespaces = {}
+        self._sizes = {}
+        self._lock = threading.RLock()
+
+    def register_cache(self, name: str, size_fn, evict_fn, owner: str = None):
+        """Account a cache by its size function; evict_fn() empties it under pressure"""
+        with self._lock:
+            self._caches[name] = (size_fn, evict_fn, owner or name)
+
+    def watch_namespace(self, name: str, namespace: dict, owner: str = None):
+        """Account DataFrames and arrays held in a namespace (read-only; never spilled)"""
+        with self._lock:
+            self._namespaces[name] = (namespace, owner or name)
+
+    def reset(self):
+        """Empty every registered cache and forget the measured sizes (run by session.clear())"""
+        with self._lock:
+            self._sizes.clear()
+            for _, evict_fn, _ in self._caches.values():
+                evict_fn()
+
+    def _cached_size(self, name, version, value, size_fn) -> int:
+        """Deep sizes scan string columns or pickle whole models, so they are cached per (name, version, id)"""
+        key = (name, version, id(value))
+        if key not in self._sizes:
+            self._sizes = {k: v for k, v in self._sizes.items() if k[0] != name}
+            self._sizes[key] = size_fn(value)
+        return self._sizes[key]
+
+    def _dataset_size(self, name: str, df) -> int:
+        if isinstance(df, SpilledDataset):
+            return 0
+        return self._cached_size(('dataset', name), session.dataset_versions.get(name), df, dataframe_bytes)
+
+    def measure(self) -> list:
+        """One entry per accounted object: kind, name, owner, bytes, state"""
+        entries = []
+        with self._lock:
+            for name, df in list(session.datasets.items()):
+                owner = session.metadata.get(('dataset', name), {}).get('source') or "unknown"
+                if isinstance(df, SpilledDataset):
+                    entries.append({'kind': 'dataset', 'name': name, 'owner': owner, 'bytes': 0,
+                                    'state': f"spilled ({df.nbytes / 1024 ** 2:.1f} MB on disk)"})
+                else:
+                    entries.append({'kind': 'dataset', 'name': name, 'owner': owner,
+                                    'bytes': self._dataset_size(name, df), 'state': 'in memory'})
+            for name, model in list(session.models.items()):
+                metadata = session.metadata.get(('model', name), {})
+                size = self._cached_size(('model', name), metadata.get('registered_at'), model, object_bytes)
+                entries.append({'kind': 'model', 'name': name, 'owner': metadata.get('source') or "unknown",
+                                'bytes': size, 'state': 'in memory'})
+            for name, cube in list(session.cubes.items()):
+                size = sum(dataframe_bytes(table) for table in cube.cuboids.values())
+                size += sum(sketch.means.nbytes * 2 for cells in cube.sketches.values()
+                            for by_measure in cells.values() for sketch in by_measure.values())
+                entries.append({'kind': 'cube', 'name': name, 'owner': 'file_handler', 'bytes': size, 'state': 'in memory'})
+            for number, size in figure_bytes():
+                entries.append({'kind': 'figure', 'name': f"figure {number}", 'owner': 'visualization_tool',
+                                'bytes': size, 'state': 'open'})
+            for name, (size_fn, _, owner) in self._caches.items():
+                entries.append({'kind': 'cache', 'name': name, 'owner': owner, 'bytes': int(size_fn()), 'state': 'in memory'})
+            for ns_name, (namespace, owner) in self._namespaces.items():
+                for key, value in list(namespace.items()):
+                    if key.startswith('_') or not _is_data_object(value):
+                        continue
+                    if any(value is registered for registered in session.datasets.values()):
+                        continue
+                    # Unversioned, so a variable is re-measured when it is rebound or changes shape
+                    size = self._cached_size(('variable', ns_name, key), getattr(value, 'shape', None), value, object_bytes)
+                    entries.append({'kind': 'variable', 'name': f"{ns_name}.{key}", 'owner': owner,
+                                    'bytes': size, 'state': 'in memory'})
+        return entries
+
+    def total_bytes(self, entries=None) -> int:
+        return sum(e['bytes'] for e in (entries if entries is not None else self.measure()))
+
+    def spill(self, name: str) -> int:
+        """Move a registered dataset to a memory-mapped Arrow file; returns bytes released"""
+        pa = load("pyarrow")
+        with session._lock:
+            df = session.datasets.get(name)
+            if df is None or isinstance(df, SpilledDataset):
+                return 0
+            size = self._dataset_size(name, df)
+            os.makedirs(self.spill_dir, exist_ok=True)
+            safe_name = re.sub(r'[^\w.-]+', '_', name)
+            path = os.path.join(self.spill_dir, f"{safe_name}_v{session.dataset_versions.get(name, 1)}.arrow")
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            # Uncompressed IPC so the file can be memory-mapped back without decoding.
+            # Written aside and renamed: a reloaded copy may still map the previous file.
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(tmp_path, path)
+            session.datasets[name] = SpilledDataset(path, df.shape, os.path.getsize(path))
+            return size
+
+    def _spill_candidates(self):
+        """Datasets referenced only by the registry, least recently used first"""
+        candidates = []
+        with session._lock:
+            for name in session.datasets:
+                if isinstance(session.datasets[name], SpilledDataset):
+                    continue
+                if _refcount(session.datasets, name) > _REGISTRY_ONLY_REFCOUNT:
+                    continue  # still used elsewhere: spilling would not free anything
+                candidates.append((session.last_access.get(name, 0), name))
+        return [name for _, name in sorted(candidates)]
+
+    def enforce(self) -> list:
+        """Bring usage under the target if over budget; returns the actions taken"""
+        actions = []
+        with self._lock:
+            entries = self.measure()
+            total = self.total_bytes(entries)
+            if total <= self.budget_bytes:
+                if total > self.budget_bytes * WARN_FRACTION:
+                    print(f"⚠️ Session memory at {total / self.budget_bytes:.0%} of the {self.budget_bytes / 1024 ** 2:.0f} MB budget")
+                return actions
+
+            target = self.budget_bytes * TARGET_FRACTION
+            caches = sorted(((e['bytes'], e['name']) for e in entries if e['kind'] == 'cache'), reverse=True)
+            for size, name in caches:
+                if total <= target:
+                    break
+                self._caches[name][1]()
+                total -= size
+                actions.append(f"evicted cache '{name}' ({size / 1024 ** 2:.1f} MB)")
+
+            for name in self._spill_candidates():
+                if total <= target:
+                    break
+                released = self.spill(name)
+                total -= released
+                actions.append(f"spilled dataset '{name}' ({released / 1024 ** 2:.1f} MB)")
+
+            if total > self.budget_bytes:
+                print(f"⚠️ Session memory still over budget after relief: {total / 1024 ** 2:.0f} MB "
+                      f"of {self.budget_bytes / 1024 ** 2:.0f} MB")
+        for action in actions:
+            print(f"♻️ Memory governor {action}")
+        return actions
+
+    def usage_report(self) -> str:
+        """Usage per tool and the largest objects, against the budget"""
+        entries = self.measure()
+        total = self.total_bytes(entries)
+        lines = [f"Session memory: {total / 1024 ** 2:.1f} MB of {self.budget_bytes / 1024 ** 2:.0f} MB budget "
+                 f"({total / self.budget_bytes:.0%})"]
+        rss = process_rss_bytes()
+        if rss is not None:
+            lines.append(f"Process RSS: {rss / 1024 ** 2:.1f} MB")
+
+        by_owner = {}
+        for e in entries:
+            by_owner[e['owner']] = by_owner.get(e['owner'], 0) + e['bytes']
+        lines.append("\nBy tool:")
+        for owner, size in sorted(by_owner.items(), key=lambda x: -x[1]):
+            lines.append(f"   {owner:<24} {size / 1024 ** 2:10.1f} MB")
+
+        lines.append("\nLargest objects:")
+        for e in sorted(entries, key=lambda x: -x['bytes'])[:15]:
+            lines.append(f"   {e['kind']:<9} {e['name']:<32} {e['bytes'] / 1024 ** 2:10.1f} MB  {e['state']}")
+        return "\n".join(lines)
+
+
+def _is_data_object(value) -> bool:
+    pd = sys.modules.get("pandas")
+    np = sys.modules.get("numpy")
+    return ((pd is not None and isinstance(value, (pd.DataFrame, pd.Series)))
+            or (np is not None and isinstance(value, np.ndarray)))
+
+
+# Process-wide governor shared by all tools
+governor = MemoryGovernor()
+session.on_clear(governor.reset)
@@ -0,0 +1,46 @@
+from smolagents import Tool
+from tools.memory_governor import governor
+from tools.session import session, SpilledDataset
+
+class MemoryMonitorTool(Tool):
+    name = "memory_monitor"
+    description = "Report and manage the session's memory usage: per-tool totals and the largest datasets, models, figures and caches against the memory budget. Use 'enforce' to free memory (evicts caches, spills cold datasets to disk) or 'spill' to move a named dataset to disk; spilled datasets reload transparently when used."
+    inputs = {
+        "action": {
+            "type": "string",
+            "description": "Action to perform (report, enforce, spill)"
+        },
+        "dataset": {
+            "type": "string",
+            "description": "Dataset name to spill (spill action only)",
+            "nullable": True
+        }
+    }
+    output_type = "string"
+
+    def forward(self, action: str, dataset: str = None) -> str:
+        """Report or relieve session memory usage"""
+        try:
+            if action == "report":
+                return governor.usage_report()
+
+            elif action == "enforce":
+                actions = governor.enforce()
+                if not actions:
+                    return "✅ Session memory is within budget, nothing to free\n" + governor.usage_report()
+                return "✅ Memory freed:\n" + "\n".join(f"   - {a}" for a in actions) + "\n\n" + governor.usage_report()
+
+            elif action == "spill":
+                if dataset not in session.datasets:
+                    return f"❌ Unknown dataset '{dataset}'. Loaded datasets: {', '.join(session.datasets) or 'none'}"
+                if isinstance(session.datasets[dataset], SpilledDataset):
+                    return f"⚠️ Dataset '{dataset}' is already spilled to disk"
+                released = governor.spill(dataset)
+                return (f"✅ Dataset '{dataset}' spilled to disk ({released / 1024 ** 2:.1f} MB). "
+                        "Memory is only released once no variable references the DataFrame any more.")
+
+            else:
+                return f"❌ Unknown action: {action}. Use report, enforce or spill"
+
+        except Exception as e:
+            return f"❌ Error managing memory: {str(e)}"
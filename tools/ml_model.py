@@ -1,7 +1,51 @@
 from smolagents import Tool
 import os
-import pandas as pd
-import numpy as np
+from tools.lazy_imports import load
+from tools.session import session
+from tools.memory_governor import governor
+from tools.exec_cache import exec_cache, changed_files, snapshot, REPLAY_NOTE
+from tools.incremental import record_step
+
+# scikit-learn symbols exposed to the executed code, resolved once per process
+_SKLEARN_SYMBOLS = {
+    'sklearn.model_selection': ['train_test_split', 'cross_val_score'],
+    'sklearn.linear_model': ['LinearRegression', 'LogisticRegression'],
+    'sklearn.ensemble': ['RandomForestClassifier', 'RandomForestRegressor'],
+    'sklearn.cluster': ['KMeans'],
+    'sklearn.preprocessing': ['StandardScaler', 'LabelEncoder'],
+    'sklearn.metrics': ['accuracy_score', 'mean_squared_error', 'classification_report'],
+}
+_sklearn_namespace = None
+
+
+def _get_sklearn_namespace() -> dict:
+    """Import the scikit-learn symbols on first use and cache them"""
+    global _sklearn_namespace
+    if _sklearn_namespace is None:
+        namespace = {}
+        for module_name, symbols in _SKLEARN_SYMBOLS.items():
+            module = load(module_name)
+            for symbol in symbols:
+                namespace[symbol] = getattr(module, symbol)
+        _sklearn_namespace = namespace
+    return _sklearn_namespace
+
+
+def _register_fitted_models(exec_globals: dict, provided_names: set, source: str) -> list:
+    """Register estimator instances created by the executed code in the session"""
+    registered = []
+    for name, value in exec_globals.items():
+        if name in provided_names or name.startswith('_') or isinstance(value, type):
+            continue
+        if not (callable(getattr(value, 'fit', None)) and callable(getattr(value, 'predict', None))):
+            continue
+        # scikit-learn marks fitted estimators with trailing-underscore attributes; pipelines keep them in their last step
+        final = value.steps[-1][1] if getattr(value, 'steps', None) else value
+        if not any(attr.endswith('_') and not attr.startswith('_') for attr in getattr(final, '__dict__', {})):
+            continue
+        session.register_model(name, value, source=source)
+        registered.append(name)
+    return registered
 
 class MLModelTool(Tool):
     name = "ml_model_tool"
@@ -15,11 +59,16 @@ class MLModelTool(Tool):
             "type": "object",
             "description": "Pandas DataFrame containing the data for modeling",
             "nullable": True
+        },
+        "use_cache": {
+            "type": "boolean",
+            "description": "Reuse the result of an identical earlier call on the same data (default true); set false for code whose result should differ between runs",
+            "nullable": True
         }
     }
     output_type = "string"
 
-    def forward(self, python_code: str, df=None) -> str:
+    def forward(self, python_code: str, df=None, use_cache: bool = True) -> str:
         """
         Execute the provided Python code for machine learning tasks.
         
@@ -31,6 +80,7 @@ class MLModelTool(Tool):
         - sklearn modules: automatically imported when available
         
         The code can save models, results, or outputs as needed.
+        Identical code on the same data reuses the fitted models while its saved files are unchanged.
         """
         
         # Create directories for ML outputs
@@ -38,44 +88,45 @@ class MLModelTool(Tool):
         os.makedirs('results', exist_ok=True)
         
         try:
+            cache_key = exec_cache.result_key(self.name, python_code, df) if use_cache is not False else None
+            cached = exec_cache.get(cache_key)
+            if cached is not None:
+                return f"{cached['output']}\n{REPLAY_NOTE}"
+
             # Set up the execution environment
             exec_globals = {
                 'df': df,
-                'np': np,
-                'pd': pd,
+                'np': load("numpy"),
+                'pd': load("pandas"),
                 'os': os
             }
             
             # Add scikit-learn imports
             try:
-                from sklearn.model_selection import train_test_split, cross_val_score
-                from sklearn.linear_model import LinearRegression, LogisticRegression
-                from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
-                from sklearn.cluster import KMeans
-                from sklearn.preprocessing import StandardScaler, LabelEncoder
-                from sklearn.metrics import accuracy_score, mean_squared_error, classification_report
-                
-                exec_globals.update({
-                    'train_test_split': train_test_split,
-                    'cross_val_score': cross_val_score,
-                    'LinearRegression': LinearRegression,
-                    'LogisticRegression': LogisticRegression,
-                    'RandomForestClassifier': RandomForestClassifier,
-                    'RandomForestRegressor': RandomForestRegressor,
-                    'KMeans': KMeans,
-                    'StandardScaler': StandardScaler,
-                    'LabelEncoder': LabelEncoder,
-                    'accuracy_score': accuracy_score,
-                    'mean_squared_error': mean_squared_error,
-                    'classification_report': classification_report
-                })
+                exec_globals.update(_get_sklearn_namespace())
             except ImportError:
                 pass
             
+            provided_names = set(exec_globals)
+            existing_outputs = snapshot(['models', 'results'])
+
             # Execute the provided code
-            exec(python_code, exec_globals)
-            
-            return "✅ Successfully executed ML code"
+            exec(exec_cache.compile(python_code, f"<{self.name}>"), exec_globals)
+
+            # Register the fitted models the code left behind
+            fitted = _register_fitted_models(exec_globals, provided_names, self.name)
+            governor.enforce()
+            if fitted:
+                result = f"✅ Successfully executed ML code\nRegistered models: {', '.join(fitted)}"
+            else:
+                result = "✅ Successfully executed ML code"
+            artifacts = changed_files(existing_outputs, ['models', 'results'])
+            models = {name: exec_globals[name] for name in fitted}
+            exec_cache.put(cache_key, result, source=self.name, artifacts=artifacts, models=models)
+            if fitted:
+                # Baseline feature distributions let incremental_refresh retrain only on drift
+                record_step('model', python_code, df, outputs=artifacts, models=models)
+            return result
                 
         except Exception as e:
             return f"❌ Error executing ML code: {str(e)}"
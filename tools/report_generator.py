@@ -3,6 +3,8 @@ import json
 import os
 from typing import Dict, List
 from datetime import datetime
+from tools.session import session
+from tools.data_quality import quality_points
 
 class ReportGeneratorTool(Tool):
     name = "report_generator"
@@ -146,6 +148,11 @@ class ReportGeneratorTool(Tool):
                                 data_quality_points.append(next_section['content'])
                         break
 
+            # Rule results recorded when the data was loaded or checked with data_quality_tool
+            quality_report = session.get_quality()
+            if quality_report:
+                data_quality_points.extend(quality_points(quality_report))
+
             if not data_quality_points:
                 data_quality_points = ["Data quality assessment completed", "Basic data validation performed"]
 
@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+from datetime import datetime
+from tools.lazy_imports import load
+
+
+class SpilledDataset:
+    """Placeholder for a dataset moved to an uncompressed Arrow IPC file.
+
+    The file is memory-mapped on access, so reading it back (or handing it to
+    DuckDB as an Arrow table) does not need a full copy for numeric columns.
+    """
+
+    def __init__(self, path: str, shape, nbytes: int):
+        self.path = path
+        self.shape = shape
+        self.nbytes = nbytes
+
+    def arrow_table(self):
+        pa = load("pyarrow")
+        return pa.ipc.open_file(pa.memory_map(self.path, 'r')).read_all()
+
+    def load(self):
+        return self.arrow_table().to_pandas()
+
+    def __repr__(self):
+        return f"SpilledDataset(path={self.path!r}, shape={self.shape})"
+
+
+class Session:
+    """Registry of the objects produced while analyzing a dataset.
+
+    Tools register the DataFrames they load, the models they fit and the plots
+    they write so that other parts of the pipeline (checkpointing, reporting)
+    can find them without scanning the working directory.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.datasets = {}
+        self.dataset_versions = {}
+        self.models = {}
+        self.plots = []
+        self.cubes = {}
+        self.metadata = {}
+        self.quality = {}
+        self.last_access = {}
+        # Bumped by clear() so caches keyed on dataset versions never match a previous session
+        self.generation = 0
+        self._clear_callbacks = []
+
+    def on_clear(self, callback):
+        """Run callback after every clear(); tools use it to drop caches built from this session's data"""
+        with self._lock:
+            self._clear_callbacks.append(callback)
+
+    def register_dataset(self, name: str, df, source: str = None) -> int:
+        """Register (or replace) a DataFrame and return its new version"""
+        with self._lock:
+            self.datasets[name] = df
+            self.dataset_versions[name] = self.dataset_versions.get(name, 0) + 1
+            # A replaced dataset invalidates the aggregates built from the old one
+            self.cubes.pop(name, None)
+            self.last_access[name] = time.monotonic()
+            self.metadata[('dataset', name)] = {
+                'source': source,
+                'registered_at': datetime.now().isoformat(),
+            }
+            return self.dataset_versions[name]
+
+    def get_dataset(self, name: str = None):
+        """Return a registered DataFrame, or the most recently registered one"""
+        with self._lock:
+            if name is None:
+                if not self.datasets:
+                    return None
+                name = next(reversed(self.datasets))
+            df = self.datasets.get(name)
+            if isinstance(df, SpilledDataset):
+                # Bring a spilled dataset back into memory on first use
+                df = df.load()
+                self.datasets[name] = df
+            if df is not None:
+                self.last_access[name] = time.monotonic()
+            return df
+
+    def name_of(self, df):
+        """Name under which this exact DataFrame object is registered, if any"""
+        with self._lock:
+            for name, registered in self.datasets.items():
+                if registered is df:
+                    return name
+            return None
+
+    def append_rows(self, name: str, new_rows) -> int:
+        """Append rows to a registered dataset, updating its cube incrementally"""
+        pd = load("pandas")
+        with self._lock:
+            cube = self.cubes.get(name)
+            self.datasets[name] = pd.concat([self.get_dataset(name), new_rows], ignore_index=True)
+            self.dataset_versions[name] = self.dataset_versions.get(name, 0) + 1
+            if cube is not None:
+                cube.update(new_rows)
+            return self.dataset_versions[name]
+
+    def register_cube(self, name: str, cube):
+        """Attach a materialized aggregate cube to a registered dataset"""
+        with self._lock:
+            self.cubes[name] = cube
+
+    def get_cube(self, df=None):
+        """Cube built for exactly this DataFrame, or the most recent cube when df is None"""
+        with self._lock:
+            if df is not None:
+                name = self.name_of(df)
+                return self.cubes.get(name) if name is not None else None
+            if not self.cubes:
+                return None
+            return self.cubes[next(reversed(self.cubes))]
+
+    def record_quality(self, name: str, report: dict):
+        """Keep the latest data quality report of a dataset (see tools/data_quality.py)"""
+        with self._lock:
+            self.quality.pop(name, None)
+            self.quality[name] = report
+
+    def get_quality(self, name: str = None):
+        """Quality report of a dataset, or the most recent report when name is None"""
+        with self._lock:
+            if name is not None:
+                return self.quality.get(name)
+            if not self.quality:
+                return None
+            return self.quality[next(reversed(self.quality))]
+
+    def register_model(self, name: str, model, source: str = None):
+        """Register a fitted model under a name"""
+        with self._lock:
+            self.models[name] = model
+            self.metadata[('model', name)] = {
+                'source': source,
+                'registered_at': datetime.now().isoformat(),
+            }
+
+    def record_plot(self, path: str, source: str = None):
+        """Add a plot file to the manifest (once per path)"""
+        with self._lock:
+            path = path.replace('\\', '/')
+            if any(entry['path'] == path for entry in self.plots):
+                return
+            self.plots.append({
+                'path': path,
+                'source': source,
+                'created_at': datetime.now().isoformat(),
+                'size': os.path.getsize(path) if os.path.exists(path) else None,
+            })
+
+    def clear(self):
+        """Forget everything registered in this session"""
+        with self._lock:
+            self.datasets.clear()
+            self.dataset_versions.clear()
+            self.models.clear()
+            self.plots.clear()
+            self.cubes.clear()
+            self.metadata.clear()
+            self.quality.clear()
+            self.last_access.clear()
+            self.generation += 1
+            callbacks = list(self._clear_callbacks)
+        # Outside the lock: callbacks take their own locks, which may in turn wait on the session
+        for callback in callbacks:
+            callback()
+
+
+# Process-wide session shared by all tools
+session = Session()
@@ -0,0 +1,175 @@
+from smolagents import Tool
+import os
+import re
+import threading
+import time
+from tools.lazy_imports import load
+from tools.session import session, SpilledDataset
+from tools.memory_governor import governor
+from tools.exec_cache import content_signature
+
+# DuckDB spills intermediate results here when an aggregation exceeds the memory limit
+DUCKDB_TEMP_DIRECTORY = os.getenv("INSIGHT_DUCKDB_TEMP_DIR", ".duckdb_tmp")
+# e.g. "4GB"; DuckDB defaults to 80% of physical memory when unset
+DUCKDB_MEMORY_LIMIT = os.getenv("INSIGHT_DUCKDB_MEMORY_LIMIT")
+
+
+def _table_name(name: str) -> str:
+    """Turn a dataset name into a valid unquoted SQL identifier"""
+    cleaned = re.sub(r'\W+', '_', name).strip('_').lower() or "dataset"
+    return f"t_{cleaned}" if cleaned[0].isdigit() else cleaned
+
+
+class SQLQueryTool(Tool):
+    name = "sql_query_tool"
+    description = "Run SQL (DuckDB dialect) over the loaded datasets for fast multi-threaded aggregations, window functions and joins. Every dataset loaded with file_handler is available as a table named after its file (e.g. 'sales' for sales.csv), the df argument is available as table 'df', and CSV/Parquet files can be queried directly, e.g. SELECT * FROM 'datasets/sales.csv'."
+    inputs = {
+        "query": {
+            "type": "string",
+            "description": "SQL query to execute"
+        },
+        "df": {
+            "type": "object",
+            "description": "Optional Pandas DataFrame exposed to the query as table 'df'",
+            "nullable": True
+        },
+        "max_rows": {
+            "type": "integer",
+            "description": "Maximum number of result rows to show (default 50)",
+            "nullable": True
+        },
+        "result_name": {
+            "type": "string",
+            "description": "Optional name under which the full result is registered as a new dataset (queryable as a table in later calls)",
+            "nullable": True
+        }
+    }
+    output_type = "string"
+
+    def _get_connection(self):
+        """Open the embedded DuckDB database on first use, and afresh for every session generation"""
+        if getattr(self, '_connection', None) is not None and self._generation != session.generation:
+            # session.clear() started a new job: nothing registered or created by the old one may stay queryable
+            self._close()
+        if getattr(self, '_connection', None) is None:
+            duckdb = load("duckdb")
+            os.makedirs(DUCKDB_TEMP_DIRECTORY, exist_ok=True)
+            connection = duckdb.connect(database=":memory:")
+            connection.execute(f"SET threads TO {os.cpu_count() or 1}")
+            if DUCKDB_MEMORY_LIMIT:
+                connection.execute(f"SET memory_limit = '{DUCKDB_MEMORY_LIMIT}'")
+            connection.execute(f"SET temp_directory = '{DUCKDB_TEMP_DIRECTORY}'")
+            # Lets large aggregations stream and spill instead of holding ordered buffers
+            connection.execute("SET preserve_insertion_order = false")
+            self._connection = connection
+            self._generation = session.generation
+            if getattr(self, '_lock', None) is None:
+                self._lock = threading.Lock()
+                session.on_clear(self._close)
+            self._registered = {}
+            self._tables = {}
+            governor.register_cache("sql_query_tool.tables", self._tables_bytes, self._drop_tables, owner=self.name)
+        return self._connection
+
+    def _tables_bytes(self) -> int:
+        # Arrow views share numeric buffers with the DataFrames, so this over-counts them
+        return sum(table.nbytes for table in self._tables.values())
+
+    def _drop_tables(self):
+        """Unregister every table so their Arrow buffers can be freed; they are re-registered on demand"""
+        with self._lock:
+            for table in list(self._tables):
+                self._connection.unregister(table)
+            self._tables.clear()
+            self._registered.clear()
+
+    def _close(self):
+        """Drop the database with every registered and created table"""
+        with self._lock:
+            if self._connection is None:
+                return
+            self._connection.close()
+            self._connection = None
+            self._tables.clear()
+            self._registered.clear()
+
+    def _to_arrow(self, df):
+        """Arrow view of a DataFrame (zero-copy for numeric columns)"""
+        if isinstance(df, SpilledDataset):
+            # Spilled datasets are queried straight from their memory-mapped file
+            return df.arrow_table()
+        pa = load("pyarrow")
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+    def _register(self, connection, table: str, df, version):
+        """(Re-)register a DataFrame as a table unless this exact object, version and content is registered"""
+        # The entry holds the DataFrame itself, so a new frame at a reused address never matches,
+        # and the content signature catches edits made in place
+        signature = df.path if isinstance(df, SpilledDataset) else content_signature(df)
+        registered = self._registered.get(table)
+        if registered is not None and registered[0] is df and registered[1:] == (version, signature):
+            return
+        arrow_table = self._to_arrow(df)
+        connection.register(table, arrow_table)
+        self._tables[table] = arrow_table
+        self._registered[table] = (df, version, signature)
+
+    def _unregister(self, connection, table: str):
+        connection.unregister(table)
+        self._tables.pop(table, None)
+        self._registered.pop(table, None)
+
+    def forward(self, query: str, df=None, max_rows: int = None, result_name: str = None) -> str:
+        """Execute a SQL query against the session datasets"""
+        try:
+            connection = self._get_connection()
+        except ImportError:
+            return "Error: duckdb library not installed. Please install with: pip install duckdb"
+
+        max_rows = 50 if max_rows is None else max(1, int(max_rows))
+        try:
+            with self._lock:
+                tables = set()
+                for dataset_name, dataset in list(session.datasets.items()):
+                    table = _table_name(dataset_name)
+                    self._register(connection, table, dataset, session.dataset_versions.get(dataset_name))
+                    tables.add(table)
+                if df is not None:
+                    self._register(connection, "df", df, None)
+                    tables.add("df")
+                for table in set(self._registered) - tables:
+                    self._unregister(connection, table)
+
+                started = time.perf_counter()
+                relation = connection.sql(query)
+                if relation is None:
+                    # DDL / COPY statements produce no result set
+                    return f"✅ Statement executed in {time.perf_counter() - started:.2f}s"
+
+                if result_name:
+                    result = relation.df()
+                    session.register_dataset(result_name, result, source=self.name)
+                    preview = result.head(max_rows)
+                    total_rows = len(result)
+                else:
+                    preview = relation.limit(max_rows + 1).df()
+                    total_rows = None
+                elapsed = time.perf_counter() - started
+
+            if total_rows is None:
+                truncated = len(preview) > max_rows
+                preview = preview.head(max_rows)
+                row_info = f"showing first {max_rows} rows" if truncated else f"{len(preview)} rows"
+            else:
+                row_info = f"{total_rows} rows" + (f", showing first {max_rows}" if total_rows > max_rows else "")
+
+            governor.enforce()
+            output = [f"✅ Query executed in {elapsed:.2f}s ({row_info})"]
+            if result_name:
+                output.append(f"Result registered as dataset '{result_name}' (table {_table_name(result_name)})")
+            output.append(preview.to_string(index=False) if len(preview) else "(no rows)")
+            return "\n".join(output)
+
+        except Exception as e:
+            tables_hint = ', '.join(_table_name(n) for n in session.datasets) or "none"
+            return f"❌ Error executing SQL query: {str(e)}\nAvailable tables: {tables_hint}" + (", df" if df is not None else "")
@@ -0,0 +1,66 @@
+import json
+import re
+import time
+from smolagents.models import ChatMessage, MessageRole, Model
+
+DATA_FILE_PATTERN = re.compile(r'(?:\*\*DATA FILE:\*\*|Data File:)\s*(\S.*?)\s*$', re.MULTILINE)
+
+# One step that exercises the real tools, as a scripted stand-in for the LLM's code
+ANALYSIS_CODE = '''df = file_handler(file_path={path})
+summary = data_analysis_tool(python_code="print(df.describe().T.head(10).to_string())", df=df)
+plot = visualization_tool(python_code="""
+numeric = df.select_dtypes('number')
+fig, ax = plt.subplots()
+if len(numeric.columns):
+    numeric.iloc[:, 0].hist(ax=ax, bins=30)
+    ax.set_title(f"Distribution of {{numeric.columns[0]}}")
+fig.savefig('plots/01_distribution.png')
+""", df=df)
+final_answer({{
+    "title": "Automated Analysis",
+    "dataset_overview": {{"shape": list(df.shape), "columns": [str(c) for c in df.columns]}},
+    "key_findings": {{"summary": summary[:1000]}},
+    "plot_descriptions": {{"plots/01_distribution.png": "Distribution of the first numeric column"}},
+    "recommendations": ["Review the distribution of the key numeric columns"],
+    "conclusion": "Analysis generated by the stub model"
+}})'''
+
+FINISH_CODE = '''final_answer({"title": "Automated Analysis", "conclusion": "Stub model stopped after a failed step"})'''
+
+
+def _text(message) -> str:
+    content = message.content if hasattr(message, 'content') else message.get('content')
+    if isinstance(content, list):
+        return "\n".join(part.get('text', '') for part in content if isinstance(part, dict))
+    return content or ""
+
+
+class StubModel(Model):
+    """Deterministic stand-in for the LLM, for load-testing the service without API calls.
+
+    The first step loads the dataset named in the prompt, runs one analysis
+    and one plot through the real tools and returns a final answer; any later
+    step just finishes. latency (seconds) simulates the model's response time.
+    """
+
+    def __init__(self, latency: float = 0.0, **kwargs):
+        super().__init__(model_id="stub", **kwargs)
+        self.latency = latency
+
+    def generate(self, messages, stop_sequences=None, response_format=None, tools_to_call_from=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        texts = [_text(m) for m in messages]
+        roles = [str(getattr(m, 'role', None) or m.get('role')) for m in messages]
+        previous_steps = sum(1 for role in roles if 'assistant' in role)
+
+        match = None
+        for text in texts:
+            match = DATA_FILE_PATTERN.search(text) or match
+        if previous_steps == 0 and match:
+            code = ANALYSIS_CODE.format(path=json.dumps(match.group(1)))
+            thought = "Thought: Load the dataset, summarize it, plot it and report."
+        else:
+            code = FINISH_CODE
+            thought = "Thought: Finish the run."
+        return ChatMessage(role=MessageRole.ASSISTANT, content=f"{thought}\n<code>\n{code}\n</code>")
@@ -1,33 +1,96 @@
 from smolagents import Tool
 import os
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from tools.lazy_imports import load
+from tools.session import session
+from tools.memory_governor import governor, figure_bytes, process_rss_bytes
+from tools.exec_cache import exec_cache, changed_files, snapshot, REPLAY_NOTE
+from tools.incremental import record_step
+
+# Defaults for every call, reverted afterwards so style changes made by one plot never leak into the next
+PLOT_STYLE = {
+    'figure.figsize': (10, 6),
+    'figure.dpi': 100,
+    'savefig.dpi': 150,
+    'savefig.bbox': 'tight',
+    'axes.grid': True,
+    'grid.alpha': 0.3,
+}
+
+# Per-call peak figure counts and memory, and process RSS after cleanup
+FIGURE_STATS = deque(maxlen=500)
+_pyplot_ready = False
+
+
+def _get_pyplot():
+    """pyplot on the Agg backend with the default font resolved (once per process)"""
+    global _pyplot_ready
+    if not _pyplot_ready:
+        # Plots are only ever written to files
+        load("matplotlib").use('Agg')
+    plt = load("matplotlib.pyplot")
+    if not _pyplot_ready:
+        font_manager = load("matplotlib.font_manager")
+        # The first lookup scans the font cache; do it here rather than inside the first plot
+        font_manager.findfont(font_manager.FontProperties(family=plt.rcParams['font.family']))
+        _pyplot_ready = True
+    return plt
+
+
+@contextmanager
+def _tracking_figure_peak(plt):
+    """Sample the open figures just before every plt.close, including the final close('all'), so figures
+    the code closes itself still count towards the peak"""
+    peak = {'figures': 0, 'bytes': 0}
+
+    def sample():
+        figures = figure_bytes()
+        peak['figures'] = max(peak['figures'], len(figures))
+        peak['bytes'] = max(peak['bytes'], sum(size for _, size in figures))
+
+    close = plt.close
+
+    def tracked_close(*args, **kwargs):
+        sample()
+        return close(*args, **kwargs)
+
+    plt.close = tracked_close
+    try:
+        yield peak
+    finally:
+        plt.close = close
+
 
 class VisualizationTool(Tool):
     name = "visualization_tool"
-    description = "Execute Python code to create any visualization. You have complete freedom to write matplotlib/seaborn code to generate charts and save them as PNG files."
+    description = "Execute Python code to create any visualization. You have complete freedom to write matplotlib/seaborn code to generate charts and save them as PNG files. Every figure is closed when the call returns, so save each one with plt.savefig inside the code."
     inputs = {
         "python_code": {
             "type": "string",
-            "description": "Python code to execute for creating visualizations. Use 'df' as the DataFrame variable. Save plots to 'plots/' directory with descriptive filenames."
+            "description": "Python code to execute for creating visualizations. Use 'df' as the DataFrame variable. Save plots to 'plots/' directory with descriptive filenames. If 'cube' is not None it holds pre-computed aggregates of df, e.g. cube.query(['COUNTRY'], 'SALES', stats=['sum'], top=10) or cube.query(['YEAR_ID', 'MONTH_ID'], 'SALES', quantiles=[0.5]); prefer it over re-scanning df for group totals."
         },
         "df": {
             "type": "object",
             "description": "Pandas DataFrame containing the data to visualize",
             "nullable": True
+        },
+        "use_cache": {
+            "type": "boolean",
+            "description": "Reuse the result of an identical earlier call on the same data (default true); set false for code whose result should differ between runs",
+            "nullable": True
         }
     }
     output_type = "string"
 
-    def forward(self, python_code: str, df=None) -> str:
+    def forward(self, python_code: str, df=None, use_cache: bool = True) -> str:
         """
         Execute the provided Python code to create visualizations.
         
         Available variables in the execution context:
         - df: The input DataFrame
+        - cube: AggregateCube pre-built for df at load time (None if df is not a loaded dataset)
         - plt: matplotlib.pyplot
         - sns: seaborn
         - np: numpy
@@ -35,20 +98,32 @@ class VisualizationTool(Tool):
         - os: os module
         - df_clean: cleaned df
         
-        The code should save plots to the 'plots/' directory.
+        The code should save plots to the 'plots/' directory. All figures are
+        closed when the call returns and rcParams changes are reverted.
+        Identical code on the same data is not re-run while its plots are unchanged on disk.
         """
         
         # Create plots directory if it doesn't exist
         os.makedirs('plots', exist_ok=True)
         
         try:
+            cache_key = exec_cache.result_key(self.name, python_code, df) if use_cache is not False else None
+            cached = exec_cache.get(cache_key)
+            if cached is not None:
+                for path in cached['artifacts']:
+                    session.record_plot(path, source=self.name)
+                return f"{self._summarize_plots()}\n{REPLAY_NOTE}"
+
+            plt = _get_pyplot()
+
             # Set up the execution environment
             exec_globals = {
                 'df': df,
+                'cube': session.get_cube(df),
                 'plt': plt,
-                'sns': sns, 
-                'np': np,
-                'pd': pd,
+                'sns': load("seaborn"), 
+                'np': load("numpy"),
+                'pd': load("pandas"),
                 'os': os,
                 'datetime': datetime,
                 'timedelta': timedelta
@@ -56,31 +131,60 @@ class VisualizationTool(Tool):
             
             # Add sklearn imports for common ML tasks
             try:
-                from sklearn.linear_model import LinearRegression
-                from sklearn.cluster import KMeans
-                from sklearn.preprocessing import StandardScaler
                 exec_globals.update({
-                    'LinearRegression': LinearRegression,
-                    'KMeans': KMeans,
-                    'StandardScaler': StandardScaler
+                    'LinearRegression': load("sklearn.linear_model").LinearRegression,
+                    'KMeans': load("sklearn.cluster").KMeans,
+                    'StandardScaler': load("sklearn.preprocessing").StandardScaler
                 })
             except ImportError:
                 pass
             
-            # Execute the provided code
-            exec(python_code, exec_globals)
+            existing_plots = snapshot(['plots'])
+
+            # Execute the provided code in its own rc context; the call owns every figure it opens
+            with _tracking_figure_peak(plt) as peak:
+                try:
+                    with plt.rc_context(PLOT_STYLE):
+                        exec(exec_cache.compile(python_code, f"<{self.name}>"), exec_globals)
+                finally:
+                    plt.close('all')
+            self._record_figure_stats(peak)
+            governor.enforce()
             
             # Check what files were created
-            if os.path.exists('plots'):
-                plot_files = [f for f in os.listdir('plots') if f.endswith('.png')]
-                if plot_files:
-                    # Sort by creation time but return ALL files, not just 3
-                    all_files = sorted(plot_files, key=lambda x: os.path.getctime(f'plots/{x}'), reverse=True)
-                    return f"✅ Successfully created visualizations. Generated {len(all_files)} files: {', '.join(all_files)}"
-                else:
-                    return "⚠️ Code executed but no PNG files were found in plots/ directory"
-            else:
-                return "⚠️ Code executed but plots/ directory was not found"
+            new_plots = [path for path in changed_files(existing_plots, ['plots']) if path.endswith('.png')]
+            for path in new_plots:
+                session.record_plot(path, source=self.name)
+            result = self._summarize_plots()
+            if new_plots:
+                exec_cache.put(cache_key, result, source=self.name, artifacts=new_plots)
+                # Lets incremental_refresh redraw these charts when the file grows
+                record_step('plot', python_code, df, outputs=new_plots)
+            return result
                 
         except Exception as e:
             return f"❌ Error executing visualization code: {str(e)}"
+
+    def _record_figure_stats(self, peak: dict):
+        """Keep and print the figure memory of this call"""
+        stats = {
+            'peak_figures': peak['figures'],
+            'peak_figure_bytes': peak['bytes'],
+            'rss_bytes': process_rss_bytes(),
+        }
+        FIGURE_STATS.append(stats)
+        rss = f", process RSS {stats['rss_bytes'] / 1024 ** 2:.0f} MB" if stats['rss_bytes'] else ""
+        print(f"   Figures: at most {stats['peak_figures']} open (~{stats['peak_figure_bytes'] / 1024 ** 2:.1f} MB), all closed{rss}")
+
+    def _summarize_plots(self) -> str:
+        """Describe the PNG files currently in plots/"""
+        if os.path.exists('plots'):
+            plot_files = [f for f in os.listdir('plots') if f.endswith('.png')]
+            if plot_files:
+                # Sort by creation time but return ALL files, not just 3
+                all_files = sorted(plot_files, key=lambda x: os.path.getctime(f'plots/{x}'), reverse=True)
+                return f"✅ Successfully created visualizations. Generated {len(all_files)} files: {', '.join(all_files)}"
+            else:
+                return "⚠️ Code executed but no PNG files were found in plots/ directory"
+        else:
+            return "⚠️ Code executed but plots/ directory was not found"